@@ -7,69 +7,38 @@ AI增强的Java代码评审工具
 
 import os
 import re
+import sys
 import json
-import requests
+import contextlib
+import threading
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 import argparse
 
 # 导入基础评审器
 from java_code_reviewer import JavaCodeReviewer, ReportGenerator, CodeIssue, ReviewResult
+from java_code_reviewer import JsonReportWriter, JsonlReportWriter, MarkdownReportWriter, ReportSummary
+from java_code_reviewer import RuleProfiler
+from java_code_reviewer import record_to_result, result_to_record, restrict_to_changed_lines
+from java_code_reviewer import read_source, unreadable_result
+from review_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DEFAULT_RESPONSE_TTL, ResponseCache, ResultCache
+from results_db import DEFAULT_DB_PATH, ResultsDbWriter
+from git_diff import GitDiffError, changed_java_files, read_staged
+from java_chunker import DEFAULT_CHUNK_LINES, DEFAULT_COMPLEXITY_THRESHOLD, DEFAULT_FOCUS_RADIUS
+from java_chunker import SourceChunk, chunk_source, focus_chunk
+from ollama_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT, OllamaClient
+from ollama_client import DEFAULT_FIRST_TOKEN_TIMEOUT, DEFAULT_TOTAL_TIMEOUT
+from ollama_client import DEFAULT_BREAKER_RESET, DEFAULT_BREAKER_THRESHOLD
+from ollama_client import DEFAULT_BACKOFF, DEFAULT_RETRIES, OllamaEndpoints
 
 
-class AIEnhancedReviewer(JavaCodeReviewer):
-    """AI增强的代码评审器"""
-    
-    def __init__(self, ollama_api="http://localhost:11434/api/generate", model="deepseek-coder:6.7b"):
-        super().__init__()
-        self.ollama_api = ollama_api
-        self.model = model
-    
-    def call_ollama(self, prompt: str) -> str:
-        """调用Ollama API进行AI分析"""
-        data = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False
-        }
-        try:
-            response = requests.post(self.ollama_api, json=data, timeout=30)
-            response.raise_for_status()
-            return response.json()["response"]
-        except Exception as e:
-            return f"AI分析失败: {e}"
-    
-    def review_file_with_ai(self, file_path: str) -> ReviewResult:
-        """使用AI增强评审单个Java文件"""
-        # 先进行基础评审
-        result = self.review_file(file_path)
-        
-        # 读取文件内容
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            return result
-        
-        # 进行AI深度分析
-        ai_issues = self._ai_code_analysis(content, file_path)
-        
-        # 合并AI分析结果
-        result.issues.extend(ai_issues)
-        
-        # 重新计算评分
-        result.score = self._calculate_score(result.total_lines)
-        result.summary = self._generate_summary()
-        
-        return result
-    
-    def _ai_code_analysis(self, content: str, file_path: str) -> List[CodeIssue]:
-        """使用AI进行深度代码分析"""
-        ai_issues = []
-
-        # 构建AI分析提示
-        prompt = f"""
+# 评审要求，单文件和批量分析的提示共用
+AI_REVIEW_GUIDELINES = """
         你是一位资深 Java 架构师，正在评审一段生产级代码。请严格遵循以下规则：
         ## 🔍 评审重点
         1. **日志记录**
@@ -100,7 +69,10 @@ class AIEnhancedReviewer(JavaCodeReviewer):
         - 不要建议抛出 `RuntimeException`
         - 不要生成无效测试或错误示例
 
-        ## 📄 输出要求
+"""
+
+# AI分析提示模板，{content} 处填入Java源码
+AI_ANALYSIS_PROMPT = AI_REVIEW_GUIDELINES + """        ## 📄 输出要求
 
         - 仅返回 JSON
         - 不要解释
@@ -130,64 +102,45 @@ Java代码：
 
 请只返回JSON格式的结果，不要包含其他内容。
 """
-        
-        try:
-            ai_response = self.call_ollama(prompt)
-            
-            # 尝试解析AI返回的JSON
-            if "```json" in ai_response:
-                start = ai_response.find("```json") + 7
-                end = ai_response.find("```", start)
-                json_str = ai_response[start:end].strip()
-            elif "```" in ai_response:
-                start = ai_response.find("```") + 3
-                end = ai_response.find("```", start)
-                json_str = ai_response[start:end].strip()
-            else:
-                json_str = ai_response.strip()
-            
-            # 解析JSON
-            try:
-                ai_data = json.loads(json_str)
-                if "issues" in ai_data:
-                    for issue_data in ai_data["issues"]:
-                        ai_issues.append(CodeIssue(
-                            line_number=issue_data.get("line_number", 0),
-                            severity=issue_data.get("severity", "info"),
-                            category=issue_data.get("category", "ai_analysis"),
-                            message=issue_data.get("message", ""),
-                            suggestion=issue_data.get("suggestion", "")
-                        ))
-            except json.JSONDecodeError:
-                # 如果JSON解析失败，创建一个通用的AI分析问题
-                ai_issues.append(CodeIssue(
-                    line_number=0,
-                    severity="info",
-                    category="ai_analysis",
-                    message="AI分析完成，但结果解析失败",
-                    suggestion="请检查AI服务是否正常运行"
-                ))
-                
-        except Exception as e:
-            ai_issues.append(CodeIssue(
-                line_number=0,
-                severity="warning",
-                category="ai_analysis",
-                message=f"AI分析失败: {e}",
-                suggestion="请检查Ollama服务是否运行"
-            ))
-        
-        return ai_issues
-    
-    def generate_improvement_suggestions(self, file_path: str) -> str:
-        """生成代码改进建议"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            return f"无法读取文件: {e}"
-        
-        prompt = f"""
+
+# 批量分析提示模板，{files} 处填入按 BATCH_FILE_SECTION 格式排列的多个文件
+BATCH_ANALYSIS_PROMPT = AI_REVIEW_GUIDELINES + """## 📄 输出要求
+
+        - 下面有多个相互独立的Java文件，每个文件以“### 文件 编号: 文件名”开头，请逐个文件分别评审
+        - line_number 为问题在该文件内的行号
+        - 仅返回 JSON
+        - 不要解释
+        - 每个文件对应 files 中的一项，file 填文件编号，严格按照以下格式：
+
+        {{
+            "files": [
+                {{
+                    "file": "F1",
+                    "issues": [
+                        {{
+                            "line_number": 12,
+                            "severity": "warning",
+                            "category": "exception",
+                            "message": "抛出了通用 Exception",
+                            "suggestion": "应声明 throws ParseException"
+                        }}
+                    ]
+                }}
+            ]
+        }}
+
+{files}
+请只返回JSON格式的结果，不要包含其他内容。
+"""
+
+BATCH_FILE_SECTION = """### 文件 {file_id}: {name}
+```java
+{content}
+```
+"""
+
+# 改进建议提示模板
+IMPROVEMENT_PROMPT = """
 请为以下Java代码提供具体的改进建议，重点关注：
 
 1. 日志记录改进：建议使用SLF4J + Logback替代System.out.println
@@ -208,18 +161,9 @@ Java代码：
 {content}
 ```
 """
-        
-        return self.call_ollama(prompt)
-    
-    def generate_unit_tests(self, file_path: str) -> str:
-        """生成单元测试建议"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            return f"无法读取文件: {e}"
-        
-        prompt = f"""
+
+# 单元测试提示模板
+UNIT_TEST_PROMPT = """
 请为以下Java代码生成JUnit单元测试，包括：
 
 1. 正常情况测试
@@ -235,104 +179,699 @@ Java代码：
 {content}
 ```
 """
+
+
+# AI调用或结果解析失败时产生的问题描述
+AI_PARSE_FAILED_MESSAGE = "AI分析完成，但结果解析失败"
+AI_CALL_FAILED_PREFIX = "AI分析失败"
+# 聚焦模式下作为关注点的静态问题严重程度
+FOCUS_SEVERITIES = ("error", "warning")
+# 批量分析时一个请求最多包含的文件数
+DEFAULT_BATCH_MAX_FILES = 8
+# 流式生成超时被截断时附加在文本末尾的说明
+AI_TRUNCATED_NOTE = "\n\n（生成超时，以上内容不完整）"
+
+
+def estimate_tokens(size: int) -> int:
+    """按文件字节数粗略估算源码的token数"""
+    return size // 3
+
+
+def _suggestion_outcome(text: Optional[str]) -> str:
+    """一条AI建议的实际结果：generated、failed（调用失败或无法读取文件）或skipped（Ollama被熔断，未请求）"""
+    if text is None:
+        return "skipped"
+    if text.startswith(AI_CALL_FAILED_PREFIX) or text.startswith("无法读取文件"):
+        return "failed"
+    return "generated"
+
+
+def _ai_failed(ai_issues: List[CodeIssue]) -> bool:
+    """AI分析结果是否来自调用失败或解析失败"""
+    return any(issue.category == "ai_analysis" and issue.line_number == 0 and
+               (issue.message == AI_PARSE_FAILED_MESSAGE or issue.message.startswith(AI_CALL_FAILED_PREFIX))
+               for issue in ai_issues)
+
+
+class IssueStreamParser:
+    """增量解析AI输出中的issues数组
+    
+    逐段喂入生成的文本，跳过代码块标记等JSON之外的内容；issues数组中每个对象一闭合就解析出来，
+    数组闭合（或顶层对象结束）后closed为True，此时已不需要模型继续生成summary等后续内容。
+    """
+    
+    def __init__(self):
+        self.issues: List[Dict[str, Any]] = []
+        self.closed = False
+        # 尚未闭合的顶层对象所在的文本段及各段的起始位置，取出某个范围的文本时只拼接涉及的段
+        self._chunks: List[str] = []
+        self._starts: List[int] = []
+        self._length = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._issues_depth = 0
+        self._item_start = 0
+        self._top_start = 0
+    
+    @staticmethod
+    def _is_result(text: str) -> bool:
+        """闭合的顶层对象是否是合法的评审结果（而不是说明文字中的花括号）"""
+        try:
+            return isinstance(json.loads(text), dict)
+        except ValueError:
+            return False
+    
+    def _slice(self, start: int, end: int) -> str:
+        """取出全文中[start, end)范围的文本"""
+        first = bisect_right(self._starts, start) - 1
+        last = bisect_right(self._starts, end - 1)
+        base = self._starts[first]
+        return ''.join(self._chunks[first:last])[start - base:end - base]
+    
+    def feed(self, chunk: str) -> bool:
+        """喂入一段文本，返回issues数组是否已闭合；只扫描新喂入的文本"""
+        if self.closed:
+            return True
+        offset = self._length
+        self._chunks.append(chunk)
+        self._starts.append(offset)
+        self._length += len(chunk)
+        stack = self._stack
+        for index, c in enumerate(chunk):
+            pos = offset + index
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(stack) == 1:
+                        self._last_key = self._slice(self._string_start + 1, pos)
+            elif c == '"':
+                if stack:
+                    self._in_string = True
+                    self._string_start = pos
+            elif c in '{[':
+                if not stack:
+                    # 顶层只跟踪对象，说明文字中的方括号不影响解析
+                    if c == '[':
+                        continue
+                    self._top_start = pos
+                elif c == '[' and stack == ['{'] and self._last_key == 'issues':
+                    self._issues_depth = 2
+                elif c == '{' and self._issues_depth and len(stack) == self._issues_depth:
+                    self._item_start = pos
+                stack.append(c)
+            elif c in '}]' and stack:
+                stack.pop()
+                if self._issues_depth and len(stack) == self._issues_depth and c == '}':
+                    try:
+                        item = json.loads(self._slice(self._item_start, pos + 1))
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        self.issues.append(item)
+                elif self._issues_depth and len(stack) == self._issues_depth - 1:
+                    self.closed = True
+                    break
+                elif not stack and self._is_result(self._slice(self._top_start, pos + 1)):
+                    self.closed = True
+                    break
+            elif c == ',' and len(stack) == 1:
+                self._last_key = None
+        if not stack and not self.closed:
+            # 顶层对象之外的文本之后不再需要
+            self._chunks = []
+            self._starts = []
+        return self.closed
+
+
+def _extract_json(ai_response: str) -> str:
+    """取出AI回复中代码块内（没有代码块时为全文）的JSON文本"""
+    if "```json" in ai_response:
+        start = ai_response.find("```json") + 7
+        end = ai_response.find("```", start)
+        return ai_response[start:end].strip()
+    if "```" in ai_response:
+        start = ai_response.find("```") + 3
+        end = ai_response.find("```", start)
+        return ai_response[start:end].strip()
+    return ai_response.strip()
+
+
+def _line_number(value: Any) -> int:
+    """AI返回的行号可能是字符串或缺失，无法转换为正整数时按文件级问题记为0"""
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _issues_from_data(items: Iterable[Dict[str, Any]]) -> List[CodeIssue]:
+    """把AI返回的问题对象转换为CodeIssue"""
+    return [CodeIssue(
+        line_number=_line_number(issue_data.get("line_number", 0)),
+        severity=issue_data.get("severity", "info"),
+        category=issue_data.get("category", "ai_analysis"),
+        message=issue_data.get("message", ""),
+        suggestion=issue_data.get("suggestion", ""),
+        rule="ai_analysis"
+    ) for issue_data in items]
+
+
+class AIEnhancedReviewer(JavaCodeReviewer):
+    """AI增强的代码评审器"""
+    
+    def __init__(self, ollama_api="http://localhost:11434/api/generate", model="deepseek-coder:6.7b",
+                 cache: Optional[ResultCache] = None, client: Optional[OllamaClient] = None,
+                 refresh: bool = False, stream: bool = False,
+                 first_token_timeout: float = DEFAULT_FIRST_TOKEN_TIMEOUT,
+                 total_timeout: float = DEFAULT_TOTAL_TIMEOUT, concurrency: int = DEFAULT_POOL_SIZE,
+                 chunk_lines: int = DEFAULT_CHUNK_LINES, focus: bool = False,
+                 focus_radius: int = DEFAULT_FOCUS_RADIUS,
+                 complexity_threshold: int = DEFAULT_COMPLEXITY_THRESHOLD,
+                 batch_tokens: int = 0, batch_max_files: int = DEFAULT_BATCH_MAX_FILES,
+                 retries: int = DEFAULT_RETRIES, retry_backoff: float = DEFAULT_BACKOFF,
+                 hedge_percentile: float = 0, ai_cache: Optional[ResponseCache] = None):
+        super().__init__(cache=cache)
+        # 含AI分析的整份评审结果与Ollama响应一样有有效期，--no-ai-cache时不缓存
+        self.ai_cache = ai_cache
+        # 可以是逗号分隔的多个端点，请求在各端点之间均衡
+        self.ollama_api = ollama_api
+        self.model = model
+        self.client = client or OllamaClient()
+        self.endpoints = OllamaEndpoints(self.client, ollama_api, retries, retry_backoff, hedge_percentile)
+        # Ollama被熔断时只做了静态评审的文件数
+        self.static_fallbacks = 0
+        self.refresh = refresh
+        self.stream = stream
+        self.first_token_timeout = first_token_timeout
+        self.total_timeout = total_timeout
+        self.chunk_lines = chunk_lines
+        self.focus = focus
+        self.focus_radius = focus_radius
+        self.complexity_threshold = complexity_threshold
+        self.batch_tokens = batch_tokens
+        self.batch_max_files = batch_max_files
+        # 同时进行的Ollama请求数上限，文件级和分块级的请求共用
+        self.concurrency = max(1, concurrency)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._chunk_executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+    
+    def close(self):
+        """关闭分块分析线程池和HTTP连接"""
+        if self._chunk_executor is not None:
+            self._chunk_executor.shutdown()
+        self.endpoints.close()
+        self.client.close()
+    
+    def _generate(self, prompt: str, stop: Optional[Callable[[str], bool]] = None) -> Tuple[str, bool]:
+        """调用Ollama生成文本，返回(文本, 是否完整)；流式模式下超时返回已生成的部分，stop可提前结束生成"""
+        data = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": self.stream
+        }
+        with self._slots:
+            if self.stream:
+                return self.endpoints.stream_generate(data, self.first_token_timeout, self.total_timeout, stop)
+            return self.endpoints.post_json(data)["response"], True
+    
+    def call_ollama(self, prompt: str) -> str:
+        """调用Ollama API进行AI分析"""
+        try:
+            text, complete = self._generate(prompt)
+        except Exception as e:
+            return f"{AI_CALL_FAILED_PREFIX}: {e}"
+        return text if complete else text + AI_TRUNCATED_NOTE
+    
+    def review_file_with_ai(self, file_path: str, profile: Optional[Dict[str, tuple]] = None) -> ReviewResult:
+        """使用AI增强评审单个Java文件，启用AI缓存时同一模型和提示模板下内容未变的文件在有效期内直接返回缓存结果
+        
+        传入profile时除各静态规则的开销外，还以 "ai_analysis" 记录AI分析的耗时和问题数。
+        """
+        try:
+            content = read_source(file_path)
+        except Exception as e:
+            return unreadable_result(file_path, e)
+        return self.review_source_with_ai(file_path, content, profile)
+    
+    def review_source_with_ai(self, file_path: str, content: str,
+                              profile: Optional[Dict[str, tuple]] = None) -> ReviewResult:
+        """使用AI增强评审内存中的Java源码，静态评审和AI分析共用同一份内容，不读取磁盘"""
+        cache_key = self._ai_cache_key(content)
+        if cache_key is not None:
+            record = None if self.refresh else self.ai_cache.get(cache_key)
+            if record is not None:
+                return record_to_result(record, file_path)
+        
+        # 先进行基础评审，分块和聚焦复用静态评审的屏蔽视图
+        result, ctx = self._review_with_context(file_path, content, profile)
+        if self._fall_back():
+            return result
+        
+        # 进行AI深度分析
+        start = perf_counter()
+        masked_lines = ctx.source.masked_lines if ctx is not None else None
+        ai_issues = self._ai_code_analysis(content, file_path, result.issues, masked_lines)
+        if profile is not None:
+            profile["ai_analysis"] = (perf_counter() - start, result.total_lines, len(ai_issues))
+        return self._merge_ai_issues(result, ai_issues, cache_key)
+    
+    def _fall_back(self, files: int = 1) -> bool:
+        """所有Ollama端点都被熔断时直接使用静态评审结果（不缓存），不再为每个文件等待请求失败"""
+        if not self.endpoints.rejects():
+            return False
+        with self._executor_lock:
+            self.static_fallbacks += files
+        return True
+    
+    def _ai_cache_key(self, content: str, batched: bool = False) -> Optional[str]:
+        """含AI分析的评审结果的缓存键；批量分析的结果单独一个命名空间，并包含批量提示模板
+        （批量回复中缺失的文件单独重新分析，所以两个提示模板都计入）"""
+        if self.ai_cache is None:
+            return None
+        if batched:
+            return ResultCache.make_key("ai-batch", self.fingerprint, self.model, AI_ANALYSIS_PROMPT,
+                                        BATCH_ANALYSIS_PROMPT, self._analysis_options(), content)
+        return ResultCache.make_key(
+            "ai", self.fingerprint, self.model, AI_ANALYSIS_PROMPT, self._analysis_options(), content)
+    
+    def _merge_ai_issues(self, result: ReviewResult, ai_issues: List[CodeIssue],
+                         cache_key: Optional[str]) -> ReviewResult:
+        # 合并AI分析结果
+        result.issues.extend(ai_issues)
+        
+        # 重新计算评分
+        result.score = self._calculate_score(result.issues, result.total_lines)
+        result.summary = self._generate_summary(result.issues)
+        
+        # AI调用失败的结果不缓存，下次运行重新分析
+        if cache_key is not None and not _ai_failed(ai_issues):
+            self.ai_cache.put(cache_key, result_to_record(result))
+        
+        return result
+    
+    def batchable(self, content: str, tokens: int) -> bool:
+        """是否可以与其他小文件合并到一个分析请求中：启用批量分析、非聚焦模式、无需分块且不超过token预算
+        
+        tokens为分组时按文件大小估算的token数，与分组使用同一个估算值。
+        """
+        if self.batch_tokens <= 0 or self.focus:
+            return False
+        if self.chunk_lines > 0 and content.count('\n') + 1 > self.chunk_lines:
+            return False
+        return tokens <= self.batch_tokens
+    
+    def review_sources_batched(self, sources: List[Tuple[str, str]],
+                               profiles: Optional[List[Dict[str, tuple]]] = None) -> List[ReviewResult]:
+        """把多个小文件合并到一个AI分析请求中评审，按输入顺序返回结果
+        
+        提示中每个文件带编号，要求AI按文件分别返回问题；缓存命中的文件不进入请求，
+        回复中缺失或无法解析的文件单独重新分析。批量请求的耗时平均记到各文件的 "ai_analysis" 开销上。
+        """
+        profiles = profiles or [None] * len(sources)
+        results: List[Optional[ReviewResult]] = [None] * len(sources)
+        pending = []
+        for index, (file_path, content) in enumerate(sources):
+            cache_key = self._ai_cache_key(content, batched=True)
+            record = None if cache_key is None or self.refresh else self.ai_cache.get(cache_key)
+            if record is not None:
+                results[index] = record_to_result(record, file_path)
+            else:
+                pending.append((index, cache_key, self.review_source(file_path, content, profiles[index])))
+        if not pending:
+            return results
+        if self._fall_back(len(pending)):
+            for index, _, result in pending:
+                results[index] = result
+            return results
+        
+        start = perf_counter()
+        sections = ''.join(
+            BATCH_FILE_SECTION.format(file_id=f"F{number}", name=os.path.basename(sources[index][0]),
+                                      content=sources[index][1])
+            for number, (index, _, _) in enumerate(pending, 1))
+        call_error = None
+        files = {}
+        try:
+            ai_response, _ = self._generate(BATCH_ANALYSIS_PROMPT.format(files=sections))
+        except Exception as e:
+            call_error = e
+        else:
+            try:
+                ai_data = json.loads(_extract_json(ai_response))
+                files = {str(item.get("file")): item.get("issues")
+                         for item in ai_data.get("files", []) if isinstance(item, dict)}
+            except (ValueError, AttributeError):
+                pass
+        elapsed = (perf_counter() - start) / len(pending)
+        
+        for number, (index, cache_key, result) in enumerate(pending, 1):
+            file_path, content = sources[index]
+            file_start = perf_counter()
+            if call_error is not None:
+                ai_issues = [CodeIssue(0, "warning", "ai_analysis", f"{AI_CALL_FAILED_PREFIX}: {call_error}",
+                                       "请检查Ollama服务是否运行", "ai_analysis")]
+            else:
+                try:
+                    ai_issues = _issues_from_data(files.get(f"F{number}"))
+                except (TypeError, AttributeError):
+                    # 该文件的结果缺失或格式不对，单独重新分析
+                    ai_issues = self._ai_code_analysis(content, file_path, result.issues)
+            if profiles[index] is not None:
+                profiles[index]["ai_analysis"] = (elapsed + perf_counter() - file_start, result.total_lines,
+                                                  len(ai_issues))
+            results[index] = self._merge_ai_issues(result, ai_issues, cache_key)
+        return results
+    
+    def _analysis_options(self) -> str:
+        """影响AI分析结果的选项，作为缓存键的一部分"""
+        if self.focus:
+            return f"focus:{self.focus_radius}:{self.complexity_threshold}"
+        return f"chunk:{self.chunk_lines}"
+    
+    def _ai_code_analysis(self, content: str, file_path: str,
+                          static_issues: Optional[List[CodeIssue]] = None,
+                          masked_lines: Optional[List[str]] = None) -> List[CodeIssue]:
+        """使用AI进行深度代码分析
+        
+        超过chunk_lines行的文件按类成员分块，各块带上包声明、导入和字段声明并发分析，
+        块内行号映射回文件行号后按块顺序合并，多个块重复报告的同一问题只保留一次。
+        聚焦模式下只发送静态问题附近和高复杂度方法的代码，没有这样的区域时不调用AI。
+        masked_lines为静态评审生成的屏蔽视图，传入时分块不再重复词法分析。
+        """
+        if self.focus:
+            focus_lines = [issue.line_number for issue in static_issues or ()
+                           if issue.line_number > 0 and issue.severity in FOCUS_SEVERITIES]
+            chunk = focus_chunk(content, focus_lines, self.focus_radius, self.complexity_threshold, masked_lines)
+            return self._analyze_chunk(chunk) if chunk is not None else []
+        
+        chunks = chunk_source(content, self.chunk_lines, masked_lines) if self.chunk_lines > 0 else []
+        if len(chunks) <= 1:
+            return self._analyze_prompt(AI_ANALYSIS_PROMPT.format(content=content))
+        
+        with self._executor_lock:
+            if self._chunk_executor is None:
+                self._chunk_executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        futures = [self._chunk_executor.submit(self._analyze_chunk, chunk) for chunk in chunks]
+        ai_issues = []
+        seen = set()
+        for future in futures:
+            for issue in future.result():
+                key = (issue.line_number, issue.severity, issue.message)
+                if key not in seen:
+                    seen.add(key)
+                    ai_issues.append(issue)
+        return ai_issues
+    
+    def _analyze_chunk(self, chunk: SourceChunk) -> List[CodeIssue]:
+        issues = self._analyze_prompt(AI_ANALYSIS_PROMPT.format(content=chunk.text))
+        for issue in issues:
+            issue.line_number = chunk.file_line(issue.line_number)
+        return issues
+    
+    def _analyze_prompt(self, prompt: str) -> List[CodeIssue]:
+        """发送一个分析提示并把AI返回的JSON解析为问题，调用或解析失败时返回描述失败的问题"""
+        ai_issues = []
+        
+        try:
+            # 流式模式下边生成边解析，issues数组闭合后即停止生成
+            parser = IssueStreamParser() if self.stream else None
+            try:
+                ai_response, _ = self._generate(prompt, parser.feed if parser else None)
+            except Exception as e:
+                ai_response = f"{AI_CALL_FAILED_PREFIX}: {e}"
+            if parser is not None and (parser.closed or parser.issues):
+                ai_issues.extend(_issues_from_data(parser.issues))
+                if not parser.closed:
+                    # 生成超时，保留已完整输出的问题；结果不缓存，下次运行重新分析
+                    ai_issues.append(CodeIssue(
+                        line_number=0,
+                        severity="info",
+                        category="ai_analysis",
+                        message=f"{AI_CALL_FAILED_PREFIX}: 生成超时，仅保留已完成的{len(parser.issues)}个问题",
+                        suggestion="可调大--total-timeout",
+                        rule="ai_analysis"
+                    ))
+                return ai_issues
+            
+            # 解析JSON
+            try:
+                ai_data = json.loads(_extract_json(ai_response))
+                if "issues" in ai_data:
+                    ai_issues.extend(_issues_from_data(ai_data["issues"]))
+            except json.JSONDecodeError:
+                # 如果JSON解析失败，创建一个通用的AI分析问题
+                ai_issues.append(CodeIssue(
+                    line_number=0,
+                    severity="info",
+                    category="ai_analysis",
+                    message=AI_PARSE_FAILED_MESSAGE,
+                    suggestion="请检查AI服务是否正常运行",
+                    rule="ai_analysis"
+                ))
+                
+        except Exception as e:
+            ai_issues.append(CodeIssue(
+                line_number=0,
+                severity="warning",
+                category="ai_analysis",
+                message=f"{AI_CALL_FAILED_PREFIX}: {e}",
+                suggestion="请检查Ollama服务是否运行",
+                rule="ai_analysis"
+            ))
+        
+        return ai_issues
+    
+    def generate_improvement_suggestions(self, file_path: str, content: Optional[str] = None) -> Optional[str]:
+        """生成代码改进建议，传入content时直接使用，不再读取文件；所有Ollama端点都被熔断时返回None，报告中省略该部分"""
+        if self.endpoints.rejects():
+            return None
+        if content is None:
+            try:
+                content = read_source(file_path)
+            except Exception as e:
+                return f"无法读取文件: {e}"
+        
+        prompt = IMPROVEMENT_PROMPT.format(content=content)
+        
+        return self.call_ollama(prompt)
+    
+    def generate_unit_tests(self, file_path: str, content: Optional[str] = None) -> Optional[str]:
+        """生成单元测试建议，传入content时直接使用，不再读取文件；所有Ollama端点都被熔断时返回None，报告中省略该部分"""
+        if self.endpoints.rejects():
+            return None
+        if content is None:
+            try:
+                content = read_source(file_path)
+            except Exception as e:
+                return f"无法读取文件: {e}"
+        
+        prompt = UNIT_TEST_PROMPT.format(content=content)
         
         return self.call_ollama(prompt)
 
 
+@dataclass
+class AIFileReview:
+    """一个文件的完整评审结果：评审结果、开销记录和AI建议"""
+    file_path: str
+    result: ReviewResult
+    profile: Dict[str, tuple]
+    improvement: Optional[str] = None
+    unit_tests: Optional[str] = None
+
+
+def review_files_with_ai(reviewer: JavaCodeReviewer, java_files: Iterable[str],
+                         concurrency: int = DEFAULT_POOL_SIZE, staged: bool = False) -> Iterator[AIFileReview]:
+    """用线程池并发评审多个文件，按输入顺序逐个产出结果
+    
+    reviewer为AIEnhancedReviewer时，每个文件的AI分析、改进建议和单元测试三个请求分别提交，
+    跨文件最多同时有concurrency个请求在执行；已提交但未产出的评审任务不超过concurrency个，
+    文件列表可以是边遍历边产出的迭代器。每个文件只读取一次，静态评审和各提示共用读到的内容。
+    启用批量分析时，相邻的小文件按token预算合并为一个评审任务，AI分析只发送一个请求。
+    staged为True时读取各文件在暂存区中的版本。
+    """
+    concurrency = max(1, concurrency)
+    with_ai = isinstance(reviewer, AIEnhancedReviewer)
+    review_method = reviewer.review_source_with_ai if with_ai else reviewer.review_source
+    batch_tokens = reviewer.batch_tokens if with_ai else 0
+    
+    def load(file_path: str):
+        try:
+            return (read_staged(file_path) if staged else read_source(file_path)), None
+        except Exception as e:
+            return None, e
+    
+    # 读取任务先于依赖它的任务提交，线程池按提交顺序取任务，等待读取结果不会死锁
+    def review(file_paths: List[str], sources: list, token_counts: List[int]):
+        outcomes = [None] * len(file_paths)
+        batch = []
+        for index, (file_path, source, tokens) in enumerate(zip(file_paths, sources, token_counts)):
+            content, error = source.result()
+            profile = {}
+            if error is not None:
+                outcomes[index] = (unreadable_result(file_path, error), profile)
+            elif len(file_paths) > 1 and reviewer.batchable(content, tokens):
+                batch.append((index, file_path, content))
+            else:
+                outcomes[index] = (review_method(file_path, content, profile), profile)
+        if len(batch) == 1:
+            index, file_path, content = batch[0]
+            profile = {}
+            outcomes[index] = (review_method(file_path, content, profile), profile)
+        elif batch:
+            profiles = [{} for _ in batch]
+            results = reviewer.review_sources_batched([(path, content) for _, path, content in batch], profiles)
+            for (index, _, _), result, profile in zip(batch, results, profiles):
+                outcomes[index] = (result, profile)
+        return outcomes
+    
+    def suggest(generate, file_path: str, source) -> Optional[str]:
+        content, error = source.result()
+        if error is not None:
+            return f"无法读取文件: {error}"
+        return generate(file_path, content)
+    
+    def collect(file_path: str, review_future, index: int, futures: list) -> AIFileReview:
+        result, profile = review_future.result()[index]
+        suggestions = [future.result() for future in futures] or [None, None]
+        return AIFileReview(file_path, result, profile, *suggestions)
+    
+    pending = deque()
+    group = []
+    group_tokens = 0
+    pending_tasks = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def flush():
+            nonlocal group, group_tokens, pending_tasks
+            review_future = executor.submit(review, [item[0] for item in group], [item[1] for item in group],
+                                            [item[3] for item in group])
+            for index, (java_file, _, futures, _) in enumerate(group):
+                pending.append((java_file, review_future, index, futures, index == len(group) - 1))
+            pending_tasks += 1
+            group = []
+            group_tokens = 0
+        
+        def drain(limit: int):
+            nonlocal pending_tasks
+            while pending_tasks > limit:
+                java_file, review_future, index, futures, last = pending.popleft()
+                if last:
+                    pending_tasks -= 1
+                yield collect(java_file, review_future, index, futures)
+        
+        for java_file in java_files:
+            tokens = batch_tokens + 1
+            if batch_tokens > 0:
+                try:
+                    tokens = estimate_tokens(os.path.getsize(java_file))
+                except OSError:
+                    pass
+            # 大文件单独成组；小文件攒到token预算或文件数上限后成组
+            if group and (tokens > batch_tokens or group_tokens + tokens > batch_tokens
+                          or len(group) >= reviewer.batch_max_files):
+                flush()
+                yield from drain(concurrency - 1)
+            source = executor.submit(load, java_file)
+            futures = []
+            if with_ai:
+                futures.append(executor.submit(suggest, reviewer.generate_improvement_suggestions, java_file, source))
+                futures.append(executor.submit(suggest, reviewer.generate_unit_tests, java_file, source))
+            group.append((java_file, source, futures, tokens))
+            group_tokens += tokens
+            if tokens > batch_tokens:
+                flush()
+                yield from drain(concurrency - 1)
+        if group:
+            flush()
+        yield from drain(0)
+
+
+class ComprehensiveReportWriter(MarkdownReportWriter):
+    """流式综合报告：在Markdown报告基础上增加问题分类统计、AI建议和总结"""
+    
+    title = "Java代码综合评审报告"
+    
+    def add(self, result: ReviewResult, improvement: Optional[str] = None,
+            unit_tests: Optional[str] = None):
+        self.summary.add(result)
+        f = self._section_file()
+        self._write_file_details(f, result)
+        
+        # AI改进建议
+        if improvement is not None:
+            f.write("#### AI改进建议\n\n")
+            f.write("```\n")
+            f.write(improvement)
+            f.write("\n```\n\n")
+        
+        # 单元测试建议
+        if unit_tests is not None:
+            f.write("#### 单元测试建议\n\n")
+            f.write("```java\n")
+            f.write(unit_tests)
+            f.write("\n```\n\n")
+        
+        f.write("---\n\n")
+    
+    def _write_statistics(self, f, cache_stats: Optional[Dict[str, int]]):
+        super()._write_statistics(f, cache_stats)
+        
+        # 问题分类统计
+        f.write("## 问题分类统计\n\n")
+        for category, counts in self.summary.categories.items():
+            f.write(f"### {category}\n")
+            f.write(f"- 错误: {counts['error']}\n")
+            f.write(f"- 警告: {counts['warning']}\n")
+            f.write(f"- 建议: {counts['info']}\n\n")
+    
+    def _write_footer(self, f):
+        # 总结和建议
+        avg_score = self.summary.average_score
+        f.write("## 总结和建议\n\n")
+        if avg_score >= 80:
+            f.write("🎉 代码质量整体良好！继续保持。\n\n")
+        elif avg_score >= 60:
+            f.write("📈 代码质量中等，建议关注警告和建议项。\n\n")
+        else:
+            f.write("⚠️ 代码质量需要改进，建议优先处理错误和警告项。\n\n")
+        
+        f.write("### 改进优先级\n\n")
+        f.write("1. **高优先级**: 修复所有错误项\n")
+        f.write("2. **中优先级**: 处理警告项\n")
+        f.write("3. **低优先级**: 考虑建议项\n\n")
+        
+        f.write("### 后续行动\n\n")
+        f.write("- [ ] 修复所有错误项\n")
+        f.write("- [ ] 处理高优先级警告\n")
+        f.write("- [ ] 添加单元测试\n")
+        f.write("- [ ] 重构代码结构\n")
+        f.write("- [ ] 优化性能瓶颈\n\n")
+
+
 class EnhancedReportGenerator(ReportGenerator):
     """增强的报告生成器"""
     
     @staticmethod
-    def generate_comprehensive_report(results: List[ReviewResult], output_file: str, 
+    def generate_comprehensive_report(results: Iterable[ReviewResult], output_file: str, 
                                     improvement_suggestions: Dict[str, str] = None,
-                                    unit_test_suggestions: Dict[str, str] = None):
+                                    unit_test_suggestions: Dict[str, str] = None,
+                                    cache_stats: Optional[Dict[str, int]] = None):
         """生成综合报告"""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("# Java代码综合评审报告\n\n")
-            f.write(f"**生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            # 总体统计
-            total_issues = sum(len(result.issues) for result in results)
-            avg_score = sum(result.score for result in results) / len(results) if results else 0
-            files_with_errors = sum(1 for result in results if any(issue.severity == "error" for issue in result.issues))
-            
-            f.write("## 总体统计\n\n")
-            f.write(f"- **评审文件数**: {len(results)}\n")
-            f.write(f"- **总问题数**: {total_issues}\n")
-            f.write(f"- **平均评分**: {avg_score:.1f}/100\n")
-            f.write(f"- **有错误的文件数**: {files_with_errors}\n\n")
-            
-            # 问题分类统计
-            issue_categories = {}
-            for result in results:
-                for issue in result.issues:
-                    category = issue.category
-                    if category not in issue_categories:
-                        issue_categories[category] = {"error": 0, "warning": 0, "info": 0}
-                    issue_categories[category][issue.severity] += 1
-            
-            f.write("## 问题分类统计\n\n")
-            for category, counts in issue_categories.items():
-                f.write(f"### {category}\n")
-                f.write(f"- 错误: {counts['error']}\n")
-                f.write(f"- 警告: {counts['warning']}\n")
-                f.write(f"- 建议: {counts['info']}\n\n")
-            
-            # 详细报告
-            f.write("## 详细报告\n\n")
-            for result in results:
-                f.write(f"### {result.file_name}\n\n")
-                f.write(f"**文件路径**: `{result.file_path}`\n\n")
-                f.write(f"**代码行数**: {result.total_lines}\n\n")
-                f.write(f"**质量评分**: {result.score}/100\n\n")
-                f.write(f"**问题摘要**: {result.summary}\n\n")
-                
-                if result.issues:
-                    f.write("#### 问题详情\n\n")
-                    for issue in result.issues:
-                        severity_emoji = {"error": "❌", "warning": "⚠️", "info": "ℹ️"}.get(issue.severity, "📝")
-                        f.write(f"- **第{issue.line_number}行** {severity_emoji} **{issue.severity.upper()}** ({issue.category})\n")
-                        f.write(f"  - **问题**: {issue.message}\n")
-                        f.write(f"  - **建议**: {issue.suggestion}\n\n")
-                else:
-                    f.write("✅ 未发现问题\n\n")
-                
-                # AI改进建议
-                if improvement_suggestions and result.file_path in improvement_suggestions:
-                    f.write("#### AI改进建议\n\n")
-                    f.write("```\n")
-                    f.write(improvement_suggestions[result.file_path])
-                    f.write("\n```\n\n")
-                
-                # 单元测试建议
-                if unit_test_suggestions and result.file_path in unit_test_suggestions:
-                    f.write("#### 单元测试建议\n\n")
-                    f.write("```java\n")
-                    f.write(unit_test_suggestions[result.file_path])
-                    f.write("\n```\n\n")
-                
-                f.write("---\n\n")
-            
-            # 总结和建议
-            f.write("## 总结和建议\n\n")
-            if avg_score >= 80:
-                f.write("🎉 代码质量整体良好！继续保持。\n\n")
-            elif avg_score >= 60:
-                f.write("📈 代码质量中等，建议关注警告和建议项。\n\n")
-            else:
-                f.write("⚠️ 代码质量需要改进，建议优先处理错误和警告项。\n\n")
-            
-            f.write("### 改进优先级\n\n")
-            f.write("1. **高优先级**: 修复所有错误项\n")
-            f.write("2. **中优先级**: 处理警告项\n")
-            f.write("3. **低优先级**: 考虑建议项\n\n")
-            
-            f.write("### 后续行动\n\n")
-            f.write("- [ ] 修复所有错误项\n")
-            f.write("- [ ] 处理高优先级警告\n")
-            f.write("- [ ] 添加单元测试\n")
-            f.write("- [ ] 重构代码结构\n")
-            f.write("- [ ] 优化性能瓶颈\n\n")
+        improvement_suggestions = improvement_suggestions or {}
+        unit_test_suggestions = unit_test_suggestions or {}
+        writer = ComprehensiveReportWriter(output_file)
+        for result in results:
+            writer.add(result, improvement_suggestions.get(result.file_path),
+                       unit_test_suggestions.get(result.file_path))
+        writer.close(cache_stats)
 
 
 def main():
@@ -340,90 +879,240 @@ def main():
     parser = argparse.ArgumentParser(description='AI增强的Java代码评审工具')
     parser.add_argument('path', help='要评审的Java文件或目录路径')
     parser.add_argument('--output-dir', '-o', default='./reports', help='报告输出目录')
-    parser.add_argument('--format', '-f', choices=['json', 'markdown', 'both', 'comprehensive'], 
-                       default='comprehensive', help='输出格式')
-    parser.add_argument('--ollama-api', default='http://localhost:11434/api/generate', 
-                       help='Ollama API地址')
+    parser.add_argument('--format', '-f', choices=['json', 'markdown', 'both', 'comprehensive', 'jsonl'], 
+                       default='comprehensive', help='输出格式，jsonl为边评审边输出的逐行问题流')
+    parser.add_argument('--jsonl-output', metavar='PATH',
+                        help='JSONL问题流的输出文件，"-"表示标准输出（默认写到输出目录）')
+    parser.add_argument('--ollama-api', action='append', metavar='URL',
+                       help='Ollama API地址（默认 http://localhost:11434/api/generate），'
+                            '多个运行相同模型的端点用逗号分隔或重复指定，请求按未完成数均衡分配')
     parser.add_argument('--model', default='deepseek-coder:6.7b', help='使用的AI模型')
     parser.add_argument('--no-ai', action='store_true', help='禁用AI分析')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_POOL_SIZE,
+                        help='同时进行的Ollama请求数上限（跨文件和提示类型），1为串行')
+    parser.add_argument('--chunk-lines', type=int, default=DEFAULT_CHUNK_LINES,
+                        help='超过该行数的文件按方法/类成员分块并发分析，0为不分块')
+    parser.add_argument('--focus', action='store_true',
+                        help='聚焦模式：只把静态问题(error/warning)附近和高复杂度方法的代码发给AI分析')
+    parser.add_argument('--focus-radius', type=int, default=DEFAULT_FOCUS_RADIUS,
+                        help='聚焦模式下每个静态问题前后保留的行数')
+    parser.add_argument('--complexity-threshold', type=int, default=DEFAULT_COMPLEXITY_THRESHOLD,
+                        help='聚焦模式下圈复杂度不低于该值的方法整体发给AI分析，0为不按复杂度选取')
+    parser.add_argument('--batch-tokens', type=int, default=0,
+                        help='把相邻的小文件合并到一个AI分析请求中，每个请求的源码不超过约N个token，0为不合并')
+    parser.add_argument('--batch-max-files', type=int, default=DEFAULT_BATCH_MAX_FILES,
+                        help='每个批量分析请求最多包含的文件数')
+    parser.add_argument('--no-health-check', action='store_true', help='启动时不检查Ollama服务和模型是否可用')
+    parser.add_argument('--breaker-threshold', type=int, default=DEFAULT_BREAKER_THRESHOLD,
+                        help='Ollama请求连续失败多少次后熔断，熔断期间的文件只做静态评审；0为不熔断')
+    parser.add_argument('--breaker-reset', type=float, default=DEFAULT_BREAKER_RESET,
+                        help='熔断多少秒后放行一个试探请求，成功则恢复AI分析')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help='Ollama请求失败后的重试次数，优先换一个端点重试')
+    parser.add_argument('--retry-backoff', type=float, default=DEFAULT_BACKOFF,
+                        help='重试退避的基数(秒)，第n次重试前随机等待0到基数*2^(n-1)秒')
+    parser.add_argument('--hedge-percentile', type=float, default=0,
+                        help='多端点时，非流式请求超过历史延迟的该百分位(如95)仍未返回就向另一个端点再发一次，0为不对冲')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式接收Ollama输出：边生成边解析，issues输出完整后立即停止生成，超时保留已生成的部分')
+    parser.add_argument('--first-token-timeout', type=float, default=DEFAULT_FIRST_TOKEN_TIMEOUT,
+                        help='流式模式下等待首个输出（含模型加载）的超时时间(秒)')
+    parser.add_argument('--total-timeout', type=float, default=DEFAULT_TOTAL_TIMEOUT,
+                        help='流式模式下单个请求生成的总时间上限(秒)')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE,
+                        help='每个Ollama端点保持的长连接数（不少于--concurrency）')
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help='连接Ollama的超时时间(秒)')
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                        help='等待Ollama响应的超时时间(秒)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='评审结果缓存目录')
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='缓存目录大小上限(MB)')
+    parser.add_argument('--no-cache', action='store_true', help='禁用评审结果缓存')
+    parser.add_argument('--no-ai-cache', action='store_true', help='禁用AI缓存（Ollama响应和含AI分析的评审结果），每个提示都重新请求')
+    parser.add_argument('--refresh-ai', action='store_true', help='忽略已缓存的AI结果重新请求，并用新结果覆盖缓存')
+    parser.add_argument('--ai-cache-ttl', type=float, default=DEFAULT_RESPONSE_TTL / 3600,
+                        help='AI缓存的有效期(小时)')
+    parser.add_argument('--ai-cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='AI缓存大小上限(MB)')
+    parser.add_argument('--changed-since', metavar='REV', help='只评审相对于指定Git版本有改动的Java文件')
+    parser.add_argument('--staged', action='store_true',
+                        help='只评审已暂存(git add)的Java文件在暂存区中的版本，适用于pre-commit钩子')
+    parser.add_argument('--only-changed-lines', action='store_true',
+                        help='配合--changed-since/--staged使用，只报告落在改动行范围内的问题')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help='排除匹配的文件或目录（gitignore语法，相对评审目录，可重复）')
+    parser.add_argument('--include', action='append', default=[], metavar='GLOB',
+                        help='只评审匹配的文件（gitignore语法，可重复）')
+    parser.add_argument('--no-gitignore', action='store_true', help='不遵循.gitignore')
+    parser.add_argument('--db', nargs='?', const=DEFAULT_DB_PATH, metavar='PATH',
+                        help=f'同时把结果记录到SQLite结果数据库（默认 {DEFAULT_DB_PATH}），可用query子命令查询')
+    parser.add_argument('--profile', action='store_true',
+                        help='打印规则和AI分析的开销排行，并输出火焰图工具可读的折叠栈文件')
+    parser.add_argument('--profile-top', type=int, default=10, help='开销排行显示的条数')
+    parser.add_argument('--profile-output', metavar='PATH', help='折叠栈输出路径（默认写到输出目录）')
     
     args = parser.parse_args()
+    args.ollama_api = ','.join(args.ollama_api or ['http://localhost:11434/api/generate'])
     
+    # JSONL写到标准输出时，进度信息改写到标准错误，保证标准输出只有JSONL记录
+    if args.format == 'jsonl' and args.jsonl_output == '-':
+        stream = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            run_review(args, stream)
+    else:
+        run_review(args)
+
+
+def run_review(args: argparse.Namespace, jsonl_stream=None):
+    """按命令行参数执行AI增强评审并生成报告"""
     # 创建输出目录
     os.makedirs(args.output_dir, exist_ok=True)
     
     # 查找Java文件
-    if os.path.isfile(args.path) and args.path.endswith('.java'):
+    changed_ranges = None
+    if args.changed_since or args.staged:
+        try:
+            changed_ranges = changed_java_files(args.path, args.changed_since, args.staged)
+        except GitDiffError as e:
+            print(f"错误: 无法获取Git改动: {e}")
+            return
+        java_files = list(changed_ranges)
+    elif os.path.isfile(args.path) and args.path.endswith('.java'):
         java_files = [args.path]
     elif os.path.isdir(args.path):
         from java_code_reviewer import find_java_files
-        java_files = find_java_files(args.path)
+        java_files = find_java_files(args.path, args.exclude, args.include, not args.no_gitignore)
     else:
         print(f"错误: 路径 {args.path} 不存在或不是有效的Java文件/目录")
         return
     
-    if not java_files:
-        print("未找到Java文件")
-        return
-    
-    print(f"找到 {len(java_files)} 个Java文件，开始评审...")
+    if java_files:
+        print(f"找到 {len(java_files)} 个Java文件，开始评审...")
     
-    # 执行评审
+    # 执行评审；没有文件时也生成只有汇总的报告
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    cache_stats = None
+    ai_cache = None
+    response_cache = None
     if args.no_ai:
-        reviewer = JavaCodeReviewer()
-        review_method = reviewer.review_file
+        reviewer = JavaCodeReviewer(cache=cache)
     else:
-        reviewer = AIEnhancedReviewer(args.ollama_api, args.model)
-        review_method = reviewer.review_file_with_ai
-    
-    results = []
-    improvement_suggestions = {}
-    unit_test_suggestions = {}
-    
-    for java_file in java_files:
-        print(f"正在评审: {java_file}")
-        result = review_method(java_file)
-        results.append(result)
-        print(f"  评分: {result.score}/100, 问题数: {len(result.issues)}")
-        
-        # 生成AI建议（如果启用）
-        if not args.no_ai and isinstance(reviewer, AIEnhancedReviewer):
-            print(f"  生成改进建议...")
-            improvement_suggestions[java_file] = reviewer.generate_improvement_suggestions(java_file)
-            
-            print(f"  生成测试建议...")
-            unit_test_suggestions[java_file] = reviewer.generate_unit_tests(java_file)
+        # AI缓存放在评审缓存目录下，--no-cache只禁用静态评审结果的缓存；
+        # 评审结果和Ollama响应两层共用目录和大小上限，命中统计分开计数
+        if not args.no_ai_cache:
+            ai_dir = os.path.join(args.cache_dir, 'ollama')
+            ai_cache = ResponseCache(ai_dir, args.ai_cache_max_mb * 1024 * 1024, args.ai_cache_ttl * 3600)
+            response_cache = ResponseCache(ai_dir, args.ai_cache_max_mb * 1024 * 1024, args.ai_cache_ttl * 3600)
+        client = OllamaClient(max(args.pool_size, args.concurrency), args.connect_timeout, args.read_timeout,
+                              cache=response_cache, refresh=args.refresh_ai, breaker_threshold=args.breaker_threshold,
+                              breaker_reset=args.breaker_reset)
+        reviewer = AIEnhancedReviewer(args.ollama_api, args.model, cache=cache, client=client,
+                                      refresh=args.refresh_ai, stream=args.stream,
+                                      first_token_timeout=args.first_token_timeout,
+                                      total_timeout=args.total_timeout, concurrency=args.concurrency,
+                                      chunk_lines=args.chunk_lines, focus=args.focus,
+                                      focus_radius=args.focus_radius,
+                                      complexity_threshold=args.complexity_threshold,
+                                      batch_tokens=args.batch_tokens, batch_max_files=args.batch_max_files,
+                                      retries=args.retries, retry_backoff=args.retry_backoff,
+                                      hedge_percentile=args.hedge_percentile, ai_cache=ai_cache)
+        if java_files and not args.no_health_check:
+            healthy, detail = reviewer.endpoints.health_check(args.model)
+            if not healthy and args.breaker_threshold <= 0:
+                print(f"⚠️ Ollama服务不可用（{detail}），熔断已关闭，仍为每个文件发送请求")
+            elif not healthy:
+                print(f"⚠️ Ollama服务不可用（{detail}），先只做静态评审，每{args.breaker_reset:g}秒试探一次")
+            elif detail:
+                print(f"⚠️ 部分Ollama端点不可用（{detail}），请求只发往其余端点")
     
-    # 生成报告
+    # 结果和AI建议逐个写入报告，不在内存中保留
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
+    writers = []
     if args.format in ['json', 'both']:
         json_file = os.path.join(args.output_dir, f'ai_java_review_{timestamp}.json')
-        ReportGenerator.generate_json_report(results, json_file)
-        print(f"JSON报告已生成: {json_file}")
-    
+        writers.append(("JSON报告", JsonReportWriter(json_file)))
     if args.format in ['markdown', 'both']:
         md_file = os.path.join(args.output_dir, f'ai_java_review_{timestamp}.md')
-        ReportGenerator.generate_markdown_report(results, md_file)
-        print(f"Markdown报告已生成: {md_file}")
-    
+        writers.append(("Markdown报告", MarkdownReportWriter(md_file)))
+    comprehensive = None
     if args.format in ['comprehensive']:
         comp_file = os.path.join(args.output_dir, f'ai_java_review_comprehensive_{timestamp}.md')
-        EnhancedReportGenerator.generate_comprehensive_report(
-            results, comp_file, improvement_suggestions, unit_test_suggestions
-        )
-        print(f"综合报告已生成: {comp_file}")
+        comprehensive = ComprehensiveReportWriter(comp_file)
+        writers.append(("综合报告", comprehensive))
+    if args.format == 'jsonl':
+        jsonl_file = args.jsonl_output or os.path.join(args.output_dir, f'ai_java_review_{timestamp}.jsonl')
+        writers.append(("JSONL问题流", JsonlReportWriter(jsonl_file, jsonl_stream)))
+    if args.db:
+        writers.append(("结果数据库", ResultsDbWriter(args.db, "ai_enhanced_reviewer", args.path, args.staged)))
+    summary = ReportSummary()
+    # 只在--profile时汇总开销，报告内容不含耗时
+    profiler = None
+    if args.profile:
+        collapsed_file = args.profile_output or os.path.join(args.output_dir, f'ai_java_review_{timestamp}.folded')
+        profiler = RuleProfiler(collapsed_file)
+    
+    # AI分析和建议生成并发进行，结果按文件顺序汇总
+    suggestions = {"generated": 0, "failed": 0, "skipped": 0}
+    for review in review_files_with_ai(reviewer, java_files, args.concurrency, args.staged):
+        java_file = review.file_path
+        result = review.result
+        print(f"已评审: {java_file}")
+        if profiler is not None:
+            profiler.add(java_file, review.profile)
+        if changed_ranges is not None and args.only_changed_lines:
+            result = restrict_to_changed_lines(result, changed_ranges[java_file])
+        summary.add(result)
+        for text in (review.improvement, review.unit_tests):
+            suggestions[_suggestion_outcome(text)] += 1
+        print(f"  评分: {result.score}/100, 问题数: {len(result.issues)}")
+        
+        for _, writer in writers:
+            if writer is comprehensive:
+                writer.add(result, review.improvement, review.unit_tests)
+            else:
+                writer.add(result)
+    
+    if profiler is not None:
+        profiler.close()
+    if summary.total_files == 0:
+        print("未找到Java文件")
+    if ai_cache is not None:
+        ai_cache.prune()
+    if cache is not None:
+        cache.prune()
+        cache_stats = cache.stats()
+    
+    # 生成报告
+    for label, writer in writers:
+        writer.close(cache_stats, profiler.stats() if profiler is not None else None)
+        if writer.output_file != '-':
+            print(f"{label}已生成: {writer.output_file}")
     
     # 输出简要统计
-    total_issues = sum(len(result.issues) for result in results)
-    avg_score = sum(result.score for result in results) / len(results) if results else 0
     print(f"\n评审完成!")
-    print(f"总文件数: {len(results)}")
-    print(f"总问题数: {total_issues}")
-    print(f"平均评分: {avg_score:.1f}/100")
+    print(f"总文件数: {summary.total_files}")
+    print(f"总问题数: {summary.total_issues}")
+    print(f"平均评分: {summary.average_score:.1f}/100")
+    if cache_stats is not None:
+        print(f"缓存命中: {cache_stats['hits']}, 未命中: {cache_stats['misses']}")
     
     if not args.no_ai:
-        print(f"AI分析: 已生成改进建议和测试建议")
+        print(f"AI建议: 生成 {suggestions['generated']} 条, 失败 {suggestions['failed']} 条, "
+              f"Ollama不可用跳过 {suggestions['skipped']} 条")
+        print(f"Ollama连接: {reviewer.endpoints.format_stats()}")
+        if reviewer.static_fallbacks:
+            print(f"⚠️ Ollama不可用期间有 {reviewer.static_fallbacks} 个文件只做了静态评审")
+        if ai_cache is not None:
+            ai_stats = ai_cache.stats()
+            response_stats = response_cache.stats()
+            print(f"AI结果缓存命中: {ai_stats['hits']}, 未命中: {ai_stats['misses']}")
+            print(f"Ollama响应缓存命中: {response_stats['hits']}, 未命中: {response_stats['misses']}")
+        reviewer.close()
+    
+    if args.profile:
+        profiler.print_top(args.profile_top)
+        print(f"折叠栈已生成: {collapsed_file}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评审性能基准测试
+生成可配置规模的合成Java语料，测量评审、报告生成和CI质量门禁的吞吐量、峰值内存和各规则开销，
+结果输出为JSON，便于跨版本跟踪；每次测量在独立的子进程中进行，峰值内存只属于该次测量
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import subprocess
+import platform
+import tempfile
+import argparse
+import contextlib
+import statistics
+from typing import Any, Dict, List, Optional, Tuple
+
+from java_code_reviewer import (JsonlReportWriter, JsonReportWriter, MarkdownReportWriter, ReportSummary,
+                                RuleProfiler, review_files)
+from file_walker import iter_java_files
+from ci_integration import CIIntegration
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不统计峰值内存
+    resource = None
+
+
+# 每个子目录（包）中的文件数
+FILES_PER_PACKAGE = 200
+
+# 语料目录中记录生成参数的文件，参数相同时直接复用已生成的语料
+CORPUS_MANIFEST = "corpus.json"
+
+# 回归门禁比较的指标：名称 -> (测量结果中的路径, 是否越大越好)
+GATED_METRICS = {
+    "review.files_per_sec": (("review", "files_per_sec"), True),
+    "review.lines_per_sec": (("review", "lines_per_sec"), True),
+    "reports.files_per_sec": (("reports", "files_per_sec"), True),
+    "ci_gate.files_per_sec": (("ci_gate", "files_per_sec"), True),
+    "peak_rss_mb.self": (("peak_rss_mb", "self"), False),
+    "peak_rss_mb.children": (("peak_rss_mb", "children"), False),
+}
+
+# 提交在仓库中的基线结果，由默认语料参数和 --repeat 7 生成
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json")
+
+# 回归门禁默认的预热和测量次数；门禁比较各次测量中的最好值，次数越多越不受偶发干扰影响
+GATE_WARMUP = 1
+GATE_REPEAT = 7
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽被测代码的控制台输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def peak_rss_mb() -> Optional[Dict[str, float]]:
+    """当前进程和已结束子进程的峰值常驻内存(MB)，在测量子进程中调用，只反映这一次测量"""
+    if resource is None:
+        return None
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1)
+    }
+
+
+class CorpusGenerator:
+    """合成Java语料生成器
+
+    每个文件由字段和若干方法组成，按给定密度（每条语句出现的概率）混入会触发评审规则的代码：
+    空catch块、循环中的字符串拼接、超长行，以及方法之间的静态SimpleDateFormat字段。
+    同一随机种子生成的语料完全相同。
+    """
+
+    def __init__(self, lines_per_file: int = 200, catch_density: float = 0.02,
+                 concat_density: float = 0.02, sdf_density: float = 0.01,
+                 long_line_density: float = 0.01, seed: int = 42):
+        self.lines_per_file = lines_per_file
+        self.catch_density = catch_density
+        self.concat_density = concat_density
+        self.sdf_density = sdf_density
+        self.long_line_density = long_line_density
+        self.seed = seed
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "lines_per_file": self.lines_per_file,
+            "catch_density": self.catch_density,
+            "concat_density": self.concat_density,
+            "sdf_density": self.sdf_density,
+            "long_line_density": self.long_line_density,
+            "seed": self.seed
+        }
+
+    def _statement(self, rng: random.Random, n: int) -> list:
+        """生成一条语句（可能跨多行），按密度混入目标代码"""
+        roll = rng.random()
+        if roll < self.catch_density:
+            body = ["        } catch (IOException e) {", "        }"] if rng.random() < 0.5 else \
+                   ["        } catch (IOException e) {", "            log.error(\"读取失败\", e);", "        }"]
+            return ["        try {", f"            reader.read(buffer, 0, {n % 64 + 1});"] + body
+        roll -= self.catch_density
+        if roll < self.concat_density:
+            return ["        for (int i = 0; i < items.size(); i++) {",
+                    f"            String label{n} = \"item\" + i + items.get(i);",
+                    f"            result = result + label{n};",
+                    "        }"]
+        roll -= self.concat_density
+        if roll < self.long_line_density:
+            args = ", ".join(f"\"argument{n}_{k}\"" for k in range(8))
+            return [f"        String joined{n} = String.join(\",\", java.util.Arrays.asList({args}));"]
+        kind = rng.randrange(4)
+        if kind == 0:
+            return [f"        int value{n} = count * {rng.randrange(2, 500)};"]
+        if kind == 1:
+            return ["        if (items.isEmpty()) {", f"            return \"empty{n}\";", "        }"]
+        if kind == 2:
+            return [f"        // 处理第{n}步", "        count += items.size();"]
+        return [f"        items.add(\"value{n}\");"]
+
+    def generate_file(self, index: int) -> str:
+        rng = random.Random(self.seed * 1_000_003 + index)
+        package = index // FILES_PER_PACKAGE
+        lines = [
+            f"package bench.pkg{package:04d};",
+            "",
+            "import java.io.IOException;",
+            "import java.io.Reader;",
+            "import java.text.SimpleDateFormat;",
+            "import java.util.ArrayList;",
+            "import java.util.List;",
+            "import org.slf4j.Logger;",
+            "import org.slf4j.LoggerFactory;",
+            "",
+            f"public class Generated{index:06d} {{",
+            f"    private static final Logger log = LoggerFactory.getLogger(Generated{index:06d}.class);",
+            "    private Reader reader;",
+            "    private final char[] buffer = new char[1024];",
+            "",
+        ]
+
+        method = 0
+        n = 0
+        while len(lines) < self.lines_per_file - 3:
+            lines += [f"    public String process{method}(List<String> items) throws IOException {{",
+                      "        String result = \"\";",
+                      "        int count = 0;"]
+            static_fields = []
+            for _ in range(rng.randrange(4, 12)):
+                if rng.random() < self.sdf_density:
+                    static_fields.append(
+                        f"    private static SimpleDateFormat FORMAT_{n} = new SimpleDateFormat(\"yyyy-MM-dd\");")
+                lines += self._statement(rng, n)
+                n += 1
+            lines += ["        return result;", "    }", ""]
+            if static_fields:
+                lines += static_fields + [""]
+            method += 1
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def generate(self, corpus_dir: str, files: int) -> Dict[str, Any]:
+        """在corpus_dir中生成files个文件；目录中已有参数相同的语料时直接复用"""
+        manifest_path = os.path.join(corpus_dir, CORPUS_MANIFEST)
+        config = dict(self.config(), files=files)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get("config") == config:
+                return manifest
+        except (OSError, ValueError):
+            pass
+
+        if os.path.isdir(corpus_dir) and os.listdir(corpus_dir):
+            # 只清理本工具生成的语料目录，避免误删用户目录
+            if not os.path.exists(manifest_path):
+                raise ValueError(f"语料目录 {corpus_dir} 非空且不是生成的语料，请指定空目录或新目录")
+            shutil.rmtree(corpus_dir)
+        total_lines = 0
+        total_bytes = 0
+        for index in range(files):
+            package_dir = os.path.join(corpus_dir, f"pkg{index // FILES_PER_PACKAGE:04d}")
+            if index % FILES_PER_PACKAGE == 0:
+                os.makedirs(package_dir, exist_ok=True)
+            content = self.generate_file(index)
+            total_lines += content.count("\n")
+            total_bytes += len(content.encode('utf-8'))
+            with open(os.path.join(package_dir, f"Generated{index:06d}.java"), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        manifest = {"config": config, "files": files, "lines": total_lines, "bytes": total_bytes}
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return manifest
+
+
+def profile_rules(corpus_dir: str, jobs: int = 1) -> Dict[str, Any]:
+    """单独评审一遍语料，记录各规则的耗时；计时本身有开销，不用于吞吐量测量"""
+    profiler = RuleProfiler()
+    for _ in review_files(iter_java_files(corpus_dir), jobs, None, profiler):
+        pass
+    profiler.close()
+    return profiler.stats()["rules"]
+
+
+def run_benchmark(corpus_dir: str, jobs: int = 1) -> Dict[str, Any]:
+    """在当前进程中对语料执行一次完整测量：评审（含流式报告写入）、CI质量门禁，以及各规则开销
+
+    评审不使用缓存，也不计时各规则，与正常运行走同一条路径；报告写入的耗时单独统计，从评审耗时中扣除。
+    CI质量门禁与ci_integration相同，逐行读取JSONL问题流再检查。
+    峰值内存在以上测量结束时读取；各规则开销随后由profile_rules另外评审一遍得到。
+    """
+    summary = ReportSummary()
+    with tempfile.TemporaryDirectory(prefix="review_bench_") as output_dir:
+        jsonl_file = os.path.join(output_dir, "report.jsonl")
+        writers = [JsonReportWriter(os.path.join(output_dir, "report.json")),
+                   MarkdownReportWriter(os.path.join(output_dir, "report.md")),
+                   JsonlReportWriter(jsonl_file)]
+
+        report_seconds = 0.0
+        start = time.perf_counter()
+        for result in review_files(iter_java_files(corpus_dir), jobs):
+            summary.add(result)
+            write_start = time.perf_counter()
+            for writer in writers:
+                writer.add(result)
+            report_seconds += time.perf_counter() - write_start
+        write_start = time.perf_counter()
+        for writer in writers:
+            writer.close()
+        report_seconds += time.perf_counter() - write_start
+        review_seconds = time.perf_counter() - start - report_seconds
+        report_bytes = sum(os.path.getsize(writer.output_file) for writer in writers)
+
+        # CI质量门禁：读取JSONL问题流并检查
+        start = time.perf_counter()
+        with _quiet():
+            with open(jsonl_file, 'r', encoding='utf-8') as f:
+                report_data = CIIntegration._read_issue_stream(f)
+            CIIntegration(min_score=0, max_errors=sys.maxsize, max_warnings=sys.maxsize) \
+                .check_quality_gates(report_data)
+        gate_seconds = time.perf_counter() - start
+        del report_data
+    peak_rss = peak_rss_mb()
+
+    lines = summary.total_lines
+    return {
+        "review": {
+            "seconds": round(review_seconds, 4),
+            "files": summary.total_files,
+            "lines": lines,
+            "issues": summary.total_issues,
+            "files_per_sec": round(summary.total_files / review_seconds, 1) if review_seconds else None,
+            "lines_per_sec": round(lines / review_seconds, 1) if review_seconds else None
+        },
+        "reports": {
+            "seconds": round(report_seconds, 4),
+            "bytes": report_bytes,
+            "files_per_sec": round(summary.total_files / report_seconds, 1) if report_seconds else None
+        },
+        "ci_gate": {
+            "seconds": round(gate_seconds, 4),
+            "files_per_sec": round(summary.total_files / gate_seconds, 1) if gate_seconds else None
+        },
+        "rules": profile_rules(corpus_dir, jobs),
+        "peak_rss_mb": peak_rss
+    }
+
+
+def measure(corpus_dir: str, jobs: int = 1) -> Dict[str, Any]:
+    """在新的子进程中执行一次run_benchmark，峰值内存不受预热和前几次测量的影响"""
+    cmd = [sys.executable, os.path.abspath(__file__), '--measure', corpus_dir, '--jobs', str(jobs)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+    if proc.returncode != 0:
+        raise RuntimeError(f"测量子进程失败: {proc.stderr.strip()}")
+    return json.loads(proc.stdout)
+
+
+def _lookup(measurement: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value = measurement
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def summarize(measurements: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """对多次测量的每个指标计算最好值、中位数和离散度
+    
+    best为越大越好的指标取最大值、越小越好的指标取最小值，回归门禁比较的就是它；
+    离散度用中位数绝对偏差（MAD）表示，rel_spread为MAD相对中位数的比例，只用于展示测量是否稳定。
+    """
+    metrics = {}
+    for name, (path, higher_is_better) in GATED_METRICS.items():
+        samples = [value for value in (_lookup(m, path) for m in measurements) if value is not None]
+        if not samples:
+            continue
+        median = statistics.median(samples)
+        mad = statistics.median(abs(value - median) for value in samples)
+        metrics[name] = {
+            "best": max(samples) if higher_is_better else min(samples),
+            "median": median,
+            "min": min(samples),
+            "max": max(samples),
+            "mad": mad,
+            "rel_spread": round(mad / median, 4) if median else 0.0,
+            "samples": samples
+        }
+    return metrics
+
+
+def _best(stats: Dict[str, Any], higher_is_better: bool) -> float:
+    """指标的最好值；没有best字段的旧基线由最大值、最小值得到"""
+    if "best" in stats:
+        return stats["best"]
+    return stats["max"] if higher_is_better else stats["min"]
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_throughput_drop: float,
+            max_memory_rise: float) -> Tuple[bool, List[str]]:
+    """把本次结果与基线比较，返回(是否通过, 逐项说明)
+    
+    两侧都取多次测量中的最好值：机器上的其他负载只会让吞吐量变低、内存不受影响，
+    最好值比中位数稳定得多。吞吐量下降超过max_throughput_drop、峰值内存上升超过max_memory_rise
+    即判为回归，阈值就是配置的容差，不随任一侧的测量离散度放宽。
+    """
+    current_metrics = current.get("metrics") or summarize([current])
+    baseline_metrics = baseline.get("metrics") or summarize([baseline])
+    passed = True
+    lines = []
+    for name, (_, higher_is_better) in GATED_METRICS.items():
+        if name not in current_metrics or name not in baseline_metrics:
+            continue
+        base = _best(baseline_metrics[name], higher_is_better)
+        cur = _best(current_metrics[name], higher_is_better)
+        if not base:
+            continue
+        change = (cur - base) / base
+        tolerance = max_throughput_drop if higher_is_better else max_memory_rise
+        worse = -change if higher_is_better else change
+        regressed = worse > tolerance
+        passed = passed and not regressed
+        status = "❌ 回归" if regressed else "✅"
+        lines.append(f"{status} {name}: {base:.1f} -> {cur:.1f} "
+                     f"({change * 100:+.1f}%, 允许 {tolerance * 100:.1f}%)")
+
+    # 各规则每千行耗时，只提示不判定，用于定位是哪个规则变慢
+    base_rules = baseline.get("rules") or {}
+    for rule, stats in (current.get("rules") or {}).items():
+        cost = stats["seconds"] / stats["lines"] * 1000 if stats.get("lines") else 0
+        if rule not in base_rules:
+            lines.append(f"ℹ️ 新规则 {rule}: {cost * 1000:.2f} 毫秒/千行")
+            continue
+        base_stats = base_rules[rule]
+        base_cost = base_stats["seconds"] / base_stats["lines"] * 1000 if base_stats.get("lines") else 0
+        if base_cost and cost > base_cost * (1 + max_throughput_drop) * 1.5:
+            lines.append(f"⚠️ 规则 {rule} 变慢: {base_cost * 1000:.2f} -> {cost * 1000:.2f} 毫秒/千行")
+    return passed, lines
+
+
+def environment() -> Dict[str, Any]:
+    """运行环境信息，比较不同机器上的结果时参考"""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='Java代码评审性能基准测试')
+    parser.add_argument('--files', type=int, default=1000, help='语料文件数（如1000到100000）')
+    parser.add_argument('--lines', type=int, default=200, help='每个文件的行数')
+    parser.add_argument('--catch-density', type=float, default=0.02, help='每条语句为try/catch的概率')
+    parser.add_argument('--concat-density', type=float, default=0.02, help='每条语句为循环中字符串拼接的概率')
+    parser.add_argument('--sdf-density', type=float, default=0.01, help='每条语句对应一个静态SimpleDateFormat字段的概率')
+    parser.add_argument('--long-line-density', type=float, default=0.01, help='每条语句为超长行的概率')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--corpus-dir', help='语料目录（默认临时目录，结束后删除；参数相同时复用已有语料）')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='评审进程数')
+    parser.add_argument('--output', '-o', help='结果JSON输出路径（默认输出到标准输出），可提交为基线文件')
+    parser.add_argument('--repeat', type=int,
+                        help=f'重复测量次数（默认1次，--compare时默认{GATE_REPEAT}次），回归门禁比较各次中的最好值')
+    parser.add_argument('--warmup', type=int,
+                        help=f'正式测量前丢弃的预热次数（默认0次，--compare时默认{GATE_WARMUP}次）')
+    parser.add_argument('--compare', action='store_true', help='与基线结果比较，发生回归时以非零状态退出')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='基线结果文件（默认为仓库中的 benchmarks/baseline.json）')
+    parser.add_argument('--max-throughput-drop', type=float, default=0.10, help='允许的吞吐量下降比例')
+    parser.add_argument('--max-memory-rise', type=float, default=0.15, help='允许的峰值内存上升比例')
+    # 内部使用：在子进程中对已生成的语料测量一次，结果JSON写到标准输出
+    parser.add_argument('--measure', metavar='CORPUS_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        print(json.dumps(run_benchmark(args.measure, args.jobs), ensure_ascii=False))
+        return
+    if args.repeat is None:
+        args.repeat = GATE_REPEAT if args.compare else 1
+    if args.warmup is None:
+        args.warmup = GATE_WARMUP if args.compare else 0
+    
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"错误: 无法读取基线 {args.baseline}: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    generator = CorpusGenerator(args.lines, args.catch_density, args.concat_density,
+                                args.sdf_density, args.long_line_density, args.seed)
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="review_corpus_")
+    try:
+        start = time.perf_counter()
+        try:
+            corpus = generator.generate(corpus_dir, args.files)
+        except ValueError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+        generate_seconds = time.perf_counter() - start
+        print(f"语料: {corpus['files']} 个文件, {corpus['lines']} 行 ({generate_seconds:.1f}秒)", file=sys.stderr)
+
+        try:
+            for _ in range(args.warmup):
+                measure(corpus_dir, args.jobs)
+            measurements = []
+            for i in range(max(1, args.repeat)):
+                measurements.append(measure(corpus_dir, args.jobs))
+                if args.repeat > 1:
+                    review = measurements[-1]["review"]
+                    print(f"  第{i + 1}次: {review['files_per_sec']} 文件/秒", file=sys.stderr)
+        except RuntimeError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    # 明细字段取评审吞吐量居中的那次测量，metrics为全部测量的统计
+    measurements.sort(key=lambda m: m["review"]["files_per_sec"] or 0)
+    measurement = measurements[len(measurements) // 2]
+    result = {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "environment": environment(),
+        "corpus": corpus,
+        "jobs": args.jobs,
+        "repeat": len(measurements),
+        **measurement,
+        "metrics": summarize(measurements)
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"基准结果已写入: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    review = measurement["review"]
+    print(f"评审: {review['files_per_sec']} 文件/秒, {review['lines_per_sec']} 行/秒", file=sys.stderr)
+    
+    if baseline is not None:
+        if baseline.get("corpus", {}).get("config") != corpus["config"] or baseline.get("jobs") != args.jobs:
+            print("错误: 基线的语料参数或进程数与本次不同，无法比较", file=sys.stderr)
+            sys.exit(2)
+        passed, lines = compare(result, baseline, args.max_throughput_drop, args.max_memory_rise)
+        print(f"\n与基线 {args.baseline} 比较:", file=sys.stderr)
+        for line in lines:
+            print(f"  {line}", file=sys.stderr)
+        if not passed:
+            print("❌ 性能回归超出允许范围", file=sys.stderr)
+            sys.exit(1)
+        print("✅ 性能基准检查通过", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
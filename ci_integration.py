@@ -9,10 +9,14 @@ import os
 import sys
 import subprocess
 import json
+import tempfile
 from pathlib import Path
 from typing import Dict, List, Any
 import argparse
 
+from git_diff import GitDiffError, changed_java_files
+from file_walker import iter_java_entries
+
 
 class CIIntegration:
     """CI/CD集成类"""
@@ -24,40 +28,55 @@ class CIIntegration:
         self.failed = False
         self.results = {}
     
-    def run_code_review(self, path: str, use_ai: bool = False) -> Dict[str, Any]:
-        """运行代码评审"""
+    def run_code_review(self, path: str, use_ai: bool = False, changed_since: str = None,
+                        staged: bool = False, only_changed_lines: bool = False) -> Dict[str, Any]:
+        """运行代码评审
+
+        指定changed_since或staged时只评审Git改动过的Java文件，没有改动时直接返回空报告
+        """
         print(f"🔍 开始代码评审: {path}")
+        path = os.path.abspath(path)
         
-        # 选择评审工具
-        if use_ai:
-            cmd = [sys.executable, "ai_enhanced_reviewer.py", path, "--format", "json"]
-        else:
-            cmd = [sys.executable, "java_code_reviewer.py", path, "--format", "json"]
-        
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=Path(__file__).parent)
-            
-            if result.returncode != 0:
-                print(f"❌ 代码评审失败: {result.stderr}")
-                self.failed = True
-                return {}
-            
-            # 查找生成的JSON报告
-            reports_dir = Path(__file__).parent / "reports"
-            json_files = list(reports_dir.glob("*.json"))
-            
-            if not json_files:
-                print("❌ 未找到生成的报告文件")
+        # 增量模式下先确认是否有改动，避免无改动时误读旧报告
+        if changed_since or staged:
+            try:
+                changes = changed_java_files(path, changed_since, staged)
+            except GitDiffError as e:
+                print(f"❌ 无法获取Git改动: {e}")
                 self.failed = True
                 return {}
+            if not changes:
+                print("✅ 没有改动的Java文件，跳过评审")
+                return self._empty_report()
+            print(f"📝 改动的Java文件: {len(changes)} 个")
+        
+        # 选择评审工具，问题以JSONL流的形式从标准输出逐行读取
+        tool = "ai_enhanced_reviewer.py" if use_ai else "java_code_reviewer.py"
+        cmd = [sys.executable, tool, path, "--format", "jsonl", "--jsonl-output", "-"]
+        
+        if staged:
+            cmd.append("--staged")
+        elif changed_since:
+            cmd += ["--changed-since", changed_since]
+        if only_changed_lines and (staged or changed_since):
+            cmd.append("--only-changed-lines")
+        
+        try:
+            with tempfile.TemporaryFile('w+', encoding='utf-8') as stderr:
+                with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True,
+                                      encoding='utf-8', cwd=Path(__file__).parent) as proc:
+                    report_data = self._read_issue_stream(proc.stdout)
+                
+                if proc.returncode != 0:
+                    stderr.seek(0)
+                    print(f"❌ 代码评审失败: {stderr.read()}")
+                    self.failed = True
+                    return {}
             
-            # 读取最新的报告
-            latest_report = max(json_files, key=lambda x: x.stat().st_mtime)
-            
-            with open(latest_report, 'r', encoding='utf-8') as f:
-                report_data = json.load(f)
-            
-            print(f"✅ 代码评审完成，报告: {latest_report.name}")
+            if not report_data["files"]:
+                print("⚠️ 未找到需要评审的Java文件")
+            else:
+                print(f"✅ 代码评审完成，共 {len(report_data['files'])} 个文件")
             return report_data
             
         except Exception as e:
@@ -65,6 +84,48 @@ class CIIntegration:
             self.failed = True
             return {}
     
+    @staticmethod
+    def _empty_report() -> Dict[str, Any]:
+        """没有评审任何文件时的报告数据"""
+        return {"summary": {"total_files": 0, "total_issues": 0, "average_score": 0,
+                            "files_with_errors": 0},
+                "files": []}
+    
+    @staticmethod
+    def _read_issue_stream(stream) -> Dict[str, Any]:
+        """逐行读取评审工具输出的JSONL问题流，错误一出现就打印，并汇总为与JSON报告相同结构的报告数据"""
+        report_data = CIIntegration._empty_report()
+        pending_issues = []
+        for line in stream:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.pop("type", None)
+            if kind == "issue":
+                pending_issues.append({
+                    "line_number": record["line"],
+                    "severity": record["severity"],
+                    "category": record["category"],
+                    "rule": record.get("rule", ""),
+                    "message": record["message"],
+                    "suggestion": record.get("suggestion", "")
+                })
+                if record["severity"] == "error":
+                    print(f"  ❌ {record['file']}:{record['line']} {record['message']}")
+            elif kind == "file":
+                report_data["files"].append({
+                    "file_path": record["file"],
+                    "file_name": record["file_name"],
+                    "total_lines": record["total_lines"],
+                    "issues": pending_issues,
+                    "score": record["score"],
+                    "summary": record["summary"]
+                })
+                pending_issues = []
+            elif kind == "summary":
+                report_data["summary"] = record
+        return report_data
+    
     def check_quality_gates(self, report_data: Dict[str, Any]) -> bool:
         """检查质量门禁"""
         if not report_data:
@@ -73,6 +134,10 @@ class CIIntegration:
         summary = report_data.get("summary", {})
         files = report_data.get("files", [])
         
+        if not files:
+            print("\n📊 质量门禁检查结果: 没有需要评审的文件")
+            return not self.failed
+        
         # 检查总体评分
         avg_score = summary.get("average_score", 0)
         if avg_score < self.min_score:
@@ -161,7 +226,7 @@ class CIIntegration:
 # 自动生成的代码评审钩子
 
 echo "🔍 运行代码评审..."
-python3 {Path(__file__).parent}/ci_integration.py {path} --min-score 70 --max-errors 0
+python3 {Path(__file__).parent}/ci_integration.py {Path(path).resolve()} --staged --min-score 70 --max-errors 0
 
 if [ $? -ne 0 ]; then
     echo "❌ 代码评审失败，提交被阻止"
@@ -196,8 +261,7 @@ echo "✅ 代码评审通过，允许提交"
         while True:
             try:
                 # 检查文件变化
-                java_files = list(Path(path).rglob("*.java"))
-                current_modified = {f: f.stat().st_mtime for f in java_files}
+                current_modified = {entry.path: entry.stat().st_mtime for entry in iter_java_entries(path)}
                 
                 # 找出变化的文件
                 changed_files = []
@@ -206,7 +270,7 @@ echo "✅ 代码评审通过，允许提交"
                         changed_files.append(file_path)
                 
                 if changed_files:
-                    print(f"📝 检测到文件变化: {[f.name for f in changed_files]}")
+                    print(f"📝 检测到文件变化: {[os.path.basename(f) for f in changed_files]}")
                     
                     # 运行评审
                     report_data = self.run_code_review(path)
@@ -241,6 +305,9 @@ def main():
     parser.add_argument('--setup-hooks', action='store_true', help='设置Git钩子')
     parser.add_argument('--watch', action='store_true', help='持续监控模式')
     parser.add_argument('--watch-interval', type=int, default=30, help='监控间隔(秒)')
+    parser.add_argument('--changed-since', metavar='REV', help='只评审相对于指定Git版本有改动的Java文件')
+    parser.add_argument('--staged', action='store_true', help='只评审已暂存的Java文件(pre-commit)')
+    parser.add_argument('--only-changed-lines', action='store_true', help='只报告改动行范围内的问题')
     
     args = parser.parse_args()
     
@@ -260,7 +327,8 @@ def main():
     print("🚀 开始CI/CD代码质量检查...")
     
     # 运行代码评审
-    report_data = ci.run_code_review(args.path, args.use_ai)
+    report_data = ci.run_code_review(args.path, args.use_ai, args.changed_since,
+                                     args.staged, args.only_changed_lines)
     
     if not report_data:
         print("❌ 代码评审失败")
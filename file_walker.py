@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Java文件查找
+基于os.scandir的目录遍历：尽早剪枝构建输出和版本控制目录，遵循.gitignore和包含/排除规则，
+边遍历边产出文件路径，评审流水线无需等待整棵目录树遍历结束
+"""
+
+import os
+import re
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+
+# 任何位置都不进入的目录
+EXCLUDED_DIRS = frozenset({
+    '.git', '.hg', '.svn', '.idea', '.gradle', '.review_cache', '__pycache__',
+    'node_modules', 'generated-sources', 'generated-test-sources',
+})
+
+# 与构建文件同级时视为构建输出的目录；不与构建文件同级时可能是普通的包目录，照常进入
+BUILD_OUTPUT_DIRS = frozenset({'target', 'build', 'out', 'bin'})
+BUILD_FILES = frozenset({'pom.xml', 'build.gradle', 'build.gradle.kts', 'build.xml'})
+
+
+def _translate(pattern: str) -> str:
+    """把gitignore风格的通配符转换为正则表达式（匹配以/分隔的相对路径）"""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**/', i):
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern.startswith('**', i):
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class IgnoreRule:
+    """一条gitignore风格的规则
+
+    不含/的规则匹配任意层级的文件名，含/的规则相对规则所在目录锚定；
+    以/结尾的规则只匹配目录，以!开头的规则取消之前的忽略。
+    """
+
+    __slots__ = ('negate', 'dir_only', 'regex')
+
+    def __init__(self, pattern: str):
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if '/' in pattern:
+            regex = _translate(pattern.lstrip('/'))
+        else:
+            regex = '(?:.*/)?' + _translate(pattern)
+        self.regex = re.compile(regex + r'\Z', re.S)
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        return (is_dir or not self.dir_only) and self.regex.match(rel_path) is not None
+
+
+def parse_ignore_lines(lines: Iterable[str]) -> List[IgnoreRule]:
+    """解析.gitignore内容，跳过空行和注释"""
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip('\r')
+        if not line.strip() or line.startswith('#'):
+            continue
+        if not line.endswith('\\ '):
+            line = line.rstrip()
+        rules.append(IgnoreRule(line))
+    return rules
+
+
+def _load_gitignore(directory: str) -> List[IgnoreRule]:
+    try:
+        with open(os.path.join(directory, '.gitignore'), 'r', encoding='utf-8', errors='replace') as f:
+            return parse_ignore_lines(f)
+    except OSError:
+        return []
+
+
+# 规则作用域：(规则目录相对遍历起点的前缀, 遍历起点相对规则目录的前缀, 规则)
+# 前者用于起点之下的.gitignore，后者用于起点之上的.gitignore，二者至多一个非空
+_RuleScope = Tuple[str, str, List[IgnoreRule]]
+
+
+def _ancestor_scopes(root: str) -> List[_RuleScope]:
+    """遍历起点位于Git仓库子目录时，收集仓库根目录到起点之间各级目录的.gitignore"""
+    if os.path.exists(os.path.join(root, '.git')):
+        return []
+    scopes = []
+    directory = os.path.dirname(root)
+    while True:
+        rules = _load_gitignore(directory)
+        if rules:
+            root_prefix = os.path.relpath(root, directory).replace(os.sep, '/') + '/'
+            scopes.append(('', root_prefix, rules))
+        if os.path.exists(os.path.join(directory, '.git')):
+            scopes.reverse()
+            return scopes
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return []
+        directory = parent
+
+
+def _is_ignored(scopes: Sequence[_RuleScope], rel_path: str, is_dir: bool) -> bool:
+    """按gitignore语义判断：所有作用域中最后一条匹配的规则决定结果"""
+    ignored = False
+    for dir_prefix, root_prefix, rules in scopes:
+        local = root_prefix + rel_path[len(dir_prefix):]
+        for rule in rules:
+            if rule.matches(local, is_dir):
+                ignored = not rule.negate
+    return ignored
+
+
+def iter_java_entries(root: str, excludes: Sequence[str] = (), includes: Sequence[str] = (),
+                      use_gitignore: bool = True) -> Iterator[os.DirEntry]:
+    """深度优先遍历root，逐个产出Java文件的DirEntry
+
+    excludes  排除规则（gitignore语法，相对root），匹配的目录整体剪枝
+    includes  包含规则，非空时只产出至少匹配一条的文件
+    同一目录内按名称排序，先产出文件再进入子目录，结果顺序稳定。
+    """
+    exclude_scopes: List[_RuleScope] = [('', '', parse_ignore_lines(excludes))] if excludes else []
+    include_rules = parse_ignore_lines(includes)
+    base_scopes: List[_RuleScope] = _ancestor_scopes(os.path.abspath(root)) if use_gitignore else []
+
+    # 栈元素：(目录路径, 相对root的路径前缀, 生效的规则作用域)
+    stack: List[Tuple[str, str, List[_RuleScope]]] = [(root, '', base_scopes)]
+    while stack:
+        directory, prefix, scopes = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        if use_gitignore and any(entry.name == '.gitignore' for entry in entries):
+            rules = _load_gitignore(directory)
+            if rules:
+                scopes = scopes + [(prefix, '', rules)]
+        has_build_file = any(entry.name in BUILD_FILES for entry in entries)
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            rel_path = prefix + name
+            if is_dir:
+                if name in EXCLUDED_DIRS or (has_build_file and name in BUILD_OUTPUT_DIRS):
+                    continue
+                if scopes and _is_ignored(scopes, rel_path, True):
+                    continue
+                if exclude_scopes and _is_ignored(exclude_scopes, rel_path, True):
+                    continue
+                subdirs.append((entry.path, rel_path + '/', scopes))
+            elif name.endswith('.java'):
+                if scopes and _is_ignored(scopes, rel_path, False):
+                    continue
+                if exclude_scopes and _is_ignored(exclude_scopes, rel_path, False):
+                    continue
+                if include_rules and not any(rule.matches(rel_path, False) for rule in include_rules):
+                    continue
+                yield entry
+
+        stack.extend(reversed(subdirs))
+
+
+def iter_java_files(root: str, excludes: Sequence[str] = (), includes: Sequence[str] = (),
+                    use_gitignore: bool = True) -> Iterator[str]:
+    """逐个产出root下Java文件的路径"""
+    for entry in iter_java_entries(root, excludes, includes, use_gitignore):
+        yield entry.path
@@ -1,11 +1,15 @@
 # generate_utils.py
-import requests
 import json
 import os
 
+from ollama_client import OllamaClient
+
 # Ollama API 地址
 OLLAMA_API = "http://localhost:11434/api/generate"
 
+# 所有生成请求共用一个长连接
+client = OllamaClient(read_timeout=300)
+
 # 要生成的工具类列表
 utils = [
     {
@@ -31,9 +35,7 @@ def call_ollama(prompt, model="deepseek-coder:6.7b"):
         "stream": False
     }
     try:
-        response = requests.post(OLLAMA_API, json=data)
-        response.raise_for_status()
-        return response.json()["response"]
+        return client.post_json(OLLAMA_API, data)["response"]
     except Exception as e:
         return f"Error: {e}"
 
@@ -64,4 +66,6 @@ for util in utils:
 
     print(f"✅ 已生成: {filename}")
 
+print(f"Ollama连接: {client.format_stats()}")
+client.close()
 print("\n🎉 所有工具类生成完成！")
\ No newline at end of file
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Java源码分块
+按类成员（方法、构造器、初始化块、内部类）把大文件切成若干块，每块附带由包声明、导入、
+类声明和字段声明组成的头部，供AI逐块分析；块内行号可以映射回文件行号。
+各函数可传入静态评审已生成的屏蔽视图(masked_lines)，不传时自行做一次词法分析
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from java_lexer import JavaSource
+
+
+DEFAULT_CHUNK_LINES = 200
+DEFAULT_FOCUS_RADIUS = 10
+DEFAULT_COMPLEXITY_THRESHOLD = 10
+
+# 圈复杂度的分支点：条件、循环、case、catch、短路逻辑和三元运算符
+_BRANCH_RE = re.compile(r'\b(?:if|for|while|case|catch)\b|&&|\|\||\?')
+
+# 块内被省略代码的位置标记，对应的文件行号为0
+GAP_MARKER = "    // ..."
+
+
+@dataclass
+class SourceChunk:
+    """一个代码块：按文件顺序排列的若干行，line_map[i]为块内第i+1行对应的文件行号"""
+    lines: List[str]
+    line_map: List[int]
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+    def file_line(self, chunk_line) -> int:
+        """块内行号对应的文件行号，超出范围或落在省略标记上时为0"""
+        try:
+            index = int(chunk_line) - 1
+        except (TypeError, ValueError):
+            return 0
+        if 0 <= index < len(self.line_map):
+            return self.line_map[index]
+        return 0
+
+
+def split_members(content: str,
+                  masked_lines: Optional[List[str]] = None) -> Tuple[List[int], List[Tuple[int, int]]]:
+    """把源码分为头部行和成员
+
+    返回(头部行号列表, 成员(起始行, 结束行)列表)，行号从1开始。
+    头部为顶层类型之外的行（包声明、导入、类声明及其闭括号）和以分号结束的成员（字段、抽象方法）；
+    其余带代码块的成员各占一个范围，紧挨在成员之前的注解和注释属于该成员。
+    """
+    lines = content.split('\n')
+    masked = masked_lines if masked_lines is not None else JavaSource(content).masked_lines
+    header: List[int] = []
+    members: List[Tuple[int, int]] = []
+    depth = 0
+    start = 0
+    nested = False
+    for line_no, (line, code) in enumerate(zip(lines, masked), 1):
+        line_depth = depth
+        deepest = depth
+        for c in code:
+            if c == '{':
+                depth += 1
+                deepest = max(deepest, depth)
+            elif c == '}' and depth > 0:
+                depth -= 1
+
+        if line_depth != 1:
+            if start:
+                nested = nested or deepest >= 2
+                if depth <= 1:
+                    # 成员在本行结束
+                    _close_member(header, members, start, line_no, code, nested)
+                    start = 0
+                    nested = False
+            elif line.strip():
+                header.append(line_no)
+            continue
+
+        if not start:
+            if not line.strip():
+                continue
+            if depth < 1:
+                # 类型体的闭括号
+                header.append(line_no)
+                continue
+            start = line_no
+        nested = nested or deepest >= 2
+        if depth == 1 and (nested or code.rstrip().endswith(';')):
+            _close_member(header, members, start, line_no, code, nested)
+            start = 0
+            nested = False
+    if start:
+        members.append((start, len(lines)))
+    return header, members
+
+
+def _close_member(header: List[int], members: List[Tuple[int, int]], start: int, end: int,
+                  code: str, nested: bool):
+    if nested and not code.rstrip().endswith(';'):
+        members.append((start, end))
+    else:
+        header.extend(range(start, end + 1))
+
+
+def _render(lines: List[str], line_numbers: List[int]) -> SourceChunk:
+    chunk_lines = []
+    line_map = []
+    previous = 0
+    for line_no in line_numbers:
+        if previous and any(lines[i].strip() for i in range(previous, line_no - 1)):
+            chunk_lines.append(GAP_MARKER)
+            line_map.append(0)
+        chunk_lines.append(lines[line_no - 1])
+        line_map.append(line_no)
+        previous = line_no
+    return SourceChunk(chunk_lines, line_map)
+
+
+def chunk_source(content: str, max_lines: int = DEFAULT_CHUNK_LINES,
+                 masked_lines: Optional[List[str]] = None) -> List[SourceChunk]:
+    """把源码切成若干块，每块的成员代码合计不超过max_lines行（单个成员超过时独占一块）
+
+    不超过max_lines行的文件、找不到成员的文件只返回一个包含全文的块。
+    """
+    lines = content.split('\n')
+    if len(lines) <= max_lines:
+        return [SourceChunk(lines, list(range(1, len(lines) + 1)))]
+    header, members = split_members(content, masked_lines)
+    if not members:
+        return [SourceChunk(lines, list(range(1, len(lines) + 1)))]
+
+    groups: List[List[Tuple[int, int]]] = []
+    size = 0
+    for member in members:
+        member_lines = member[1] - member[0] + 1
+        if groups and size + member_lines <= max_lines:
+            groups[-1].append(member)
+            size += member_lines
+        else:
+            groups.append([member])
+            size = member_lines
+
+    chunks = []
+    for group in groups:
+        line_numbers = set(header)
+        for first, last in group:
+            line_numbers.update(range(first, last + 1))
+        chunks.append(_render(lines, sorted(line_numbers)))
+    return chunks
+
+
+def member_complexity(masked_lines: List[str], first: int, last: int) -> int:
+    """成员的圈复杂度（分支点数加1），在屏蔽视图上统计，字符串和注释中的关键字不计入"""
+    return 1 + sum(len(_BRANCH_RE.findall(masked_lines[i - 1])) for i in range(first, last + 1))
+
+
+def focus_chunk(content: str, focus_lines: Iterable[int], radius: int = DEFAULT_FOCUS_RADIUS,
+                complexity_threshold: int = DEFAULT_COMPLEXITY_THRESHOLD,
+                masked_lines: Optional[List[str]] = None) -> Optional[SourceChunk]:
+    """只保留可疑区域的代码块：每个关注行前后radius行、关注行所在成员的声明行，
+    以及圈复杂度不低于complexity_threshold的整个成员，再加上头部；没有可疑区域时返回None
+    """
+    lines = content.split('\n')
+    masked = masked_lines if masked_lines is not None else JavaSource(content).masked_lines
+    header, members = split_members(content, masked)
+    selected = set()
+    for line_no in focus_lines:
+        if not 1 <= line_no <= len(lines):
+            continue
+        selected.update(range(max(1, line_no - radius), min(len(lines), line_no + radius) + 1))
+        for first, last in members:
+            if first <= line_no <= last:
+                selected.add(first)
+                break
+    if complexity_threshold > 0:
+        for first, last in members:
+            if member_complexity(masked, first, last) >= complexity_threshold:
+                selected.update(range(first, last + 1))
+    if not selected:
+        return None
+    return _render(lines, sorted(selected.union(header)))
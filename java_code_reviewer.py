@@ -8,12 +8,28 @@ Java代码自动评审工具
 
 import os
 import re
+import sys
+import hashlib
 import json
 import ast
 from datetime import datetime
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Sequence, Set, Tuple
+from dataclasses import dataclass, asdict, astuple
 import argparse
+import contextlib
+import shutil
+import tempfile
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, chain, islice
+from time import perf_counter
+
+from java_lexer import JavaSource
+from review_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ResultCache
+from results_db import DEFAULT_DB_PATH, ResultsDbWriter, query_main
+from git_diff import GitDiffError, LineRange, changed_java_files, in_ranges, read_staged
+from file_walker import iter_java_files
 
 
 @dataclass
@@ -24,6 +40,7 @@ class CodeIssue:
     category: str  # "style", "thread_safety", "logging", "exception", "performance"
     message: str
     suggestion: str
+    rule: str = ""  # 产生该问题的规则名，AI分析的问题为 "ai_analysis"
 
 
 @dataclass
@@ -37,354 +54,552 @@ class ReviewResult:
     summary: str
 
 
+_BRACE_RE = re.compile(r'[{}]')
+_NON_WS_RE = re.compile(r'\S')
+_LOG_MARKERS = ('log.', 'Logger', 'System.out')
+
+
+class LineTable:
+    """逐行事实的列式表
+    
+    读取文件时构建一次，把去空白文本、缩进、长度、注释标记等存成紧凑的array列，
+    并为规则用到的逐行标记预先计算前缀和，规则对任意行或任意行区间的查询都是O(1)。
+    stripped和各前缀和都基于词法分析后的屏蔽视图，不受字符串和注释内容干扰。
+    只保存现有规则读取的列，新增规则需要其他逐行事实时再加列。
+    """
+    
+    def __init__(self, lines: List[str], masked_lines: List[str], comment_lines: Set[int]):
+        stripped = [line.strip() for line in masked_lines]
+        self.lines = lines
+        self.stripped = stripped
+        self.size = len(lines)
+        
+        # 缩进只统计行首的空格和制表符
+        self.indent = array('I', [len(line) - len(line.lstrip(' \t')) for line in lines])
+        self.length = array('I', [len(line.strip()) for line in lines])
+        self.comment = array('b', [i in comment_lines for i in range(1, self.size + 1)])
+        
+        # 含有开括号的行，供缩进检查回看使用
+        self.brace_prefix = _prefix_sum('{' in text for text in stripped)
+        self.sdf_thread_local_prefix = _prefix_sum(
+            'ThreadLocal<SimpleDateFormat>' in text for text in stripped)
+        self.log_prefix = _prefix_sum(
+            any(marker in text for marker in _LOG_MARKERS) for text in stripped)
+    
+    def count(self, prefix: array, first: int, last: int) -> int:
+        """统计第first到第last行（含，超出范围自动截断）中标记为真的行数"""
+        first = max(first, 1)
+        last = min(last, self.size)
+        if first > last:
+            return 0
+        return prefix[last] - prefix[first - 1]
+
+
+def _prefix_sum(flags) -> array:
+    """把逐行的布尔标记转换为前缀和列，prefix[k] 为前k行中为真的行数"""
+    return array('I', accumulate(chain((0,), (1 if flag else 0 for flag in flags))))
+
+
+class BlockIndex:
+    """大括号匹配索引
+    
+    在屏蔽视图上只扫描一次，建立开括号到闭括号的配对表，字符串、字符字面量和注释中的大括号不参与匹配。
+    查询代码块的行范围、判断代码块是否为空都是常数时间。
+    """
+    
+    def __init__(self, masked_lines: List[str]):
+        content = '\n'.join(masked_lines)
+        self.line_count = len(masked_lines)
+        self.open_lines: List[int] = []   # 开括号所在行（从1开始）
+        self.open_cols: List[int] = []    # 开括号所在列
+        self.close_lines: List[int] = []  # 匹配的闭括号所在行，未闭合为0
+        # 有效代码片段计数：开括号之前、闭括号之前各有多少段非空白代码
+        self._open_marks: List[int] = []
+        self._close_marks: List[int] = []
+        self._opens_by_line: Dict[int, List[int]] = {}
+        
+        stack = []
+        marks = 0
+        pos = 0
+        line_no = 1
+        line_start = 0
+        for m in _BRACE_RE.finditer(content):
+            start = m.start()
+            if _NON_WS_RE.search(content, pos, start):
+                marks += 1
+            newlines = content.count('\n', pos, start)
+            if newlines:
+                line_no += newlines
+                line_start = content.rfind('\n', pos, start) + 1
+            pos = start + 1
+            
+            if m.group() == '{':
+                index = len(self.open_lines)
+                self.open_lines.append(line_no)
+                self.open_cols.append(start - line_start)
+                self.close_lines.append(0)
+                self._open_marks.append(marks)
+                self._close_marks.append(-1)
+                self._opens_by_line.setdefault(line_no, []).append(index)
+                stack.append(index)
+            elif stack:
+                index = stack.pop()
+                self.close_lines[index] = line_no
+                self._close_marks[index] = marks
+            marks += 1
+        
+        if _NON_WS_RE.search(content, pos):
+            marks += 1
+        self._total_marks = marks
+    
+    def block_after(self, line_no: int, col: int) -> Optional[int]:
+        """查找位于指定位置之后、本行或下一行的第一个开括号，返回代码块编号"""
+        for index in self._opens_by_line.get(line_no, ()):
+            if self.open_cols[index] > col:
+                return index
+        following = self._opens_by_line.get(line_no + 1)
+        return following[0] if following else None
+    
+    def line_range(self, index: int) -> Tuple[int, int]:
+        """代码块的起止行号，未闭合的代码块延伸到文件末尾"""
+        return self.open_lines[index], self.close_lines[index] or self.line_count
+    
+    def is_empty(self, index: int) -> bool:
+        """代码块内是否没有任何代码（只有空白或注释）"""
+        end = self._close_marks[index]
+        if end < 0:
+            end = self._total_marks
+        return end - self._open_marks[index] == 1
+
+
+class ReviewContext:
+    """单个文件的评审上下文，保存所有规则共享的逐行数据
+    
+    每次评审调用各自创建上下文，评审器本身不保存任何逐文件状态，
+    因此同一个评审器实例可以被多个线程或异步任务并发使用。
+    源码只做一次词法分析，规则读取的 stripped 行来自屏蔽视图。
+    """
+    
+    def __init__(self, file_path: str, content: str):
+        self.file_path = file_path
+        self.source = JavaSource(content)
+        self.lines = content.split('\n')
+        self.table = LineTable(self.lines, self.source.masked_lines, self.source.comment_lines)
+        self.stripped = self.table.stripped
+        self._blocks: Optional[BlockIndex] = None
+    
+    @property
+    def blocks(self) -> BlockIndex:
+        """大括号匹配索引，首次使用时构建"""
+        if self._blocks is None:
+            self._blocks = BlockIndex(self.source.masked_lines)
+        return self._blocks
+    
+    def catch_block(self, line_no: int) -> Optional[int]:
+        """catch语句对应代码块的编号，找不到代码块时返回None"""
+        col = self.source.masked_lines[line_no - 1].find('catch')
+        return self.blocks.block_after(line_no, col)
+    
+    def has_log_between(self, first: int, last: int) -> bool:
+        """第first到第last行（含）之间是否有日志输出"""
+        table = self.table
+        return table.count(table.log_prefix, first, last) > 0
+
+
+# 规则访问函数签名: (上下文, 行号(从1开始), 去除首尾空白的行, 本规则的问题列表)
+RuleVisitor = Callable[[ReviewContext, int, str, List[CodeIssue]], None]
+
+
+@dataclass
+class ReviewRule:
+    """评审规则：逐行访问的检查项"""
+    name: str
+    visit: RuleVisitor
+
+
+# 规则注册表，评审引擎按注册顺序执行规则并输出问题
+RULE_REGISTRY: List[ReviewRule] = []
+
+
+def register_rule(name: str):
+    """注册评审规则的装饰器"""
+    def decorator(func: RuleVisitor) -> RuleVisitor:
+        RULE_REGISTRY.append(ReviewRule(name, func))
+        return func
+    return decorator
+
+
+_TOP_LEVEL_PREFIXES = ('public class', 'class ', 'public interface', 'interface ',
+                       'public enum', 'enum ', 'package ', 'import ')
+_BLOCK_PREFIXES = ('{', '}', 'if', 'for', 'while', 'try', 'catch', 'finally', 'return', 'throw')
+_MODIFIER_PREFIXES = ('public', 'private', 'protected', 'static')
+_METHOD_CALL_RE = re.compile(r'^[a-z][a-zA-Z0-9]*\s*\(')
+_METHOD_NAME_RE = re.compile(r'^([a-z][a-zA-Z0-9]*)')
+_CAMEL_CASE_RE = re.compile(r'^[a-z][a-zA-Z0-9]*$')
+_PRIVATE_STATIC_RE = re.compile(r'^\s*private\s+static\s+')
+_MAGIC_NUMBER_RE = re.compile(r'\b\d{2,}\b')
+_HEX_BIN_RE = re.compile(r'(0x|0b)')
+
+
+@register_rule("code_style")
+def _check_code_style(ctx: ReviewContext, i: int, line: str, issues: List[CodeIssue]):
+    """检查代码风格"""
+    # 跳过空行和注释（注释在屏蔽视图中为空白）
+    if not line:
+        return
+    
+    indented = ctx.table.indent[i - 1] > 0
+    
+    # 简化的缩进检查 - 只检查明显的缩进问题
+    # 检查顶级声明（类、接口、枚举等）不应该有缩进
+    if line.startswith(_TOP_LEVEL_PREFIXES):
+        if indented:
+            issues.append(CodeIssue(
+                i, "warning", "style",
+                "顶级声明不应有缩进",
+                "移除不必要的缩进"
+            ))
+    
+    # 检查方法体内容应该有缩进（简化检查）
+    elif line.startswith(_BLOCK_PREFIXES):
+        # 只检查明显缺少缩进的情况
+        if not indented and not line.startswith(_MODIFIER_PREFIXES):
+            # 进一步检查是否真的需要缩进
+            if _needs_indentation(ctx, i):
+                issues.append(CodeIssue(
+                    i, "warning", "style",
+                    "代码块缺少适当缩进",
+                    "使用4个空格进行缩进"
+                ))
+
+
+def _needs_indentation(ctx: ReviewContext, line_num: int) -> bool:
+    """检查行是否需要缩进"""
+    # 检查前10行（含本行）是否出现开括号，即是否在方法体、类体等需要缩进的上下文中
+    table = ctx.table
+    return table.count(table.brace_prefix, line_num - 9, line_num) > 0
+
+
+@register_rule("code_style_additional")
+def _check_code_style_additional(ctx: ReviewContext, i: int, line: str, issues: List[CodeIssue]):
+    """检查额外的代码风格问题"""
+    # 检查行长度（按原始行计算）
+    length = ctx.table.length[i - 1]
+    if length > 120:
+        issues.append(CodeIssue(
+            i, "info", "style",
+            f"行长度过长 ({length} 字符)",
+            "考虑将长行拆分为多行"
+        ))
+    
+    # 检查命名规范
+    if _METHOD_CALL_RE.match(line):  # 方法名
+        method_name = _METHOD_NAME_RE.match(line)
+        if method_name and not _CAMEL_CASE_RE.match(method_name.group(1)):
+            issues.append(CodeIssue(
+                i, "warning", "style",
+                "方法名不符合驼峰命名规范",
+                "方法名应以小写字母开头，使用驼峰命名法"
+            ))
+
+
+@register_rule("thread_safety")
+def _check_thread_safety(ctx: ReviewContext, i: int, line: str, issues: List[CodeIssue]):
+    """检查线程安全"""
+    # 检查ThreadLocal使用 - 这是正确的线程安全实践
+    if 'ThreadLocal<SimpleDateFormat>' in line:
+        issues.append(CodeIssue(
+            i, "info", "thread_safety",
+            "使用了ThreadLocal包装SimpleDateFormat",
+            "这是处理SimpleDateFormat线程安全的最佳实践"
+        ))
+    
+    # 检查synchronized使用
+    if 'synchronized (sdf)' in line:
+        issues.append(CodeIssue(
+            i, "info", "thread_safety",
+            "使用了synchronized关键字",
+            "确保了对共享资源的同步访问"
+        ))
+    
+    # 检查静态SimpleDateFormat - 只有在没有ThreadLocal保护时才报错
+    if _PRIVATE_STATIC_RE.match(line):
+        if 'SimpleDateFormat' in line and 'ThreadLocal' not in line:
+            # 检查是否在类级别有ThreadLocal保护
+            table = ctx.table
+            class_has_threadlocal = table.count(table.sdf_thread_local_prefix, i - 19, i + 20) > 0
+            
+            if not class_has_threadlocal:
+                issues.append(CodeIssue(
+                    i, "error", "thread_safety",
+                    "静态SimpleDateFormat不是线程安全的",
+                    "使用ThreadLocal包装或每次创建新实例"
+                ))
+
+
+@register_rule("logging")
+def _check_logging(ctx: ReviewContext, i: int, line: str, issues: List[CodeIssue]):
+    """检查日志使用"""
+    # 检查System.out.println使用
+    if 'System.out.println' in line:
+        issues.append(CodeIssue(
+            i, "warning", "logging",
+            "使用了System.out.println进行输出",
+            "建议使用专业的日志框架如SLF4J + Logback"
+        ))
+    
+    # 检查System.err.println使用
+    if 'System.err.println' in line:
+        issues.append(CodeIssue(
+            i, "warning", "logging",
+            "使用了System.err.println进行错误输出",
+            "建议使用日志框架的ERROR级别"
+        ))
+    
+    # 检查异常处理中的日志
+    if 'catch' in line and 'Exception' in line:
+        # 检查catch块中是否有日志记录
+        block = ctx.catch_block(i)
+        if block is not None and not ctx.has_log_between(*ctx.blocks.line_range(block)):
+            issues.append(CodeIssue(
+                i, "warning", "logging",
+                "异常处理中缺少日志记录",
+                "在catch块中记录异常信息，便于调试和监控"
+            ))
+
+
+@register_rule("exception_handling")
+def _check_exception_handling(ctx: ReviewContext, i: int, line: str, issues: List[CodeIssue]):
+    """检查异常处理"""
+    # 检查空的catch块
+    if 'catch' in line and 'Exception' in line:
+        # 检查catch块是否为空或只有注释
+        block = ctx.catch_block(i)
+        if block is not None and ctx.blocks.is_empty(block):
+            issues.append(CodeIssue(
+                i, "error", "exception",
+                "空的catch块",
+                "至少应该记录异常或重新抛出"
+            ))
+    
+    # 检查throws声明
+    if 'throws Exception' in line:
+        issues.append(CodeIssue(
+            i, "warning", "exception",
+            "抛出了通用的Exception",
+            "应该抛出更具体的异常类型，如IOException、IllegalArgumentException等"
+        ))
+    
+    # 检查空值检查
+    if 'null ==' in line or 'null !=' in line:
+        issues.append(CodeIssue(
+            i, "info", "null_safety",
+            "使用了null == 或 null != 的比较方式",
+            "建议使用Objects.equals()或Objects.isNull()/Objects.nonNull()"
+        ))
+    
+    # 检查可能的空指针异常风险
+    if ('.' in line and
+        not any(keyword in line for keyword in ['import', 'package', 'class', 'interface'])):
+        # 检查链式调用但没有空值检查
+        if line.count('.') > 2 and 'null' not in line and 'if' not in line:
+            issues.append(CodeIssue(
+                i, "warning", "null_safety",
+                "链式调用可能存在空指针异常风险",
+                "建议添加空值检查或使用Optional"
+            ))
+
+
+@register_rule("performance")
+def _check_performance(ctx: ReviewContext, i: int, line: str, issues: List[CodeIssue]):
+    """检查性能问题"""
+    # 检查String拼接
+    if '+' in line and 'String' in line:
+        if line.count('+') > 3:
+            issues.append(CodeIssue(
+                i, "warning", "performance",
+                "多次字符串拼接可能影响性能",
+                "考虑使用StringBuilder"
+            ))
+    
+    # 检查循环中的字符串操作
+    if 'for' in line and ('String' in line or '+' in line):
+        issues.append(CodeIssue(
+            i, "info", "performance",
+            "循环中可能存在字符串操作",
+            "检查是否需要使用StringBuilder"
+        ))
+
+
+@register_rule("best_practices")
+def _check_best_practices(ctx: ReviewContext, i: int, line: str, issues: List[CodeIssue]):
+    """检查最佳实践"""
+    # 检查魔法数字
+    if _MAGIC_NUMBER_RE.search(line) and not _HEX_BIN_RE.search(line):
+        issues.append(CodeIssue(
+            i, "info", "style",
+            "可能存在魔法数字",
+            "考虑定义为常量"
+        ))
+    
+    # 检查TODO/FIXME（只在注释中查找）
+    if ctx.table.comment[i - 1] and ('TODO' in ctx.lines[i - 1] or 'FIXME' in ctx.lines[i - 1]):
+        issues.append(CodeIssue(
+            i, "info", "style",
+            "发现TODO或FIXME标记",
+            "及时处理待办事项"
+        ))
+
+
+def result_to_record(result: ReviewResult) -> list:
+    """把评审结果转换为紧凑的列表记录，用于进程间传输和缓存"""
+    return [result.file_path, result.file_name, result.total_lines,
+            [astuple(issue) for issue in result.issues], result.score, result.summary]
+
+
+def record_to_result(record: list, file_path: Optional[str] = None) -> ReviewResult:
+    """把记录还原为ReviewResult，指定file_path时替换记录中的文件路径"""
+    path, file_name, total_lines, issues, score, summary = record
+    if file_path is not None:
+        path, file_name = file_path, os.path.basename(file_path)
+    return ReviewResult(path, file_name, total_lines,
+                        [CodeIssue(*issue) for issue in issues], score, summary)
+
+
+def read_source(file_path: str) -> str:
+    """读取Java源文件，读取失败时抛出异常"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def unreadable_result(file_path: str, error: Exception) -> ReviewResult:
+    """文件无法读取时的评审结果"""
+    return ReviewResult(
+        file_path=file_path,
+        file_name=os.path.basename(file_path),
+        total_lines=0,
+        issues=[CodeIssue(0, "error", "file", f"无法读取文件: {error}", "检查文件路径和权限")],
+        score=0,
+        summary="文件读取失败"
+    )
+
+
 class JavaCodeReviewer:
     """Java代码评审器"""
     
-    def __init__(self):
-        self.issues = []
-        self.current_file = ""
-        
-    def review_file(self, file_path: str) -> ReviewResult:
-        """评审单个Java文件"""
-        self.issues = []
-        self.current_file = file_path
+    def __init__(self, rules: Optional[List[ReviewRule]] = None, cache: Optional[ResultCache] = None):
+        self.rules = list(rules) if rules is not None else list(RULE_REGISTRY)
+        self.cache = cache
+        self._fingerprint: Optional[str] = None
+    
+    @property
+    def fingerprint(self) -> str:
+        """规则集指纹：由规则名称和实现规则、词法分析的模块源码决定，任一变化都会使缓存失效"""
+        if self._fingerprint is None:
+            module_names = {rule.visit.__module__ for rule in self.rules}
+            module_names.add(JavaSource.__module__)
+            paths = sorted({getattr(sys.modules.get(name), '__file__', None) or '' for name in module_names})
+            parts = [rule.name for rule in self.rules]
+            for path in paths:
+                if path:
+                    with open(path, 'rb') as f:
+                        parts.append(hashlib.sha256(f.read()).hexdigest())
+            self._fingerprint = ResultCache.make_key(*parts)
+        return self._fingerprint
+    
+    def review_file(self, file_path: str, profile: Optional[Dict[str, tuple]] = None) -> ReviewResult:
+        """评审单个Java文件，启用缓存时内容未变的文件直接返回缓存结果
         
+        传入profile字典时，实际执行了规则的文件会在其中记录各规则的(耗时秒数, 遍历行数, 问题数)，
+        以及构建评审上下文（词法分析、行表）的开销，键为 CONTEXT_PROFILE_KEY。
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
+            content = read_source(file_path)
         except Exception as e:
-            return ReviewResult(
-                file_path=file_path,
-                file_name=os.path.basename(file_path),
-                total_lines=0,
-                issues=[CodeIssue(0, "error", "file", f"无法读取文件: {e}", "检查文件路径和权限")],
-                score=0,
-                summary="文件读取失败"
-            )
+            return unreadable_result(file_path, e)
+        return self.review_source(file_path, content, profile)
+    
+    def review_source(self, file_path: str, content: str,
+                      profile: Optional[Dict[str, tuple]] = None) -> ReviewResult:
+        """评审内存中的Java源码，file_path只用于报告，不读取磁盘（可评审编辑器中未保存的内容）"""
+        return self._review_with_context(file_path, content, profile)[0]
+    
+    def _review_with_context(self, file_path: str, content: str, profile: Optional[Dict[str, tuple]] = None
+                             ) -> Tuple[ReviewResult, Optional[ReviewContext]]:
+        """评审并返回构建的评审上下文，供后续分析复用词法分析结果；缓存命中时上下文为None"""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResultCache.make_key(self.fingerprint, content)
+            record = self.cache.get(cache_key)
+            if record is not None:
+                return record_to_result(record, file_path), None
         
-        # 执行各种检查
-        self._check_code_style(lines)
-        self._check_code_style_additional(lines)
-        self._check_thread_safety(lines)
-        self._check_logging(lines)
-        self._check_exception_handling(lines)
-        self._check_performance(lines)
-        self._check_best_practices(lines)
+        # 词法分析和行表只构建一次，所有检查规则共用
+        start = perf_counter()
+        ctx = ReviewContext(file_path, content)
+        total_lines = len(ctx.lines)
+        if profile is not None:
+            profile[CONTEXT_PROFILE_KEY] = (perf_counter() - start, total_lines, 0)
+        issues = self._run_rules(ctx, profile)
         
         # 计算评分
-        score = self._calculate_score(len(lines))
+        score = self._calculate_score(issues, total_lines)
         
         # 生成摘要
-        summary = self._generate_summary()
+        summary = self._generate_summary(issues)
         
-        return ReviewResult(
+        result = ReviewResult(
             file_path=file_path,
             file_name=os.path.basename(file_path),
-            total_lines=len(lines),
-            issues=self.issues,
+            total_lines=total_lines,
+            issues=issues,
             score=score,
             summary=summary
         )
+        if cache_key is not None:
+            self.cache.put(cache_key, result_to_record(result))
+        return result, ctx
     
-    def _check_code_style(self, lines: List[str]):
-        """检查代码风格"""
-        for i, line in enumerate(lines, 1):
-            original_line = line
-            line = line.strip()
-            
-            # 跳过空行和注释
-            if not line or line.startswith('//') or line.startswith('*') or line.startswith('/*'):
-                continue
-            
-            # 简化的缩进检查 - 只检查明显的缩进问题
-            # 检查顶级声明（类、接口、枚举等）不应该有缩进
-            if (line.startswith('public class') or line.startswith('class ') or 
-                line.startswith('public interface') or line.startswith('interface ') or
-                line.startswith('public enum') or line.startswith('enum ') or
-                line.startswith('package ') or line.startswith('import ')):
-                
-                if original_line.startswith(' ') or original_line.startswith('\t'):
-                    self.issues.append(CodeIssue(
-                        i, "warning", "style",
-                        "顶级声明不应有缩进",
-                        "移除不必要的缩进"
-                    ))
-            
-            # 检查方法体内容应该有缩进（简化检查）
-            elif (line.startswith('{') or line.startswith('}') or 
-                  line.startswith('if') or line.startswith('for') or 
-                  line.startswith('while') or line.startswith('try') or
-                  line.startswith('catch') or line.startswith('finally') or
-                  line.startswith('return') or line.startswith('throw')):
-                
-                # 只检查明显缺少缩进的情况
-                if (not original_line.startswith(' ') and not original_line.startswith('\t') and
-                    not line.startswith('public') and not line.startswith('private') and
-                    not line.startswith('protected') and not line.startswith('static')):
-                    # 进一步检查是否真的需要缩进
-                    if self._needs_indentation(line, i, lines):
-                        self.issues.append(CodeIssue(
-                            i, "warning", "style",
-                            "代码块缺少适当缩进",
-                            "使用4个空格进行缩进"
-                        ))
-    
-    def _needs_indentation(self, line: str, line_num: int, lines: List[str]) -> bool:
-        """检查行是否需要缩进"""
-        # 检查是否在方法体、类体等需要缩进的上下文中
-        for i in range(max(0, line_num - 10), line_num):
-            prev_line = lines[i].strip()
-            if ('{' in prev_line and 
-                not prev_line.startswith('//') and 
-                not prev_line.startswith('*')):
-                return True
-        return False
-    
-    def _check_code_style_additional(self, lines: List[str]):
-        """检查额外的代码风格问题"""
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # 检查行长度
-            if len(line) > 120:
-                self.issues.append(CodeIssue(
-                    i, "info", "style",
-                    f"行长度过长 ({len(line)} 字符)",
-                    "考虑将长行拆分为多行"
-                ))
-            
-            # 检查空行使用
-            if i > 1 and lines[i-2].strip() and line and not line.startswith('//'):
-                if not any(keyword in line for keyword in ['public', 'private', 'protected', 'static', 'class', 'interface']):
-                    if not any(keyword in lines[i-2] for keyword in ['{', '}', ';']):
-                        pass  # 这里可以添加更复杂的空行检查逻辑
-            
-            # 检查命名规范
-            if re.match(r'^[a-z][a-zA-Z0-9]*\s*\(', line):  # 方法名
-                method_name = re.match(r'^([a-z][a-zA-Z0-9]*)', line)
-                if method_name and not re.match(r'^[a-z][a-zA-Z0-9]*$', method_name.group(1)):
-                    self.issues.append(CodeIssue(
-                        i, "warning", "style",
-                        "方法名不符合驼峰命名规范",
-                        "方法名应以小写字母开头，使用驼峰命名法"
-                    ))
-    
-    def _check_thread_safety(self, lines: List[str]):
-        """检查线程安全"""
-        has_thread_local = False
-        has_synchronized = False
-        has_volatile = False
+    def _run_rules(self, ctx: ReviewContext, profile: Optional[Dict[str, tuple]] = None) -> List[CodeIssue]:
+        """单次遍历所有行并驱动全部规则，问题按规则注册顺序合并
         
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # 检查ThreadLocal使用 - 这是正确的线程安全实践
-            if 'ThreadLocal' in line:
-                has_thread_local = True
-                if 'ThreadLocal<SimpleDateFormat>' in line:
-                    self.issues.append(CodeIssue(
-                        i, "info", "thread_safety",
-                        "使用了ThreadLocal包装SimpleDateFormat",
-                        "这是处理SimpleDateFormat线程安全的最佳实践"
-                    ))
-            
-            # 检查synchronized使用
-            if 'synchronized' in line:
-                has_synchronized = True
-                if 'synchronized (sdf)' in line:
-                    self.issues.append(CodeIssue(
-                        i, "info", "thread_safety",
-                        "使用了synchronized关键字",
-                        "确保了对共享资源的同步访问"
-                    ))
-            
-            # 检查volatile使用
-            if 'volatile' in line:
-                has_volatile = True
-            
-            # 检查静态SimpleDateFormat - 只有在没有ThreadLocal保护时才报错
-            if re.match(r'^\s*private\s+static\s+', line):
-                if 'SimpleDateFormat' in line and 'ThreadLocal' not in line:
-                    # 检查是否在类级别有ThreadLocal保护
-                    class_has_threadlocal = False
-                    for j in range(max(0, i-20), min(len(lines), i+20)):
-                        if 'ThreadLocal<SimpleDateFormat>' in lines[j]:
-                            class_has_threadlocal = True
-                            break
-                    
-                    if not class_has_threadlocal:
-                        self.issues.append(CodeIssue(
-                            i, "error", "thread_safety",
-                            "静态SimpleDateFormat不是线程安全的",
-                            "使用ThreadLocal包装或每次创建新实例"
-                        ))
-    
-    def _check_logging(self, lines: List[str]):
-        """检查日志使用"""
-        has_logger = False
-        has_system_out = False
+        传入profile时累加每次visit调用的耗时，写入各规则的开销；不传时不计时。
+        """
+        buckets = [[] for _ in self.rules]
+        visitors = [(rule.visit, bucket) for rule, bucket in zip(self.rules, buckets)]
         
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # 检查System.out.println使用
-            if 'System.out.println' in line:
-                has_system_out = True
-                self.issues.append(CodeIssue(
-                    i, "warning", "logging",
-                    "使用了System.out.println进行输出",
-                    "建议使用专业的日志框架如SLF4J + Logback"
-                ))
-            
-            # 检查System.err.println使用
-            if 'System.err.println' in line:
-                self.issues.append(CodeIssue(
-                    i, "warning", "logging",
-                    "使用了System.err.println进行错误输出",
-                    "建议使用日志框架的ERROR级别"
-                ))
-            
-            # 检查日志框架
-            if 'Logger' in line or 'log.' in line:
-                has_logger = True
-            
-            # 检查异常处理中的日志
-            if 'catch' in line and 'Exception' in line:
-                # 检查catch块中是否有日志记录
-                catch_line = i
-                has_log_in_catch = False
-                for j in range(i, min(i + 10, len(lines))):
-                    if 'log.' in lines[j] or 'Logger' in lines[j] or 'System.out' in lines[j]:
-                        has_log_in_catch = True
-                        break
-                
-                if not has_log_in_catch:
-                    self.issues.append(CodeIssue(
-                        catch_line, "warning", "logging",
-                        "异常处理中缺少日志记录",
-                        "在catch块中记录异常信息，便于调试和监控"
-                    ))
-    
-    def _check_exception_handling(self, lines: List[str]):
-        """检查异常处理"""
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # 检查空的catch块
-            if 'catch' in line and 'Exception' in line:
-                # 查找对应的catch块内容
-                brace_count = 0
-                catch_content = []
-                in_catch_block = False
-                
-                for j in range(i, len(lines)):
-                    current_line = lines[j].strip()
-                    
-                    # 开始计算大括号
-                    if '{' in current_line:
-                        brace_count += current_line.count('{')
-                        in_catch_block = True
-                    if '}' in current_line:
-                        brace_count -= current_line.count('}')
-                    
-                    if in_catch_block and brace_count > 0:
-                        catch_content.append(current_line)
-                    
-                    # 如果大括号平衡了，说明catch块结束
-                    if in_catch_block and brace_count <= 0 and j > i:
-                        break
-                
-                # 检查catch块是否为空或只有注释
-                non_comment_content = [l for l in catch_content if l and not l.startswith('//') and not l.startswith('*') and not l.startswith('/*')]
-                if not non_comment_content:
-                    self.issues.append(CodeIssue(
-                        i, "error", "exception",
-                        "空的catch块",
-                        "至少应该记录异常或重新抛出"
-                    ))
-            
-            # 检查throws声明
-            if 'throws' in line and 'Exception' in line:
-                if 'throws Exception' in line:
-                    self.issues.append(CodeIssue(
-                        i, "warning", "exception",
-                        "抛出了通用的Exception",
-                        "应该抛出更具体的异常类型，如IOException、IllegalArgumentException等"
-                    ))
-            
-            # 检查空值检查
-            if 'null' in line and ('==' in line or '!=' in line):
-                if 'null ==' in line or 'null !=' in line:
-                    self.issues.append(CodeIssue(
-                        i, "info", "null_safety",
-                        "使用了null == 或 null != 的比较方式",
-                        "建议使用Objects.equals()或Objects.isNull()/Objects.nonNull()"
-                    ))
-            
-            # 检查可能的空指针异常风险
-            if ('.' in line and not line.startswith('//') and 
-                not any(keyword in line for keyword in ['import', 'package', 'class', 'interface'])):
-                # 检查链式调用但没有空值检查
-                if line.count('.') > 2 and 'null' not in line and 'if' not in line:
-                    self.issues.append(CodeIssue(
-                        i, "warning", "null_safety",
-                        "链式调用可能存在空指针异常风险",
-                        "建议添加空值检查或使用Optional"
-                    ))
-    
-    def _check_performance(self, lines: List[str]):
-        """检查性能问题"""
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # 检查String拼接
-            if '+' in line and 'String' in line:
-                if line.count('+') > 3:
-                    self.issues.append(CodeIssue(
-                        i, "warning", "performance",
-                        "多次字符串拼接可能影响性能",
-                        "考虑使用StringBuilder"
-                    ))
-            
-            # 检查循环中的字符串操作
-            if 'for' in line and ('String' in line or '+' in line):
-                self.issues.append(CodeIssue(
-                    i, "info", "performance",
-                    "循环中可能存在字符串操作",
-                    "检查是否需要使用StringBuilder"
-                ))
-    
-    def _check_best_practices(self, lines: List[str]):
-        """检查最佳实践"""
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # 检查魔法数字
-            if re.search(r'\b\d{2,}\b', line) and not re.search(r'(0x|0b)', line):
-                self.issues.append(CodeIssue(
-                    i, "info", "style",
-                    "可能存在魔法数字",
-                    "考虑定义为常量"
-                ))
-            
-            # 检查TODO/FIXME
-            if 'TODO' in line or 'FIXME' in line:
-                self.issues.append(CodeIssue(
-                    i, "info", "style",
-                    "发现TODO或FIXME标记",
-                    "及时处理待办事项"
-                ))
+        if profile is None:
+            for i, line in enumerate(ctx.stripped, 1):
+                for visit, bucket in visitors:
+                    visit(ctx, i, line, bucket)
+        else:
+            elapsed = [0.0] * len(visitors)
+            for i, line in enumerate(ctx.stripped, 1):
+                for index, (visit, bucket) in enumerate(visitors):
+                    start = perf_counter()
+                    visit(ctx, i, line, bucket)
+                    elapsed[index] += perf_counter() - start
+            line_count = len(ctx.stripped)
+            for rule, bucket, seconds in zip(self.rules, buckets, elapsed):
+                profile[rule.name] = (seconds, line_count, len(bucket))
+        
+        issues = []
+        for rule, bucket in zip(self.rules, buckets):
+            for issue in bucket:
+                issue.rule = rule.name
+            issues.extend(bucket)
+        return issues
     
-    def _calculate_score(self, total_lines: int) -> float:
-        """计算代码质量评分"""
-        if not self.issues:
+    @staticmethod
+    def _calculate_score(issues: List[CodeIssue], total_lines: int) -> float:
+        """根据问题列表计算代码质量评分"""
+        if not issues:
             return 100.0
         
         # 根据问题严重程度扣分
-        error_count = sum(1 for issue in self.issues if issue.severity == "error")
-        warning_count = sum(1 for issue in self.issues if issue.severity == "warning")
-        info_count = sum(1 for issue in self.issues if issue.severity == "info")
+        error_count = sum(1 for issue in issues if issue.severity == "error")
+        warning_count = sum(1 for issue in issues if issue.severity == "warning")
+        info_count = sum(1 for issue in issues if issue.severity == "info")
         
         # 计算扣分
         error_penalty = error_count * 10
@@ -399,14 +614,15 @@ class JavaCodeReviewer:
         score = max(0, 100 - (penalty_ratio * 100))
         return round(score, 1)
     
-    def _generate_summary(self) -> str:
-        """生成评审摘要"""
-        if not self.issues:
+    @staticmethod
+    def _generate_summary(issues: List[CodeIssue]) -> str:
+        """根据问题列表生成评审摘要"""
+        if not issues:
             return "代码质量优秀，未发现明显问题。"
         
-        error_count = sum(1 for issue in self.issues if issue.severity == "error")
-        warning_count = sum(1 for issue in self.issues if issue.severity == "warning")
-        info_count = sum(1 for issue in self.issues if issue.severity == "info")
+        error_count = sum(1 for issue in issues if issue.severity == "error")
+        warning_count = sum(1 for issue in issues if issue.severity == "warning")
+        info_count = sum(1 for issue in issues if issue.severity == "info")
         
         summary_parts = []
         if error_count > 0:
@@ -419,133 +635,588 @@ class JavaCodeReviewer:
         return f"发现{', '.join(summary_parts)}，需要关注和改进。"
 
 
-class ReportGenerator:
-    """报告生成器"""
+# 评审上下文（词法分析、行表）构建开销在剖析数据中的名称
+CONTEXT_PROFILE_KEY = "<context>"
+
+
+class RuleProfiler:
+    """汇总各规则的耗时、遍历行数和产生的问题数
     
-    @staticmethod
-    def generate_json_report(results: List[ReviewResult], output_file: str):
-        """生成JSON格式报告"""
-        report_data = {
-            "timestamp": datetime.now().isoformat(),
-            "total_files": len(results),
-            "files": [asdict(result) for result in results],
-            "summary": {
-                "total_issues": sum(len(result.issues) for result in results),
-                "average_score": sum(result.score for result in results) / len(results) if results else 0,
-                "files_with_errors": sum(1 for result in results if any(issue.severity == "error" for issue in result.issues))
+    只统计实际执行了规则的文件，缓存命中的文件没有开销。
+    指定collapsed_file时，每个文件的各规则耗时以折叠栈格式（review;文件;规则 微秒数）流式写出，
+    可直接交给flamegraph.pl、speedscope等火焰图工具。
+    """
+    
+    def __init__(self, collapsed_file: Optional[str] = None):
+        self.collapsed_file = collapsed_file
+        self.files = 0
+        # 规则名 -> [耗时秒数, 遍历行数, 问题数, 文件数]，按首次出现（即规则注册）顺序
+        self.totals: Dict[str, list] = {}
+        self._collapsed = open(collapsed_file, 'w', encoding='utf-8') if collapsed_file else None
+    
+    def add(self, file_path: str, profile: Dict[str, tuple]):
+        if not profile:
+            return
+        self.files += 1
+        frame = file_path.replace(';', '_')
+        stacks = []
+        for name, (seconds, lines, issues) in profile.items():
+            totals = self.totals.get(name)
+            if totals is None:
+                totals = self.totals[name] = [0.0, 0, 0, 0]
+            totals[0] += seconds
+            totals[1] += lines
+            totals[2] += issues
+            totals[3] += 1
+            micros = int(seconds * 1e6)
+            if micros > 0:
+                stacks.append(f"review;{frame};{name} {micros}\n")
+        if self._collapsed is not None:
+            self._collapsed.write(''.join(stacks))
+    
+    def stats(self) -> Dict[str, Any]:
+        """写入JSON报告summary的剖析汇总"""
+        return {
+            "files_profiled": self.files,
+            "rules": {
+                name: {"seconds": round(seconds, 6), "lines": lines, "issues": issues, "files": files}
+                for name, (seconds, lines, issues, files) in self.totals.items()
             }
         }
+    
+    def print_top(self, n: int = 10):
+        """按耗时打印前n个规则"""
+        total = sum(totals[0] for totals in self.totals.values())
+        ranked = sorted(self.totals.items(), key=lambda item: item[1][0], reverse=True)[:n]
+        print(f"\n规则开销排行（前{len(ranked)}项，共剖析 {self.files} 个文件）:")
+        # 表头的中文字符占两列，宽度相应减少
+        print(f"  {'规则':<22}{'耗时(ms)':>10}{'占比':>6}{'行数':>10}{'问题数':>7}")
+        for name, (seconds, lines, issues, _) in ranked:
+            share = seconds / total * 100 if total else 0
+            print(f"  {name:<24}{seconds * 1000:>12.2f}{share:>7.1f}%{lines:>12}{issues:>10}")
+    
+    def close(self):
+        if self._collapsed is not None:
+            self._collapsed.close()
+            self._collapsed = None
+
+
+class ReportSummary:
+    """评审结果的累计统计，逐个文件累加，无需保留全部结果"""
+    
+    def __init__(self):
+        self.total_files = 0
+        self.total_issues = 0
+        self.total_lines = 0
+        self.score_sum = 0.0
+        self.files_with_errors = 0
+        # 问题分类 -> 各严重级别的数量
+        self.categories: Dict[str, Dict[str, int]] = {}
+        # 规则名 -> 问题数
+        self.rule_issues: Dict[str, int] = {}
+    
+    def add(self, result: ReviewResult):
+        self.total_files += 1
+        self.total_issues += len(result.issues)
+        self.total_lines += result.total_lines
+        self.score_sum += result.score
+        has_error = False
+        for issue in result.issues:
+            counts = self.categories.get(issue.category)
+            if counts is None:
+                counts = self.categories[issue.category] = {"error": 0, "warning": 0, "info": 0}
+            counts[issue.severity] = counts.get(issue.severity, 0) + 1
+            if issue.severity == "error":
+                has_error = True
+            if issue.rule:
+                self.rule_issues[issue.rule] = self.rule_issues.get(issue.rule, 0) + 1
+        if has_error:
+            self.files_with_errors += 1
+    
+    @property
+    def average_score(self) -> float:
+        return self.score_sum / self.total_files if self.total_files else 0
+    
+    def rule_stats(self) -> Dict[str, Dict[str, int]]:
+        """各规则的问题数和遍历行数，按规则注册顺序，AI分析等其他来源的问题排在最后
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(report_data, f, ensure_ascii=False, indent=2)
+        由评审结果统计，不计时，与是否剖析、并行进程数和缓存命中无关，每次运行都写入报告。
+        """
+        names = [rule.name for rule in RULE_REGISTRY]
+        names += [name for name in self.rule_issues if name not in names]
+        return {name: {"issues": self.rule_issues.get(name, 0), "lines": self.total_lines} for name in names}
+
+
+class JsonReportWriter:
+    """流式JSON报告：每个文件的结果评审完即写入磁盘，汇总信息在close时由累计统计写出
     
-    @staticmethod
-    def generate_markdown_report(results: List[ReviewResult], output_file: str):
-        """生成Markdown格式报告"""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("# Java代码评审报告\n\n")
+    输出与json.dump(indent=2)的格式一致，只是total_files位于files之后。
+    """
+    
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.summary = ReportSummary()
+        self._file = None
+    
+    def _open(self):
+        self._file = open(self.output_file, 'w', encoding='utf-8')
+        timestamp = json.dumps(datetime.now().isoformat())
+        self._file.write(f'{{\n  "timestamp": {timestamp},\n  "files": [')
+    
+    def add(self, result: ReviewResult):
+        if self._file is None:
+            self._open()
+        separator = '\n' if self.summary.total_files == 0 else ',\n'
+        item = json.dumps(asdict(result), ensure_ascii=False, indent=2).replace('\n', '\n    ')
+        self._file.write(f'{separator}    {item}')
+        self.summary.add(result)
+    
+    def close(self, cache_stats: Optional[Dict[str, int]] = None,
+              profile_stats: Optional[Dict[str, Any]] = None):
+        if self._file is None:
+            self._open()
+        summary = {
+            "total_issues": self.summary.total_issues,
+            "average_score": self.summary.average_score,
+            "files_with_errors": self.summary.files_with_errors,
+            "rules": self.summary.rule_stats()
+        }
+        if cache_stats is not None:
+            summary["cache"] = cache_stats
+        if profile_stats is not None:
+            summary["profile"] = profile_stats
+        
+        f = self._file
+        f.write('\n  ]' if self.summary.total_files else ']')
+        f.write(f',\n  "total_files": {self.summary.total_files}')
+        f.write(',\n  "summary": ' + json.dumps(summary, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+        f.write('\n}')
+        f.close()
+
+
+class MarkdownReportWriter:
+    """流式Markdown报告
+    
+    详细报告逐个文件写入临时文件，close时先写出总体统计，再把临时文件拷贝到报告末尾，
+    内存占用与文件数量无关。子类可覆盖标题、统计和结尾部分。
+    """
+    
+    title = "Java代码评审报告"
+    
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.summary = ReportSummary()
+        self._spool = None
+    
+    def _section_file(self):
+        """详细报告的临时文件，首次写入时创建"""
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile('w+', encoding='utf-8',
+                                                 dir=os.path.dirname(self.output_file) or '.')
+        return self._spool
+    
+    def add(self, result: ReviewResult):
+        self.summary.add(result)
+        f = self._section_file()
+        self._write_file_details(f, result)
+        f.write("---\n\n")
+    
+    def _write_file_details(self, f, result: ReviewResult):
+        f.write(f"### {result.file_name}\n\n")
+        f.write(f"**文件路径**: `{result.file_path}`\n\n")
+        f.write(f"**代码行数**: {result.total_lines}\n\n")
+        f.write(f"**质量评分**: {result.score}/100\n\n")
+        f.write(f"**问题摘要**: {result.summary}\n\n")
+        
+        if result.issues:
+            f.write("#### 问题详情\n\n")
+            for issue in result.issues:
+                severity_emoji = {"error": "❌", "warning": "⚠️", "info": "ℹ️"}.get(issue.severity, "📝")
+                f.write(f"- **第{issue.line_number}行** {severity_emoji} **{issue.severity.upper()}** ({issue.category})\n")
+                f.write(f"  - **问题**: {issue.message}\n")
+                f.write(f"  - **建议**: {issue.suggestion}\n\n")
+        else:
+            f.write("✅ 未发现问题\n\n")
+    
+    def _write_statistics(self, f, cache_stats: Optional[Dict[str, int]]):
+        summary = self.summary
+        f.write("## 总体统计\n\n")
+        f.write(f"- **评审文件数**: {summary.total_files}\n")
+        f.write(f"- **总问题数**: {summary.total_issues}\n")
+        f.write(f"- **平均评分**: {summary.average_score:.1f}/100\n")
+        f.write(f"- **有错误的文件数**: {summary.files_with_errors}\n")
+        if cache_stats is not None:
+            f.write(f"- **缓存命中/未命中**: {cache_stats['hits']}/{cache_stats['misses']}\n")
+        f.write("\n")
+    
+    def _write_footer(self, f):
+        pass
+    
+    def close(self, cache_stats: Optional[Dict[str, int]] = None,
+              profile_stats: Optional[Dict[str, Any]] = None):
+        with open(self.output_file, 'w', encoding='utf-8') as f:
+            f.write(f"# {self.title}\n\n")
             f.write(f"**生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            # 总体统计
-            total_issues = sum(len(result.issues) for result in results)
-            avg_score = sum(result.score for result in results) / len(results) if results else 0
-            files_with_errors = sum(1 for result in results if any(issue.severity == "error" for issue in result.issues))
-            
-            f.write("## 总体统计\n\n")
-            f.write(f"- **评审文件数**: {len(results)}\n")
-            f.write(f"- **总问题数**: {total_issues}\n")
-            f.write(f"- **平均评分**: {avg_score:.1f}/100\n")
-            f.write(f"- **有错误的文件数**: {files_with_errors}\n\n")
+            self._write_statistics(f, cache_stats)
             
             # 详细报告
             f.write("## 详细报告\n\n")
-            for result in results:
-                f.write(f"### {result.file_name}\n\n")
-                f.write(f"**文件路径**: `{result.file_path}`\n\n")
-                f.write(f"**代码行数**: {result.total_lines}\n\n")
-                f.write(f"**质量评分**: {result.score}/100\n\n")
-                f.write(f"**问题摘要**: {result.summary}\n\n")
-                
-                if result.issues:
-                    f.write("#### 问题详情\n\n")
-                    for issue in result.issues:
-                        severity_emoji = {"error": "❌", "warning": "⚠️", "info": "ℹ️"}.get(issue.severity, "📝")
-                        f.write(f"- **第{issue.line_number}行** {severity_emoji} **{issue.severity.upper()}** ({issue.category})\n")
-                        f.write(f"  - **问题**: {issue.message}\n")
-                        f.write(f"  - **建议**: {issue.suggestion}\n\n")
-                else:
-                    f.write("✅ 未发现问题\n\n")
-                
-                f.write("---\n\n")
-
-
-def find_java_files(directory: str) -> List[str]:
-    """查找目录下的所有Java文件"""
-    java_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.java'):
-                java_files.append(os.path.join(root, file))
-    return java_files
+            if self._spool is not None:
+                self._spool.seek(0)
+                shutil.copyfileobj(self._spool, f)
+                self._spool.close()
+                self._spool = None
+            self._write_footer(f)
+
+
+class JsonlReportWriter:
+    """JSON Lines问题流：每条记录一行，每个文件评审完即写出并刷新，下游可以边评审边消费
+    
+    记录按type区分：issue为单个问题，file表示一个文件评审完成（位于该文件全部issue之后），
+    summary为最后一行的汇总。output_file为"-"时写到传入的stream（通常是标准输出）。
+    """
+    
+    def __init__(self, output_file: str, stream=None):
+        self.output_file = output_file
+        self.summary = ReportSummary()
+        self._file = stream
+        self._owns_file = stream is None
+    
+    def _write_lines(self, records: List[Dict[str, Any]]):
+        if self._file is None:
+            self._file = open(self.output_file, 'w', encoding='utf-8')
+        self._file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        self._file.flush()
+    
+    def add(self, result: ReviewResult):
+        records = [{
+            "type": "issue",
+            "file": result.file_path,
+            "line": issue.line_number,
+            "severity": issue.severity,
+            "category": issue.category,
+            "rule": issue.rule,
+            "message": issue.message,
+            "suggestion": issue.suggestion
+        } for issue in result.issues]
+        records.append({
+            "type": "file",
+            "file": result.file_path,
+            "file_name": result.file_name,
+            "total_lines": result.total_lines,
+            "score": result.score,
+            "summary": result.summary,
+            "issue_count": len(result.issues)
+        })
+        self._write_lines(records)
+        self.summary.add(result)
+    
+    def close(self, cache_stats: Optional[Dict[str, int]] = None,
+              profile_stats: Optional[Dict[str, Any]] = None):
+        record = {
+            "type": "summary",
+            "total_files": self.summary.total_files,
+            "total_issues": self.summary.total_issues,
+            "average_score": self.summary.average_score,
+            "files_with_errors": self.summary.files_with_errors,
+            "rules": self.summary.rule_stats()
+        }
+        if cache_stats is not None:
+            record["cache"] = cache_stats
+        if profile_stats is not None:
+            record["profile"] = profile_stats
+        self._write_lines([record])
+        if self._owns_file:
+            self._file.close()
+
+
+class ReportGenerator:
+    """报告生成器"""
+    
+    @staticmethod
+    def generate_json_report(results: Iterable[ReviewResult], output_file: str,
+                             cache_stats: Optional[Dict[str, int]] = None,
+                             profile_stats: Optional[Dict[str, Any]] = None):
+        """生成JSON格式报告"""
+        writer = JsonReportWriter(output_file)
+        for result in results:
+            writer.add(result)
+        writer.close(cache_stats, profile_stats)
+    
+    @staticmethod
+    def generate_markdown_report(results: Iterable[ReviewResult], output_file: str,
+                                 cache_stats: Optional[Dict[str, int]] = None):
+        """生成Markdown格式报告"""
+        writer = MarkdownReportWriter(output_file)
+        for result in results:
+            writer.add(result)
+        writer.close(cache_stats)
+
+
+def find_java_files(directory: str, excludes: Sequence[str] = (), includes: Sequence[str] = (),
+                    use_gitignore: bool = True) -> List[str]:
+    """查找目录下的所有Java文件，跳过构建输出目录和被忽略的文件"""
+    return list(iter_java_files(directory, excludes, includes, use_gitignore))
+
+
+def restrict_to_changed_lines(result: ReviewResult, ranges: List[LineRange]) -> ReviewResult:
+    """只保留落在改动行范围内的问题（文件级问题保留），并据此重新计算评分和摘要"""
+    issues = [issue for issue in result.issues
+              if issue.line_number == 0 or in_ranges(issue.line_number, ranges)]
+    return ReviewResult(
+        file_path=result.file_path,
+        file_name=result.file_name,
+        total_lines=result.total_lines,
+        issues=issues,
+        score=JavaCodeReviewer._calculate_score(issues, result.total_lines),
+        summary=JavaCodeReviewer._generate_summary(issues)
+    )
+
+
+def review_path(reviewer: JavaCodeReviewer, file_path: str, profile: Optional[Dict[str, tuple]] = None,
+                staged: bool = False) -> ReviewResult:
+    """评审文件，staged为True时评审暂存区中即将提交的版本而不是工作区文件"""
+    if not staged:
+        return reviewer.review_file(file_path, profile)
+    try:
+        content = read_staged(file_path)
+    except GitDiffError as e:
+        return unreadable_result(file_path, e)
+    return reviewer.review_source(file_path, content, profile)
+
+
+# 流式输入时每次分发给工作进程的文件数
+_STREAM_CHUNKSIZE = 8
+
+# 每个工作进程最多排队的文件组数，已提交但未产出的文件数因此有上限
+_PENDING_CHUNKS_PER_WORKER = 2
+
+# 工作进程内的评审器，每个进程一个实例，逐个文件串行使用
+_worker_reviewer: Optional[JavaCodeReviewer] = None
+
+
+# 工作进程是否记录各规则开销、是否评审暂存区中的版本
+_worker_profile = False
+_worker_staged = False
+
+
+def _init_review_worker(cache_dir: Optional[str] = None, cache_max_bytes: int = DEFAULT_MAX_BYTES,
+                        profile: bool = False, staged: bool = False):
+    """进程池初始化：为当前工作进程创建评审器"""
+    global _worker_reviewer, _worker_profile, _worker_staged
+    cache = ResultCache(cache_dir, cache_max_bytes) if cache_dir else None
+    _worker_reviewer = JavaCodeReviewer(cache=cache)
+    _worker_profile = profile
+    _worker_staged = staged
+
+
+def _review_to_record(file_path: str) -> Tuple[list, bool, Optional[Dict[str, tuple]]]:
+    """在工作进程中评审文件，返回紧凑记录、是否命中缓存和各规则开销（不剖析时为None）"""
+    cache = _worker_reviewer.cache
+    hits = cache.hits if cache is not None else 0
+    profile = {} if _worker_profile else None
+    result = review_path(_worker_reviewer, file_path, profile, _worker_staged)
+    hit = cache is not None and cache.hits > hits
+    return result_to_record(result), hit, profile
+
+
+def _review_chunk(file_paths: List[str]) -> List[Tuple[list, bool, Optional[Dict[str, tuple]]]]:
+    """在工作进程中依次评审一组文件，减少进程间往返次数"""
+    return [_review_to_record(file_path) for file_path in file_paths]
+
+
+def review_files(java_files: Iterable[str], jobs: int = 1,
+                 cache: Optional[ResultCache] = None,
+                 profiler: Optional[RuleProfiler] = None, staged: bool = False) -> Iterator[ReviewResult]:
+    """评审多个文件，按输入顺序逐个产出结果，staged为True时评审各文件在暂存区中的版本
+    
+    java_files可以是列表，也可以是边遍历边产出路径的迭代器，后者无需等待遍历结束即开始评审。
+    jobs大于1时把文件按组分发到进程池，每个工作进程持有独立的评审器，
+    结果按文件顺序合并，与串行评审的输出完全一致。
+    在途的文件组不超过jobs * _PENDING_CHUNKS_PER_WORKER个，每产出一组结果才从输入中取下一组，
+    因此第一个结果不必等待目录遍历结束，内存占用也与文件总数无关。
+    工作进程各自打开同一个缓存目录，命中计数汇总到传入的cache上；传入profiler时才记录规则开销并汇总到其上。
+    """
+    if isinstance(java_files, list):
+        count = len(java_files)
+    else:
+        # 流式输入只预取两个路径，判断是否值得启动进程池
+        java_files = iter(java_files)
+        head = list(islice(java_files, 2))
+        count = None if len(head) > 1 else len(head)
+        java_files = chain(head, java_files)
+    
+    if jobs <= 1 or (count is not None and count <= 1):
+        reviewer = JavaCodeReviewer(cache=cache)
+        for java_file in java_files:
+            profile = {} if profiler is not None else None
+            result = review_path(reviewer, java_file, profile, staged)
+            if profiler is not None:
+                profiler.add(java_file, profile)
+            yield result
+        return
+    
+    if count is not None:
+        jobs = min(jobs, count)
+        chunksize = max(1, min(64, count // (jobs * 4)))
+    else:
+        chunksize = _STREAM_CHUNKSIZE
+    initargs = (cache.cache_dir if cache is not None else None,
+                cache.max_bytes if cache is not None else DEFAULT_MAX_BYTES, profiler is not None, staged)
+    paths = iter(java_files)
+    chunks = iter(lambda: list(islice(paths, chunksize)), [])
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_review_worker,
+                             initargs=initargs) as executor:
+        pending = deque(executor.submit(_review_chunk, chunk)
+                        for chunk in islice(chunks, jobs * _PENDING_CHUNKS_PER_WORKER))
+        while pending:
+            outcomes = pending.popleft().result()
+            # 先补充一组再产出结果，工作进程不会因为调用方处理结果而空闲
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(executor.submit(_review_chunk, chunk))
+            for record, hit, profile in outcomes:
+                if cache is not None:
+                    cache.record_lookup(hit)
+                result = record_to_result(record)
+                if profiler is not None:
+                    profiler.add(result.file_path, profile)
+                yield result
 
 
 def main():
     """主函数"""
+    if sys.argv[1:2] == ['query']:
+        query_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(description='Java代码自动评审工具')
     parser.add_argument('path', help='要评审的Java文件或目录路径')
     parser.add_argument('--output-dir', '-o', default='./reports', help='报告输出目录')
-    parser.add_argument('--format', '-f', choices=['json', 'markdown', 'both'], default='both', help='输出格式')
+    parser.add_argument('--format', '-f', choices=['json', 'markdown', 'both', 'jsonl'], default='both',
+                        help='输出格式，jsonl为边评审边输出的逐行问题流')
+    parser.add_argument('--jsonl-output', metavar='PATH',
+                        help='JSONL问题流的输出文件，"-"表示标准输出（默认写到输出目录）')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='并行评审的进程数（默认CPU核数，1为串行）')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='评审结果缓存目录')
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='缓存目录大小上限(MB)')
+    parser.add_argument('--no-cache', action='store_true', help='禁用评审结果缓存')
+    parser.add_argument('--changed-since', metavar='REV', help='只评审相对于指定Git版本有改动的Java文件')
+    parser.add_argument('--staged', action='store_true',
+                        help='只评审已暂存(git add)的Java文件在暂存区中的版本，适用于pre-commit钩子')
+    parser.add_argument('--only-changed-lines', action='store_true',
+                        help='配合--changed-since/--staged使用，只报告落在改动行范围内的问题')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help='排除匹配的文件或目录（gitignore语法，相对评审目录，可重复）')
+    parser.add_argument('--include', action='append', default=[], metavar='GLOB',
+                        help='只评审匹配的文件（gitignore语法，可重复）')
+    parser.add_argument('--no-gitignore', action='store_true', help='不遵循.gitignore')
+    parser.add_argument('--db', nargs='?', const=DEFAULT_DB_PATH, metavar='PATH',
+                        help=f'同时把结果记录到SQLite结果数据库（默认 {DEFAULT_DB_PATH}），可用query子命令查询')
+    parser.add_argument('--profile', action='store_true',
+                        help='打印规则开销排行，并输出火焰图工具可读的折叠栈文件')
+    parser.add_argument('--profile-top', type=int, default=10, help='规则开销排行显示的条数')
+    parser.add_argument('--profile-output', metavar='PATH', help='折叠栈输出路径（默认写到输出目录）')
     
     args = parser.parse_args()
     
+    # JSONL写到标准输出时，进度信息改写到标准错误，保证标准输出只有JSONL记录
+    if args.format == 'jsonl' and args.jsonl_output == '-':
+        stream = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            run_review(args, stream)
+    else:
+        run_review(args)
+
+
+def run_review(args: argparse.Namespace, jsonl_stream=None):
+    """按命令行参数执行评审并生成报告"""
     # 创建输出目录
     os.makedirs(args.output_dir, exist_ok=True)
     
     # 查找Java文件
-    if os.path.isfile(args.path) and args.path.endswith('.java'):
+    changed_ranges = None
+    if args.changed_since or args.staged:
+        try:
+            changed_ranges = changed_java_files(args.path, args.changed_since, args.staged)
+        except GitDiffError as e:
+            print(f"错误: 无法获取Git改动: {e}")
+            return
+        java_files = list(changed_ranges)
+    elif os.path.isfile(args.path) and args.path.endswith('.java'):
         java_files = [args.path]
     elif os.path.isdir(args.path):
-        java_files = find_java_files(args.path)
+        # 边遍历边评审，不等待整棵目录树遍历结束
+        java_files = iter_java_files(args.path, args.exclude, args.include, not args.no_gitignore)
     else:
         print(f"错误: 路径 {args.path} 不存在或不是有效的Java文件/目录")
         return
     
-    if not java_files:
-        print("未找到Java文件")
-        return
-    
-    print(f"找到 {len(java_files)} 个Java文件，开始评审...")
+    if not isinstance(java_files, list):
+        print(f"正在查找并评审Java文件: {args.path}")
+    elif java_files:
+        print(f"找到 {len(java_files)} 个Java文件，开始评审...")
     
-    # 执行评审
-    reviewer = JavaCodeReviewer()
-    results = []
-    
-    for java_file in java_files:
-        print(f"正在评审: {java_file}")
-        result = reviewer.review_file(java_file)
-        results.append(result)
-        print(f"  评分: {result.score}/100, 问题数: {len(result.issues)}")
-    
-    # 生成报告
+    # 执行评审，结果逐个写入报告，不在内存中保留；没有文件时也生成只有汇总的报告
+    cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    cache_stats = None
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
+    writers = []
     if args.format in ['json', 'both']:
         json_file = os.path.join(args.output_dir, f'java_review_{timestamp}.json')
-        ReportGenerator.generate_json_report(results, json_file)
-        print(f"JSON报告已生成: {json_file}")
-    
+        writers.append(("JSON报告", JsonReportWriter(json_file)))
     if args.format in ['markdown', 'both']:
         md_file = os.path.join(args.output_dir, f'java_review_{timestamp}.md')
-        ReportGenerator.generate_markdown_report(results, md_file)
-        print(f"Markdown报告已生成: {md_file}")
+        writers.append(("Markdown报告", MarkdownReportWriter(md_file)))
+    if args.format == 'jsonl':
+        jsonl_file = args.jsonl_output or os.path.join(args.output_dir, f'java_review_{timestamp}.jsonl')
+        writers.append(("JSONL问题流", JsonlReportWriter(jsonl_file, jsonl_stream)))
+    if args.db:
+        writers.append(("结果数据库", ResultsDbWriter(args.db, "java_code_reviewer", args.path, args.staged)))
+    summary = ReportSummary()
+    # 只在--profile时记录规则开销，报告内容不含耗时，串行和并行的输出一致
+    profiler = None
+    if args.profile:
+        collapsed_file = args.profile_output or os.path.join(args.output_dir, f'java_review_{timestamp}.folded')
+        profiler = RuleProfiler(collapsed_file)
+    
+    for result in review_files(java_files, args.jobs, cache, profiler, args.staged):
+        if changed_ranges is not None and args.only_changed_lines:
+            result = restrict_to_changed_lines(result, changed_ranges[result.file_path])
+        print(f"正在评审: {result.file_path}")
+        summary.add(result)
+        for _, writer in writers:
+            writer.add(result)
+        print(f"  评分: {result.score}/100, 问题数: {len(result.issues)}")
+    
+    if profiler is not None:
+        profiler.close()
+    if summary.total_files == 0:
+        print("未找到Java文件")
+    
+    if cache is not None:
+        cache.prune()
+        cache_stats = cache.stats()
+    
+    # 生成报告
+    for label, writer in writers:
+        writer.close(cache_stats, profiler.stats() if profiler is not None else None)
+        if writer.output_file != '-':
+            print(f"{label}已生成: {writer.output_file}")
     
     # 输出简要统计
-    total_issues = sum(len(result.issues) for result in results)
-    avg_score = sum(result.score for result in results) / len(results) if results else 0
     print(f"\n评审完成!")
-    print(f"总文件数: {len(results)}")
-    print(f"总问题数: {total_issues}")
-    print(f"平均评分: {avg_score:.1f}/100")
+    print(f"总文件数: {summary.total_files}")
+    print(f"总问题数: {summary.total_issues}")
+    print(f"平均评分: {summary.average_score:.1f}/100")
+    if cache_stats is not None:
+        print(f"缓存命中: {cache_stats['hits']}, 未命中: {cache_stats['misses']}")
+    
+    if profiler is not None:
+        profiler.print_top(args.profile_top)
+        print(f"折叠栈已生成: {collapsed_file}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Java词法分析器
+功能：流式切分Java源码为带行列位置的词法单元，并生成屏蔽视图
+屏蔽视图：字符串、字符字面量的内容和全部注释替换为空格，保留行列结构
+"""
+
+import re
+from typing import Iterator, List, NamedTuple, Optional, Set
+
+
+JAVA_KEYWORDS = frozenset("""
+    abstract assert boolean break byte case catch char class const continue
+    default do double else enum extends final finally float for goto if
+    implements import instanceof int interface long native new package private
+    protected public return short static strictfp super switch synchronized this
+    throw throws transient try void volatile while true false null var record
+    yield sealed permits
+""".split())
+
+# 注释和各类字面量的词法规则，词法单元流和屏蔽视图共用
+_COMMENT = r'//[^\n]*|/\*.*?(?:\*/|\Z)'
+_TEXT_BLOCK = r'""".*?(?:(?<!\\)"""|\Z)'
+_STRING = r'"(?:\\.|[^"\\\n])*"?'
+_CHAR = r"'(?:\\.|[^'\\\n])*'?"
+
+_TOKEN_RE = re.compile(rf'''
+     (?P<ws>[ \t\f\r\n]+)
+    |(?P<comment>{_COMMENT})
+    |(?P<text_block>{_TEXT_BLOCK})
+    |(?P<string>{_STRING})
+    |(?P<char>{_CHAR})
+    |(?P<number>(?:0[xX][0-9a-fA-F_]+|0[bB][01_]+|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?)[lLfFdD]?)
+    |(?P<ident>[^\W\d][\w$]*|\$[\w$]*)
+    |(?P<op>>>>=|<<=|>>=|\.\.\.|->|::|\+\+|--|&&|\|\||[-=!<>+*/&|^%]=|<<|[{{}}()\[\];,.@=<>!~?:+\-*/&|^%])
+    |(?P<other>.)
+''', re.S | re.X)
+
+# 只匹配注释和字面量，其余代码由正则引擎直接跳过，用于快速生成屏蔽视图
+_LITERAL_RE = re.compile(
+    rf'(?P<comment>{_COMMENT})|(?P<text_block>{_TEXT_BLOCK})|(?P<string>{_STRING})|(?P<char>{_CHAR})',
+    re.S
+)
+
+_NOT_NEWLINE_RE = re.compile(r'[^\n]')
+
+
+class Token(NamedTuple):
+    """词法单元，行号从1开始，列号和偏移从0开始，结束位置不含"""
+    kind: str  # "keyword", "ident", "number", "string", "char", "text_block", "comment", "op", "other"
+    text: str
+    line: int
+    col: int
+    end_line: int
+    end_col: int
+    start: int  # 在源码中的起始偏移
+    end: int    # 在源码中的结束偏移
+
+
+def tokenize(source: str) -> Iterator[Token]:
+    """流式切分Java源码，跳过空白"""
+    line = 1
+    line_start = 0
+    for m in _TOKEN_RE.finditer(source):
+        kind = m.lastgroup
+        text = m.group()
+        start = m.start()
+        end = m.end()
+        newlines = text.count('\n')
+
+        if kind == 'ws':
+            if newlines:
+                line += newlines
+                line_start = start + text.rfind('\n') + 1
+            continue
+
+        if kind == 'ident' and text in JAVA_KEYWORDS:
+            kind = 'keyword'
+
+        if newlines:
+            end_line = line + newlines
+            end_line_start = start + text.rfind('\n') + 1
+            yield Token(kind, text, line, start - line_start, end_line, end - end_line_start, start, end)
+            line = end_line
+            line_start = end_line_start
+        else:
+            yield Token(kind, text, line, start - line_start, line, end - line_start, start, end)
+
+
+def _blank(text: str) -> str:
+    """把除换行外的字符替换为空格"""
+    return _NOT_NEWLINE_RE.sub(' ', text)
+
+
+def _mask_literal(text: str, quote: str) -> str:
+    """保留字面量两端的引号，只屏蔽其内容"""
+    size = len(quote)
+    if len(text) >= 2 * size and text.endswith(quote):
+        return quote + _blank(text[size:-size]) + quote
+    return quote + _blank(text[size:])
+
+
+class JavaSource:
+    """一次词法分析的结果：屏蔽视图和词法单元流
+
+    masked_lines  与原文逐行对齐的屏蔽视图，字符串和字符字面量只保留引号，注释整体替换为空格
+    comment_lines 含有注释内容的行号集合
+    tokens        全部非空白词法单元，首次访问时由 tokenize 生成
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.comment_lines: Set[int] = set()
+        self._tokens: Optional[List[Token]] = None
+
+        pos = 0
+        line = 1
+
+        def mask(m) -> str:
+            nonlocal pos, line
+            kind = m.lastgroup
+            literal = m.group()
+            if kind == 'comment':
+                line += text.count('\n', pos, m.start())
+                end_line = line + literal.count('\n')
+                self.comment_lines.update(range(line, end_line + 1))
+                pos = m.end()
+                line = end_line
+                return _blank(literal)
+            if kind == 'text_block':
+                return _mask_literal(literal, '"""')
+            return _mask_literal(literal, literal[0])
+
+        self.masked_lines = _LITERAL_RE.sub(mask, text).split('\n')
+
+    @property
+    def tokens(self) -> List[Token]:
+        if self._tokens is None:
+            self._tokens = list(tokenize(self.text))
+        return self._tokens
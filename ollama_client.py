@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ollama HTTP客户端
+所有Ollama调用共用一个requests.Session：每个端点一个固定大小的长连接池，
+连接超时和读取超时分开设置，并统计连接复用情况；可选的磁盘响应缓存让相同的请求不再重复发送；
+每个端点一个熔断器，连续失败后快速失败，避免服务不可用时每个请求都等到超时；
+OllamaEndpoints在多个端点之间按未完成请求数均衡负载，失败时带抖动地指数退避重试，并可对慢请求发起对冲
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import monotonic, perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from review_cache import ResponseCache
+
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+# 流式生成：等待首个token（含模型加载）的时间上限和整个生成的时间上限
+DEFAULT_FIRST_TOKEN_TIMEOUT = 60.0
+DEFAULT_TOTAL_TIMEOUT = 300.0
+# 熔断器：连续失败多少次后断开，断开多少秒后放行一个试探请求
+DEFAULT_BREAKER_THRESHOLD = 3
+DEFAULT_BREAKER_RESET = 30.0
+HEALTH_CHECK_TIMEOUT = 5.0
+# 失败重试：最多重试次数，退避时间的基数和上限(秒)
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+# 对冲：积累到多少个延迟样本后才开始对冲，以及保留的样本数
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 200
+
+
+class OllamaUnavailable(Exception):
+    """端点的熔断器处于断开状态，请求未发送"""
+
+
+class CircuitBreaker:
+    """熔断器
+    
+    关闭状态下正常放行，连续failure_threshold次失败后断开；断开期间的请求直接拒绝，
+    reset_timeout秒后进入半开状态，只放行一个试探请求：成功则关闭，失败则重新断开并重新计时。
+    failure_threshold为0时不熔断。
+    """
+    
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                 reset_timeout: float = DEFAULT_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+    
+    def is_open(self) -> bool:
+        """是否处于断开状态且尚未到试探时间（不改变状态）"""
+        with self._lock:
+            return self.opened_at is not None and (
+                self.probing or monotonic() - self.opened_at < self.reset_timeout)
+    
+    def rejects(self) -> bool:
+        """与is_open相同，但断开时记一次拒绝；用于选择端点时跳过被熔断的端点"""
+        with self._lock:
+            if self.opened_at is not None and (
+                    self.probing or monotonic() - self.opened_at < self.reset_timeout):
+                self.rejected += 1
+                return True
+            return False
+    
+    def allow(self) -> bool:
+        """是否放行一个请求；断开超时后第一个调用者获得试探机会"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and monotonic() - self.opened_at >= self.reset_timeout:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or (self.failure_threshold > 0 and self.opened_at is None
+                                and self.failures >= self.failure_threshold):
+                self._open()
+    
+    def trip(self):
+        """立即断开，例如启动健康检查失败时；failure_threshold为0时不熔断，不做任何事"""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._open()
+    
+    def _open(self):
+        if self.opened_at is None:
+            self.trips += 1
+        self.opened_at = monotonic()
+        self.probing = False
+
+
+def endpoint_of(url: str) -> str:
+    """URL所属的端点（scheme://host:port/），同一端点的请求共用一个连接池"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+class OllamaClient:
+    """带连接池的Ollama客户端，可在多个线程间共享
+
+    每个端点在首次请求时挂载一个独立的HTTPAdapter，池中最多保留pool_size个长连接，
+    不同端点的连接互不挤占；连接在请求之间保持打开，不再每次请求都重新建立TCP连接。
+    传入cache时，成功的响应按(URL, 完整请求体)缓存，refresh为True时忽略已有缓存重新请求并覆盖。
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, cache: Optional[ResponseCache] = None,
+                 refresh: bool = False, breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                 breaker_reset: float = DEFAULT_BREAKER_RESET):
+        self.pool_size = pool_size
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.cache = cache
+        self.refresh = refresh
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers['Connection'] = 'keep-alive'
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._requests: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """URL所属端点的熔断器"""
+        endpoint = endpoint_of(url)
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return self._breakers[endpoint]
+
+    def is_open(self, url: str) -> bool:
+        """端点当前是否被熔断（不占用半开状态的试探机会）"""
+        return self.breaker(url).is_open()
+
+    def rejects(self, url: str) -> bool:
+        """端点当前是否被熔断，被熔断时计入该端点的拒绝次数"""
+        return self.breaker(url).rejects()
+
+    def _register(self, url: str) -> str:
+        if not self.breaker(url).allow():
+            raise OllamaUnavailable(f"{endpoint_of(url)} 连续请求失败，已暂停发送请求")
+        endpoint = endpoint_of(url)
+        with self._lock:
+            if endpoint not in self._adapters:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                self.session.mount(endpoint, adapter)
+                self._adapters[endpoint] = adapter
+                self._requests[endpoint] = 0
+                self._errors[endpoint] = 0
+            self._requests[endpoint] += 1
+        return endpoint
+
+    def _record(self, endpoint: str, ok: bool):
+        if ok:
+            self.breaker(endpoint).record_success()
+        else:
+            with self._lock:
+                self._errors[endpoint] += 1
+            self.breaker(endpoint).record_failure()
+
+    def health_check(self, url: str, model: Optional[str] = None) -> Tuple[bool, str]:
+        """请求端点的 /api/tags，检查服务是否可用、模型是否已下载，返回(是否可用, 说明)
+        
+        不可用时立即熔断该端点，之后的请求直接失败，直到半开试探成功。
+        """
+        endpoint = endpoint_of(url)
+        try:
+            with self.session.get(endpoint + 'api/tags', timeout=(self.timeout[0], HEALTH_CHECK_TIMEOUT)) as response:
+                response.raise_for_status()
+                names = {item.get("name") for item in response.json().get("models", [])}
+        except Exception as e:
+            self.breaker(url).trip()
+            return False, f"无法连接 {endpoint}: {e}"
+        if model and model not in names and f"{model}:latest" not in names:
+            self.breaker(url).trip()
+            return False, f"{endpoint} 上没有模型 {model}"
+        return True, f"{endpoint} 可用"
+
+    def post_json(self, url: str, payload: Dict[str, Any], timeout: Optional[tuple] = None,
+                  cache_scope: Optional[str] = None) -> Dict[str, Any]:
+        """POST JSON并返回解析后的响应，HTTP错误和网络错误以requests异常抛出
+        
+        缓存键默认包含URL；cache_scope用于让可互相替代的多个端点共用缓存条目。
+        """
+        cache_key = None
+        if self.cache is not None:
+            # 请求体包含模型、选项和完整提示，任一不同都是不同的条目
+            cache_key = ResponseCache.make_key(cache_scope or url,
+                                               json.dumps(payload, sort_keys=True, ensure_ascii=False))
+            if not self.refresh:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+        endpoint = self._register(url)
+        try:
+            # 读完响应体连接才会归还连接池
+            with self.session.post(url, json=payload, timeout=timeout or self.timeout) as response:
+                data = response.json() if response.ok else None
+                response.raise_for_status()
+        except Exception:
+            self._record(endpoint, False)
+            raise
+        self._record(endpoint, True)
+        if cache_key is not None:
+            self.cache.put(cache_key, data)
+        return data
+
+    def stream_generate(self, url: str, payload: Dict[str, Any],
+                        first_token_timeout: float = DEFAULT_FIRST_TOKEN_TIMEOUT,
+                        total_timeout: float = DEFAULT_TOTAL_TIMEOUT,
+                        stop: Optional[Callable[[str], bool]] = None,
+                        cache_scope: Optional[str] = None) -> Tuple[str, bool]:
+        """流式调用Ollama生成接口，逐行读取NDJSON并拼接生成的文本，返回(文本, 是否完整)
+        
+        first_token_timeout同时是两段输出之间允许的最长间隔；超过total_timeout时断开连接，
+        返回已生成的部分。stop回调收到新片段后返回True时立即断开，Ollama随之停止生成，
+        此时结果视为完整。尚未收到任何输出就失败时抛出requests异常。
+        """
+        payload = dict(payload, stream=True)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(cache_scope or url,
+                                               json.dumps(payload, sort_keys=True, ensure_ascii=False))
+            if not self.refresh:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    if stop is not None:
+                        stop(cached["response"])
+                    return cached["response"], True
+        endpoint = self._register(url)
+        parts = []
+        complete = False
+        start = perf_counter()
+        try:
+            with self.session.post(url, json=payload, stream=True,
+                                   timeout=(self.timeout[0], first_token_timeout)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(chunk_size=None):
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise requests.RequestException(chunk["error"])
+                    piece = chunk.get("response", "")
+                    if piece:
+                        parts.append(piece)
+                        if stop is not None and stop(piece):
+                            complete = True
+                            break
+                    if chunk.get("done"):
+                        complete = True
+                        break
+                    if perf_counter() - start > total_timeout:
+                        break
+        except (requests.RequestException, ValueError):
+            self._record(endpoint, False)
+            if not parts:
+                raise
+        else:
+            self._record(endpoint, True)
+        text = ''.join(parts)
+        if complete and cache_key is not None:
+            self.cache.put(cache_key, {"response": text})
+        return text, complete
+
+    def stats(self) -> Dict[str, Any]:
+        """连接复用统计：请求数、新建连接数、复用次数，以及各端点的明细"""
+        endpoints = {}
+        with self._lock:
+            for endpoint, adapter in self._adapters.items():
+                connections = 0
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    connections += getattr(pool, 'num_connections', 0) if pool is not None else 0
+                requests_made = self._requests[endpoint]
+                endpoints[endpoint] = {
+                    "requests": requests_made,
+                    "connections": connections,
+                    "reused": max(0, requests_made - connections),
+                    "errors": self._errors[endpoint]
+                }
+        totals = {key: sum(item[key] for item in endpoints.values())
+                  for key in ("requests", "connections", "reused", "errors")}
+        totals["endpoints"] = endpoints
+        with self._lock:
+            breakers = list(self._breakers.values())
+        totals["breaker_trips"] = sum(breaker.trips for breaker in breakers)
+        totals["rejected"] = sum(breaker.rejected for breaker in breakers)
+        return totals
+
+    def format_stats(self, skipped: int = 0) -> str:
+        """连接统计的一行摘要；skipped为调用方因熔断未发出的请求数，计入拒绝数"""
+        stats = self.stats()
+        rate = stats["reused"] / stats["requests"] * 100 if stats["requests"] else 0
+        text = (f"请求 {stats['requests']} 次, 新建连接 {stats['connections']} 个, "
+                f"复用 {stats['reused']} 次 ({rate:.0f}%), 失败 {stats['errors']} 次")
+        if stats["breaker_trips"]:
+            text += f", 熔断 {stats['breaker_trips']} 次, 拒绝 {stats['rejected'] + skipped} 个请求"
+        return text
+
+    def close(self):
+        self.session.close()
+
+
+def split_endpoints(value) -> List[str]:
+    """解析端点列表：逗号分隔的字符串或字符串序列"""
+    if isinstance(value, str):
+        value = [value]
+    return [url.strip() for item in value for url in item.split(',') if url.strip()]
+
+
+def _percentile(samples: Sequence[float], percentile: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(percentile / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class OllamaEndpoints:
+    """多个可互相替代的Ollama端点（运行相同模型的实例）
+    
+    每个请求发往未完成请求数最少的端点（相同时轮换），跳过被熔断的端点；
+    失败后换一个端点重试，重试前按带抖动的指数退避等待；全部端点都被熔断时立即抛出OllamaUnavailable。
+    hedge_percentile大于0时，非流式请求超过历史延迟的该百分位仍未返回，就向另一个端点再发一次，取先返回的结果。
+    """
+    
+    def __init__(self, client: OllamaClient, urls, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, hedge_percentile: float = 0):
+        self.client = client
+        self.urls = split_endpoints(urls)
+        if not self.urls:
+            raise ValueError("至少需要一个Ollama端点")
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        # 多个端点共用缓存条目
+        self.cache_scope = ','.join(sorted(self.urls))
+        self._outstanding = {url: 0 for url in self.urls}
+        self._latencies = {url: deque(maxlen=LATENCY_SAMPLES) for url in self.urls}
+        self._all_latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._turn = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        # 所有端点都被熔断时调用方直接跳过、没有发出的请求数
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+    
+    def _pick(self, exclude: Sequence[str] = ()) -> Optional[str]:
+        """选出未完成请求最少、未被熔断的端点；排除列表之外没有可用端点时退而使用排除列表中的端点"""
+        candidates = [url for url in self.urls if not self.client.rejects(url)]
+        preferred = [url for url in candidates if url not in exclude] or candidates
+        if not preferred:
+            return None
+        with self._lock:
+            self._turn += 1
+            rotated = preferred[self._turn % len(preferred):] + preferred[:self._turn % len(preferred)]
+            url = min(rotated, key=lambda u: self._outstanding[u])
+            self._outstanding[url] += 1
+        return url
+    
+    def _release(self, url: str, latency: Optional[float] = None):
+        with self._lock:
+            self._outstanding[url] -= 1
+            if latency is not None:
+                self._latencies[url].append(latency)
+                self._all_latencies.append(latency)
+    
+    def _sleep_before_retry(self, attempt: int):
+        """全抖动指数退避：在[0, min(上限, 基数*2^attempt)]之间随机等待"""
+        with self._lock:
+            self.retried += 1
+        time.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * (2 ** attempt))))
+    
+    def _call(self, url: str, method: Callable, *args, **kwargs):
+        start = perf_counter()
+        try:
+            result = method(url, *args, cache_scope=self.cache_scope, **kwargs)
+        except BaseException:
+            self._release(url)
+            raise
+        self._release(url, perf_counter() - start)
+        return result
+    
+    def _with_retries(self, send: Callable[[str, List[str]], Any]):
+        tried: List[str] = []
+        last_error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            url = self._pick(tried)
+            if url is None:
+                raise OllamaUnavailable("所有Ollama端点都已熔断") from last_error
+            tried.append(url)
+            try:
+                return send(url, tried)
+            except OllamaUnavailable as e:
+                # 端点刚被熔断，换一个端点，不需要等待
+                last_error = e
+            except Exception as e:
+                last_error = e
+                if attempt < self.retries:
+                    self._sleep_before_retry(attempt)
+        raise last_error
+    
+    def post_json(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """非流式请求，失败时重试，可对慢请求发起对冲"""
+        return self._with_retries(lambda url, tried: self._hedged(url, tried, payload))
+    
+    def stream_generate(self, payload: Dict[str, Any], first_token_timeout: float, total_timeout: float,
+                        stop: Optional[Callable[[str], bool]] = None) -> Tuple[str, bool]:
+        """流式请求；只在尚未收到任何输出就失败时重试，已有输出时保留部分结果，不做对冲"""
+        return self._with_retries(lambda url, tried: self._call(
+            url, self.client.stream_generate, payload, first_token_timeout, total_timeout, stop))
+    
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.urls) < 2:
+            return None
+        with self._lock:
+            if len(self._all_latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return _percentile(self._all_latencies, self.hedge_percentile)
+    
+    def _hedged(self, url: str, tried: List[str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._call(url, self.client.post_json, payload)
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * self.client.pool_size * len(self.urls))
+            executor = self._hedge_executor
+        primary = executor.submit(self._call, url, self.client.post_json, payload)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        second_url = self._pick(tried)
+        if second_url is None or second_url == url:
+            if second_url is not None:
+                self._release(second_url)
+            return primary.result()
+        with self._lock:
+            self.hedged += 1
+        tried.append(second_url)
+        hedge = executor.submit(self._call, second_url, self.client.post_json, payload)
+        # 取先成功返回的结果，另一个请求在后台完成后丢弃
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def is_open(self) -> bool:
+        """是否所有端点都被熔断"""
+        return all(self.client.is_open(url) for url in self.urls)
+    
+    def rejects(self) -> bool:
+        """与is_open相同，但所有端点都被熔断时计一次跳过的请求；用于不发请求直接降级的调用方"""
+        if not self.is_open():
+            return False
+        with self._lock:
+            self.skipped += 1
+        return True
+    
+    def health_check(self, model: Optional[str] = None) -> Tuple[bool, str]:
+        """检查所有端点，至少一个可用即为可用，返回(是否可用, 不可用端点的说明)
+        
+        不可用的端点被熔断，请求只发往其余端点。
+        """
+        results = [self.client.health_check(url, model) for url in self.urls]
+        failed = [detail for ok, detail in results if not ok]
+        return len(failed) < len(results), '; '.join(failed)
+    
+    def format_stats(self) -> str:
+        text = self.client.format_stats(self.skipped)
+        if self.retried or self.hedged:
+            text += f", 重试 {self.retried} 次, 对冲 {self.hedged} 次(胜出 {self.hedge_wins} 次)"
+        if len(self.urls) > 1:
+            stats = self.client.stats()["endpoints"]
+            for url in self.urls:
+                endpoint = endpoint_of(url)
+                samples = list(self._latencies[url])
+                latency = f", p50 {_percentile(samples, 50):.2f}秒" if samples else ""
+                text += f"\n  {endpoint}: 请求 {stats.get(endpoint, {}).get('requests', 0)} 次{latency}"
+        return text
+    
+    def close(self):
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
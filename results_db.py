@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评审结果数据库
+用SQLite（WAL模式）记录每次运行、每个文件的评审结果和每个问题，支持跨运行的索引查询
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from git_diff import read_staged, repo_root
+
+
+DEFAULT_DB_PATH = "reports/review_results.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tool TEXT NOT NULL,
+    root TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    total_files INTEGER,
+    total_issues INTEGER,
+    average_score REAL,
+    files_with_errors INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    file_path TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    total_lines INTEGER NOT NULL,
+    score REAL NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    file_path TEXT NOT NULL,
+    line_number INTEGER NOT NULL,
+    severity TEXT NOT NULL,
+    category TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    message TEXT NOT NULL,
+    suggestion TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    first_run_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_files_path_run ON files(file_path, run_id);
+CREATE INDEX IF NOT EXISTS idx_files_run ON files(run_id);
+CREATE INDEX IF NOT EXISTS idx_issues_run ON issues(run_id, severity);
+CREATE INDEX IF NOT EXISTS idx_issues_file ON issues(file_path, run_id);
+CREATE INDEX IF NOT EXISTS idx_issues_rule ON issues(rule, severity, run_id);
+CREATE INDEX IF NOT EXISTS idx_issues_category ON issues(category, severity, run_id);
+CREATE INDEX IF NOT EXISTS idx_issues_fingerprint ON issues(fingerprint, run_id);
+"""
+
+# 问题首次出现的运行：取该文件上一次被评审时同一指纹问题的首次运行，没有则为本次运行
+_FIRST_RUN_SQL = """
+UPDATE issues SET first_run_id = COALESCE(
+    (SELECT prev.first_run_id FROM issues AS prev
+     WHERE prev.fingerprint = issues.fingerprint
+       AND prev.run_id = (SELECT MAX(f.run_id) FROM files AS f
+                          JOIN runs AS r ON r.id = f.run_id
+                          WHERE f.file_path = issues.file_path AND f.run_id < issues.run_id
+                            AND r.finished_at IS NOT NULL)),
+    issues.run_id)
+WHERE run_id = ?
+"""
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """打开结果数据库（WAL模式，写入时不阻塞其他进程的查询），不存在时创建表和索引"""
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def normalize_line(text: str) -> str:
+    """去掉首尾空白并把连续空白合并为一个空格，只改缩进或空格的行视为同一行"""
+    return ' '.join(text.split())
+
+
+def issue_fingerprint(rule: str, severity: str, message: str, line_text: str, occurrence: int = 0) -> str:
+    """问题指纹：由规则、严重程度、消息和问题所在行的规范化文本决定，不含行号和文件路径
+    
+    代码上下移动、在其他行新增同类问题时已有问题的指纹都不变；
+    只有所在行文本也完全相同的问题才按出现顺序区分。查询首次出现的运行时按文件路径匹配。
+    """
+    digest = hashlib.sha1()
+    for part in (rule, severity, message, normalize_line(line_text), str(occurrence)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:20]
+
+
+# 每写入多少个文件提交一次，避免长事务阻塞其他进程写入
+_COMMIT_EVERY = 100
+
+
+class ResultsDbWriter:
+    """把一次运行的评审结果逐个文件写入数据库，接口与报告写入器一致
+
+    结果分批提交，close时填写运行汇总、计算每个问题首次出现的运行；
+    查询只看已完成的运行，中途失败的运行不会出现在查询结果中。
+    文件路径统一记录为相对Git仓库根目录（不在仓库中时相对root）的路径，
+    用相对路径或绝对路径评审同一个文件时历史记录不会分裂。
+    计算问题指纹需要问题所在行的文本，staged为True时从暂存区读取，与评审的内容一致。
+    """
+
+    def __init__(self, db_path: str, tool: str, root: str, staged: bool = False):
+        self.output_file = db_path
+        self.tool = tool
+        self.root = os.path.abspath(root)
+        self.staged = staged
+        base = repo_root(root) or (self.root if os.path.isdir(self.root) else os.path.dirname(self.root))
+        self._base = os.path.realpath(base)
+        self.run_id: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending = 0
+
+    def normalize_path(self, file_path: str) -> str:
+        """相对仓库根目录、以/分隔的路径；位于仓库之外的文件保留绝对路径"""
+        path = os.path.realpath(file_path)
+        relative = os.path.relpath(path, self._base)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return path
+        return relative.replace(os.sep, '/')
+
+    def _source_lines(self, file_path: str) -> List[str]:
+        try:
+            if self.staged:
+                content = read_staged(file_path)
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+        except Exception:
+            return []
+        return content.split('\n')
+
+    def _start_run(self):
+        """首次写入时才创建运行记录，没有评审任何文件的运行不留下记录"""
+        self._conn = connect(self.output_file)
+        cursor = self._conn.execute(
+            "INSERT INTO runs (tool, root, started_at) VALUES (?, ?, ?)",
+            (self.tool, self.root, datetime.now().isoformat())
+        )
+        self.run_id = cursor.lastrowid
+        self._conn.commit()
+
+    def add(self, result):
+        if self._conn is None:
+            self._start_run()
+        file_path = self.normalize_path(result.file_path)
+        cursor = self._conn.execute(
+            "INSERT INTO files (run_id, file_path, file_name, total_lines, score, summary) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self.run_id, file_path, result.file_name, result.total_lines, result.score, result.summary)
+        )
+        file_id = cursor.lastrowid
+
+        lines = self._source_lines(result.file_path) if result.issues else []
+        occurrences: Dict[tuple, int] = {}
+        rows = []
+        for issue in result.issues:
+            # 文件级问题（行号为0）和超出文件范围的行号没有所在行文本
+            line_text = lines[issue.line_number - 1] if 0 < issue.line_number <= len(lines) else ''
+            key = (issue.rule, issue.severity, issue.message, normalize_line(line_text))
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            rows.append((self.run_id, file_id, file_path, issue.line_number, issue.severity,
+                         issue.category, issue.rule, issue.message, issue.suggestion,
+                         issue_fingerprint(*key, occurrence)))
+        self._conn.executemany(
+            "INSERT INTO issues (run_id, file_id, file_path, line_number, severity, category, rule, "
+            "message, suggestion, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self, cache_stats: Optional[Dict[str, int]] = None,
+              profile_stats: Optional[Dict[str, Any]] = None):
+        if self._conn is None:
+            self._start_run()
+        self._conn.execute(_FIRST_RUN_SQL, (self.run_id,))
+        self._conn.execute(
+            "UPDATE runs SET finished_at = ?, "
+            "total_files = (SELECT COUNT(*) FROM files WHERE run_id = runs.id), "
+            "total_issues = (SELECT COUNT(*) FROM issues WHERE run_id = runs.id), "
+            "average_score = (SELECT COALESCE(AVG(score), 0) FROM files WHERE run_id = runs.id), "
+            "files_with_errors = (SELECT COUNT(DISTINCT file_id) FROM issues "
+            "                     WHERE run_id = runs.id AND severity = 'error') "
+            "WHERE id = ?",
+            (datetime.now().isoformat(), self.run_id)
+        )
+        self._conn.commit()
+        self._conn.close()
+
+
+def query_issues(conn: sqlite3.Connection, last_runs: int = 1, introduced: bool = False,
+                 file_glob: Optional[str] = None, rule: Optional[str] = None,
+                 category: Optional[str] = None, severity: Optional[str] = None,
+                 limit: int = 100) -> List[Dict[str, Any]]:
+    """在最近last_runs次运行中查询问题
+
+    introduced为True时只返回在这些运行中首次出现的问题（每个问题只返回引入它的那次运行的记录）。
+    """
+    conditions = ["i.run_id IN (SELECT id FROM runs WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT ?)"]
+    params: List[Any] = [last_runs]
+    if introduced:
+        conditions.append("i.run_id = i.first_run_id")
+    for column, value in (("i.rule", rule), ("i.category", category), ("i.severity", severity)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if file_glob:
+        conditions.append("i.file_path GLOB ?")
+        params.append(file_glob)
+    params.append(limit)
+
+    sql = (
+        "SELECT i.run_id, r.started_at, i.file_path, i.line_number, i.severity, i.category, i.rule, "
+        "i.message, i.suggestion, i.first_run_id FROM issues AS i JOIN runs AS r ON r.id = i.run_id "
+        f"WHERE {' AND '.join(conditions)} ORDER BY i.run_id DESC, i.file_path, i.line_number LIMIT ?"
+    )
+    cursor = conn.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def list_runs(conn: sqlite3.Connection, limit: int = 20) -> List[Dict[str, Any]]:
+    """最近的运行记录"""
+    cursor = conn.execute(
+        "SELECT id, tool, root, started_at, finished_at, total_files, total_issues, average_score, "
+        "files_with_errors FROM runs ORDER BY id DESC LIMIT ?", (limit,)
+    )
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def query_main(argv: Optional[Sequence[str]] = None):
+    """query子命令：按条件查询结果数据库"""
+    parser = argparse.ArgumentParser(prog='java_code_reviewer.py query', description='查询评审结果数据库')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='结果数据库路径')
+    parser.add_argument('--last-runs', type=int, default=1, help='查询最近N次运行（默认最近一次）')
+    parser.add_argument('--introduced', action='store_true', help='只列出在这些运行中新引入的问题')
+    parser.add_argument('--file', metavar='GLOB',
+                        help='按相对仓库根目录的文件路径过滤（GLOB语法，如 src/*/DateUtils.java 或 *DateUtils.java）')
+    parser.add_argument('--rule', help='按规则名过滤，如 thread_safety')
+    parser.add_argument('--category', help='按问题分类过滤，如 thread_safety')
+    parser.add_argument('--severity', choices=['error', 'warning', 'info'], help='按严重程度过滤')
+    parser.add_argument('--limit', type=int, default=100, help='最多返回的问题数')
+    parser.add_argument('--runs', action='store_true', help='列出最近的运行记录')
+    parser.add_argument('--json', action='store_true', help='以JSON Lines格式输出')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"错误: 结果数据库 {args.db} 不存在")
+        sys.exit(1)
+    conn = connect(args.db)
+
+    if args.runs:
+        rows = list_runs(conn, args.limit)
+        for row in rows:
+            if args.json:
+                print(json.dumps(row, ensure_ascii=False))
+            else:
+                print(f"#{row['id']} {row['started_at']} {row['tool']} {row['root']} "
+                      f"文件: {row['total_files']}, 问题: {row['total_issues']}, "
+                      f"平均评分: {(row['average_score'] or 0):.1f}")
+        conn.close()
+        return
+
+    rows = query_issues(conn, args.last_runs, args.introduced, args.file, args.rule,
+                        args.category, args.severity, args.limit)
+    conn.close()
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            print(f"#{row['run_id']} {row['file_path']}:{row['line_number']} "
+                  f"[{row['severity']}] ({row['rule'] or row['category']}) {row['message']}")
+    if not args.json:
+        print(f"共 {len(rows)} 条")
+
+
+if __name__ == "__main__":
+    query_main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评审结果磁盘缓存
+按内容哈希和规则集指纹缓存评审结果，未修改的文件直接复用上次的结果
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+DEFAULT_CACHE_DIR = ".review_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResultCache:
+    """基于内容哈希的磁盘缓存
+
+    每个条目是缓存目录下的一个JSON文件，文件名即键。
+    写入先落到同目录的临时文件再原子替换，多个CI任务并发读写同一目录是安全的；
+    命中时刷新文件修改时间，prune 按修改时间淘汰最久未使用的条目，使总大小不超过上限。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """由指纹、内容等组成部分计算缓存键"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def record_lookup(self, hit: bool):
+        """记录一次查询的命中情况"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存条目，未命中或条目损坏时返回None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.record_lookup(False)
+            return None
+        self.record_lookup(True)
+        return value
+
+    def put(self, key: str, value: Any):
+        """写入缓存条目，写入失败时静默跳过"""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(value, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+
+    def prune(self):
+        """按最近使用时间淘汰条目，使缓存总大小回落到上限的90%以内"""
+        entries = []
+        total = 0
+        try:
+            buckets = [d.path for d in os.scandir(self.cache_dir) if d.is_dir()]
+        except OSError:
+            return
+        for bucket in buckets:
+            try:
+                for entry in os.scandir(bucket):
+                    if entry.name.endswith('.json'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+            except OSError:
+                continue
+
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        """命中和未命中计数"""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+DEFAULT_RESPONSE_TTL = 7 * 24 * 3600
+
+
+class ResponseCache(ResultCache):
+    """AI响应缓存：在ResultCache的基础上为每个条目记录写入时间，超过ttl秒的条目视为未命中并删除
+
+    LRU淘汰、原子写入和多进程并发访问的特性与ResultCache相同。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_RESPONSE_TTL):
+        super().__init__(cache_dir, max_bytes)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry["created"] > self.ttl:
+                os.unlink(path)
+                raise OSError("expired")
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.record_lookup(False)
+            return None
+        self.record_lookup(True)
+        return entry["value"]
+
+    def put(self, key: str, value: Any):
+        super().put(key, {"created": time.time(), "value": value})
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 评审工具的模块都在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ANALYSIS_REPLY = '```json\n{"issues": [{"line_number": 1, "severity": "info", "category": "ai_analysis", ' \
+                 '"message": "ai", "suggestion": "s"}]}\n```'
+
+
+class FakeOllama:
+    """本地的Ollama替身：记录收到的提示和发来请求的客户端地址，用reply(prompt)生成回复"""
+
+    def __init__(self):
+        self.prompts = []
+        self.peers = set()
+        self.reply = lambda prompt: ANALYSIS_REPLY
+        self.models = ["deepseek-coder:6.7b"]
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._send({"models": [{"name": name} for name in fake.models]})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.prompts.append(payload["prompt"])
+                fake.peers.add(self.client_address)
+                self._send({"response": fake.reply(payload["prompt"]), "done": True})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/generate"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def ollama():
+    server = FakeOllama()
+    yield server
+    server.close()
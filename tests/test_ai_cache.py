@@ -0,0 +1,78 @@
+import sys
+import time
+
+import ai_enhanced_reviewer
+from ai_enhanced_reviewer import AIEnhancedReviewer
+from review_cache import ResponseCache
+
+
+SOURCE = "public class A {\n    public void run() {\n        System.out.println(\"a\");\n    }\n}\n"
+
+
+def _run(monkeypatch, tmp_path, ollama, *flags):
+    java_file = tmp_path / "A.java"
+    java_file.write_text(SOURCE, encoding="utf-8")
+    argv = ["ai_enhanced_reviewer.py", str(java_file), "--ollama-api", ollama.url, "--format", "json",
+            "--output-dir", str(tmp_path / "reports"), "--cache-dir", str(tmp_path / "cache"), *flags]
+    monkeypatch.setattr(sys, "argv", argv)
+    before = len(ollama.prompts)
+    ai_enhanced_reviewer.main()
+    return len(ollama.prompts) - before
+
+
+def test_no_ai_cache_requests_every_prompt_on_each_run(monkeypatch, tmp_path, ollama):
+    # 分析、改进建议、单元测试各一个请求
+    assert _run(monkeypatch, tmp_path, ollama, "--no-ai-cache") == 3
+    assert _run(monkeypatch, tmp_path, ollama, "--no-ai-cache") == 3
+
+
+def test_ai_cache_reuses_results_until_refresh(monkeypatch, tmp_path, ollama):
+    assert _run(monkeypatch, tmp_path, ollama) == 3
+    assert _run(monkeypatch, tmp_path, ollama) == 0
+    assert _run(monkeypatch, tmp_path, ollama, "--refresh-ai") == 3
+
+
+def test_expired_ai_results_are_requested_again(monkeypatch, tmp_path, ollama):
+    assert _run(monkeypatch, tmp_path, ollama, "--ai-cache-ttl", "0") == 3
+    assert _run(monkeypatch, tmp_path, ollama, "--ai-cache-ttl", "0") == 3
+
+
+def test_response_cache_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put("k" * 64, {"response": "x"})
+    assert cache.get("k" * 64) == {"response": "x"}
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get("k" * 64) is None
+    # 过期的条目被删除
+    cache.ttl = 60
+    assert cache.get("k" * 64) is None
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_failed_ai_analysis_is_not_cached(tmp_path, ollama):
+    ollama.reply = lambda prompt: "not json"
+    cache = ResponseCache(str(tmp_path))
+    reviewer = AIEnhancedReviewer(ollama.url, ai_cache=cache)
+    reviewer.review_source_with_ai("A.java", SOURCE)
+    reviewer.review_source_with_ai("A.java", SOURCE)
+    reviewer.close()
+    assert len(ollama.prompts) == 2
+
+
+def test_result_and_response_cache_hits_are_counted_separately(monkeypatch, tmp_path, ollama, capsys):
+    src = tmp_path / "src"
+    src.mkdir()
+    for index in range(5):
+        (src / f"A{index}.java").write_text(SOURCE.replace("class A", f"class A{index}"), encoding="utf-8")
+    argv = ["ai_enhanced_reviewer.py", str(src), "--ollama-api", ollama.url, "--format", "json",
+            "--output-dir", str(tmp_path / "reports"), "--cache-dir", str(tmp_path / "cache")]
+    monkeypatch.setattr(sys, "argv", argv)
+    ai_enhanced_reviewer.main()
+    out = capsys.readouterr().out
+    # 冷启动时每个文件的评审结果各未命中一次，Ollama响应层单独计数
+    assert "AI结果缓存命中: 0, 未命中: 5" in out
+    assert f"Ollama响应缓存命中: 0, 未命中: {len(ollama.prompts)}" in out
+    ai_enhanced_reviewer.main()
+    out = capsys.readouterr().out
+    assert "AI结果缓存命中: 5, 未命中: 0" in out
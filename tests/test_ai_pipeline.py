@@ -0,0 +1,105 @@
+import threading
+import time
+
+import ai_enhanced_reviewer
+import java_code_reviewer
+from ai_enhanced_reviewer import AIEnhancedReviewer, review_files_with_ai
+from conftest import ANALYSIS_REPLY
+
+
+SOURCE = "public class A {\n    public void run() {\n        System.out.println(\"a\");\n    }\n}\n"
+
+
+def _write_sources(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"C{i}.java"
+        path.write_text(SOURCE.replace("class A", f"class C{i}"), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def test_requests_in_flight_are_bounded_by_concurrency(tmp_path, ollama):
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def reply(prompt):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return ANALYSIS_REPLY
+
+    ollama.reply = reply
+    paths = _write_sources(tmp_path, 6)
+    reviewer = AIEnhancedReviewer(ollama.url, concurrency=3)
+    reviews = list(review_files_with_ai(reviewer, paths, concurrency=3))
+    reviewer.close()
+    # 每个文件三个请求，跨文件并发但同时最多3个
+    assert len(ollama.prompts) == 18
+    assert 2 <= peak <= 3
+    # 结果仍按输入顺序产出，建议与文件一一对应
+    assert [review.file_path for review in reviews] == paths
+    assert all(review.improvement and review.unit_tests for review in reviews)
+
+
+def test_concurrency_one_is_serial(tmp_path, ollama):
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def reply(prompt):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        return ANALYSIS_REPLY
+
+    ollama.reply = reply
+    reviewer = AIEnhancedReviewer(ollama.url, concurrency=1)
+    list(review_files_with_ai(reviewer, _write_sources(tmp_path, 3), concurrency=1))
+    reviewer.close()
+    assert peak == 1
+
+
+def test_each_file_is_read_once(tmp_path, ollama, monkeypatch):
+    reads = []
+    original = java_code_reviewer.read_source
+
+    def counting_read(file_path):
+        reads.append(file_path)
+        return original(file_path)
+
+    monkeypatch.setattr(java_code_reviewer, "read_source", counting_read)
+    monkeypatch.setattr(ai_enhanced_reviewer, "read_source", counting_read)
+    paths = _write_sources(tmp_path, 4)
+    reviewer = AIEnhancedReviewer(ollama.url, concurrency=4)
+    reviews = list(review_files_with_ai(reviewer, paths, concurrency=4))
+    reviewer.close()
+    # 静态评审、AI分析、改进建议和单元测试共用一次读取的内容
+    assert sorted(reads) == paths
+    assert len(ollama.prompts) == 12
+    assert all(review.improvement for review in reviews)
+
+
+def test_unsaved_buffer_is_reviewed_without_touching_disk(tmp_path, ollama, monkeypatch):
+    def no_read(file_path):
+        raise AssertionError(f"不应读取 {file_path}")
+
+    monkeypatch.setattr(java_code_reviewer, "read_source", no_read)
+    monkeypatch.setattr(ai_enhanced_reviewer, "read_source", no_read)
+    missing = str(tmp_path / "Unsaved.java")
+    reviewer = AIEnhancedReviewer(ollama.url)
+    result = reviewer.review_source_with_ai(missing, SOURCE)
+    assert result.file_path == missing
+    assert [issue.message for issue in result.issues if issue.rule == "ai_analysis"] == ["ai"]
+    assert reviewer.generate_improvement_suggestions(missing, SOURCE)
+    assert reviewer.generate_unit_tests(missing, SOURCE)
+    reviewer.close()
@@ -0,0 +1,111 @@
+import json
+import re
+
+import ai_enhanced_reviewer
+from ai_enhanced_reviewer import AIEnhancedReviewer, review_files_with_ai
+from review_cache import ResponseCache
+
+
+def _batch_reply(drop=()):
+    def reply(prompt):
+        if '"files": [' not in prompt:
+            return '{"issues": [{"line_number": 1, "severity": "info", "message": "single"}]}'
+        ids = [file_id for file_id in re.findall(r"### 文件 (F\d+):", prompt) if file_id not in drop]
+        return json.dumps({"files": [{"file": file_id, "issues": [
+            {"line_number": "2", "severity": "info", "message": f"batch {file_id}"}]} for file_id in ids]})
+    return reply
+
+
+def _write_sources(tmp_path, count, body_lines=3):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"C{i}.java"
+        path.write_text("public class C%d {\n%s}\n" % (i, "    int f;\n" * body_lines), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def _analysis_prompts(ollama):
+    return [prompt for prompt in ollama.prompts if "改进建议" not in prompt and "单元测试" not in prompt]
+
+
+def test_batched_results_are_split_per_file(tmp_path, ollama):
+    ollama.reply = _batch_reply()
+    paths = _write_sources(tmp_path, 5)
+    reviewer = AIEnhancedReviewer(ollama.url, batch_tokens=1000, batch_max_files=3)
+    reviews = list(review_files_with_ai(reviewer, paths, concurrency=2))
+    reviewer.close()
+    assert [review.file_path for review in reviews] == paths
+    for number, review in zip([1, 2, 3, 1, 2], reviews):
+        ai_messages = [(issue.line_number, issue.message) for issue in review.result.issues
+                       if issue.rule == "ai_analysis"]
+        assert ai_messages == [(2, f"batch F{number}")]
+    # 5个文件按每批最多3个分为两个分析请求
+    assert len([prompt for prompt in _analysis_prompts(ollama) if '"files": [' in prompt]) == 2
+
+
+def test_file_missing_from_batch_reply_is_analyzed_alone(tmp_path, ollama):
+    ollama.reply = _batch_reply(drop=("F2",))
+    paths = _write_sources(tmp_path, 3)
+    reviewer = AIEnhancedReviewer(ollama.url)
+    results = reviewer.review_sources_batched([(path, open(path, encoding="utf-8").read()) for path in paths])
+    reviewer.close()
+    messages = [[issue.message for issue in result.issues if issue.rule == "ai_analysis"] for result in results]
+    assert messages == [["batch F1"], ["single"], ["batch F3"]]
+    assert len(ollama.prompts) == 2
+
+
+def test_large_files_are_not_batched(tmp_path, ollama):
+    ollama.reply = _batch_reply()
+    small = _write_sources(tmp_path, 2)
+    big = tmp_path / "Big.java"
+    big.write_text("public class Big {\n" + "    int field;\n" * 200 + "}\n", encoding="utf-8")
+    reviewer = AIEnhancedReviewer(ollama.url, batch_tokens=200)
+    reviews = list(review_files_with_ai(reviewer, [small[0], str(big), small[1]], concurrency=1))
+    reviewer.close()
+    prompts = _analysis_prompts(ollama)
+    assert sum('"files": [' in prompt for prompt in prompts) == 0
+    assert len(prompts) == 3
+    assert [review.file_path for review in reviews] == [small[0], str(big), small[1]]
+
+
+def test_multibyte_sources_use_the_same_estimate_for_grouping_and_batching(tmp_path, ollama):
+    ollama.reply = _batch_reply()
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"Z{i}.java"
+        # 每个汉字3个字节：按字符数在预算内，按字节数超出预算
+        path.write_text("public class Z%d {\n    // %s\n}\n" % (i, "中" * 60), encoding="utf-8")
+        paths.append(str(path))
+    reviewer = AIEnhancedReviewer(ollama.url, batch_tokens=50)
+    list(review_files_with_ai(reviewer, paths, concurrency=1))
+    reviewer.close()
+    prompts = _analysis_prompts(ollama)
+    assert len(prompts) == 2 and not any('"files": [' in prompt for prompt in prompts)
+
+
+def test_batched_results_are_cached_under_the_batch_prompt(tmp_path, ollama, monkeypatch):
+    ollama.reply = _batch_reply()
+    sources = [(path, open(path, encoding="utf-8").read()) for path in _write_sources(tmp_path, 2)]
+    cache = ResponseCache(str(tmp_path / "cache"))
+
+    def review(batched):
+        reviewer = AIEnhancedReviewer(ollama.url, ai_cache=cache)
+        if batched:
+            reviewer.review_sources_batched(sources)
+        else:
+            reviewer.review_source_with_ai(*sources[0])
+        reviewer.close()
+
+    review(batched=True)
+    assert len(ollama.prompts) == 1
+    review(batched=True)
+    assert len(ollama.prompts) == 1
+    # 单文件分析与批量分析的结果互不复用
+    review(batched=False)
+    assert len(ollama.prompts) == 2
+    # 批量提示模板改变后，批量结果不再命中
+    monkeypatch.setattr(ai_enhanced_reviewer, "BATCH_ANALYSIS_PROMPT",
+                        ai_enhanced_reviewer.BATCH_ANALYSIS_PROMPT + "\n")
+    review(batched=True)
+    assert len(ollama.prompts) == 3
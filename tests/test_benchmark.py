@@ -0,0 +1,44 @@
+from benchmark import compare, summarize
+
+
+def _measurement(files_per_sec, rss=40.0):
+    return {"review": {"files_per_sec": files_per_sec, "lines_per_sec": files_per_sec * 200},
+            "peak_rss_mb": {"self": rss, "children": 0.0}}
+
+
+def _run(*samples, rss=40.0):
+    return {"metrics": summarize([_measurement(value, rss) for value in samples])}
+
+
+def test_summarize_best_of_runs():
+    metrics = summarize([_measurement(300, 45.0), _measurement(400, 41.0), _measurement(350, 43.0)])
+    assert metrics["review.files_per_sec"]["best"] == 400
+    assert metrics["peak_rss_mb.self"]["best"] == 41.0
+
+
+def test_noisy_baseline_does_not_widen_tolerance():
+    # 基线离散度很大（旧实现会把阈值放宽到约30%），最好值下降15%仍然判为回归
+    baseline = _run(250, 400, 550)
+    passed, lines = compare(_run(467.5, 450, 400), baseline, 0.10, 0.15)
+    assert not passed
+    assert "允许 10.0%" in lines[0]
+
+
+def test_slow_outliers_do_not_fail_the_gate():
+    baseline = _run(500, 480, 490)
+    passed, _ = compare(_run(300, 495, 350), baseline, 0.10, 0.15)
+    assert passed
+
+
+def test_memory_rise_is_gated():
+    passed, lines = compare(_run(500, rss=50.0), _run(500, rss=40.0), 0.10, 0.15)
+    assert not passed
+    assert any(line.startswith("❌") and "peak_rss_mb.self" in line for line in lines)
+
+
+def test_old_baseline_without_best_field():
+    baseline = _run(500)
+    for stats in baseline["metrics"].values():
+        del stats["best"]
+    passed, _ = compare(_run(480), baseline, 0.10, 0.15)
+    assert passed
@@ -0,0 +1,146 @@
+import socket
+import sys
+import time
+
+import pytest
+
+import ai_enhanced_reviewer
+from ai_enhanced_reviewer import AIEnhancedReviewer
+from ollama_client import CircuitBreaker, OllamaClient, OllamaEndpoints, OllamaUnavailable
+
+
+SOURCE = "public class A {\n    public void run() {\n        System.out.println(\"a\");\n    }\n}\n"
+
+
+def _dead_url():
+    # 绑定后立即关闭的端口，连接会被拒绝
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/api/generate"
+
+
+def test_breaker_opens_after_threshold_and_probes_after_reset():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert not breaker.allow()
+    assert breaker.trips == 1 and breaker.rejected == 1
+
+    time.sleep(0.06)
+    # 半开状态只放行一个试探请求
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open()
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert breaker.trips == 1
+
+
+def test_endpoints_fail_over_and_count_rejections(ollama):
+    dead = _dead_url()
+    client = OllamaClient(breaker_threshold=1)
+    endpoints = OllamaEndpoints(client, [dead, ollama.url], retries=1, backoff=0)
+    payload = {"model": "m", "prompt": "p", "stream": False}
+    for _ in range(4):
+        assert endpoints.post_json(payload)["response"]
+    assert len(ollama.prompts) == 4
+    stats = client.stats()
+    # 死端点最多失败一次就被熔断，之后选择端点时被跳过并计入拒绝
+    assert stats["breaker_trips"] == 1
+    assert stats["rejected"] >= 2
+    assert "拒绝" in client.format_stats()
+    assert not endpoints.is_open()
+    client.close()
+
+
+def test_all_endpoints_open_raises_unavailable(ollama):
+    client = OllamaClient()
+    endpoints = OllamaEndpoints(client, ollama.url, retries=2, backoff=0)
+    client.breaker(ollama.url).trip()
+    assert endpoints.is_open()
+    with pytest.raises(OllamaUnavailable):
+        endpoints.post_json({"model": "m", "prompt": "p", "stream": False})
+    assert ollama.prompts == []
+    assert client.stats()["rejected"] == 1
+    client.close()
+
+
+def test_open_breaker_falls_back_to_static_review(ollama):
+    reviewer = AIEnhancedReviewer(ollama.url)
+    static = reviewer.review_source("A.java", SOURCE)
+    reviewer.client.breaker(ollama.url).trip()
+
+    result = reviewer.review_source_with_ai("A.java", SOURCE)
+    assert [issue.message for issue in result.issues] == [issue.message for issue in static.issues]
+    assert reviewer.static_fallbacks == 1
+    # 熔断期间也不发送改进建议和单元测试请求
+    assert reviewer.generate_improvement_suggestions("A.java", SOURCE) is None
+    assert reviewer.generate_unit_tests("A.java", SOURCE) is None
+    assert ollama.prompts == []
+    reviewer.close()
+
+
+def test_breaker_recovers_after_reset(ollama):
+    client = OllamaClient(breaker_reset=0.05)
+    reviewer = AIEnhancedReviewer(ollama.url, client=client)
+    client.breaker(ollama.url).trip()
+    assert reviewer.generate_improvement_suggestions("A.java", SOURCE) is None
+
+    time.sleep(0.06)
+    assert reviewer.generate_improvement_suggestions("A.java", SOURCE) is not None
+    assert not reviewer.endpoints.is_open()
+    assert len(ollama.prompts) == 1
+    reviewer.close()
+
+
+def test_trip_is_a_no_op_when_breaker_is_disabled():
+    breaker = CircuitBreaker(failure_threshold=0)
+    breaker.trip()
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.trips == 0
+
+
+def _run_against(monkeypatch, tmp_path, url, *flags):
+    src = tmp_path / "src"
+    src.mkdir(exist_ok=True)
+    for name in ("A", "B"):
+        (src / f"{name}.java").write_text(SOURCE.replace("class A", f"class {name}"), encoding="utf-8")
+    argv = ["ai_enhanced_reviewer.py", str(src), "--ollama-api", url, "--format", "json", "--no-cache",
+            "--no-ai-cache", "--output-dir", str(tmp_path / "reports"), *flags]
+    monkeypatch.setattr(sys, "argv", argv)
+    ai_enhanced_reviewer.main()
+
+
+def test_full_fallback_summary_reports_skipped_requests(monkeypatch, tmp_path, capsys):
+    _run_against(monkeypatch, tmp_path, _dead_url())
+    out = capsys.readouterr().out
+    assert "有 2 个文件只做了静态评审" in out
+    assert "AI建议: 生成 0 条, 失败 0 条, Ollama不可用跳过 4 条" in out
+    # 每个文件的AI分析、改进建议和单元测试三个请求都没有发出
+    assert "熔断 1 次, 拒绝 6 个请求" in out
+
+
+def test_disabled_breaker_keeps_sending_requests(monkeypatch, tmp_path, capsys):
+    _run_against(monkeypatch, tmp_path, _dead_url(), "--breaker-threshold", "0", "--retries", "0")
+    out = capsys.readouterr().out
+    assert "熔断已关闭" in out
+    assert "只做了静态评审" not in out
+    assert "AI建议: 生成 0 条, 失败 4 条, Ollama不可用跳过 0 条" in out
+
+
+def test_generated_suggestions_are_counted(monkeypatch, tmp_path, capsys, ollama):
+    _run_against(monkeypatch, tmp_path, ollama.url)
+    assert "AI建议: 生成 4 条, 失败 0 条, Ollama不可用跳过 0 条" in capsys.readouterr().out
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+import requests
+
+import ollama_client
+from ollama_client import HEDGE_MIN_SAMPLES, MAX_BACKOFF, OllamaClient, OllamaEndpoints
+
+
+URLS = ["http://a:11434/api/generate", "http://b:11434/api/generate", "http://c:11434/api/generate"]
+PAYLOAD = {"model": "m", "prompt": "p", "stream": False}
+
+
+class FakeClient(OllamaClient):
+    """不发网络请求的客户端：handler(url, 第几次调用)决定每次请求的行为，熔断器与真实客户端相同"""
+
+    def __init__(self, handler, **kwargs):
+        super().__init__(**kwargs)
+        self.handler = handler
+        self.calls = []
+        self._calls_lock = threading.Lock()
+
+    def post_json(self, url, payload, timeout=None, cache_scope=None):
+        with self._calls_lock:
+            self.calls.append(url)
+            number = len(self.calls)
+        return self.handler(url, number)
+
+
+def test_slow_primary_loses_to_hedge():
+    release = threading.Event()
+
+    def handler(url, number):
+        # 第一个请求卡住，对冲请求立即返回
+        if number == 1:
+            release.wait(5)
+            return {"response": "primary"}
+        return {"response": "hedge"}
+
+    client = FakeClient(handler)
+    endpoints = OllamaEndpoints(client, URLS[:2], retries=0, hedge_percentile=90)
+    endpoints._all_latencies.extend([0.01] * HEDGE_MIN_SAMPLES)
+    start = time.monotonic()
+    try:
+        assert endpoints.post_json(PAYLOAD) == {"response": "hedge"}
+        assert time.monotonic() - start < 1
+        assert endpoints.hedged == 1 and endpoints.hedge_wins == 1
+        # 对冲请求发往另一个端点
+        assert len(set(client.calls)) == 2
+    finally:
+        release.set()
+        endpoints.close()
+        client.close()
+
+
+def test_no_hedge_until_enough_latency_samples():
+    client = FakeClient(lambda url, number: {"response": "ok"})
+    endpoints = OllamaEndpoints(client, URLS[:2], retries=0, hedge_percentile=90)
+    for _ in range(HEDGE_MIN_SAMPLES - 1):
+        endpoints.post_json(PAYLOAD)
+    assert endpoints._hedge_delay() is None
+    endpoints.post_json(PAYLOAD)
+    assert endpoints._hedge_delay() is not None
+    assert endpoints.hedged == 0
+    endpoints.close()
+    client.close()
+
+
+def test_least_outstanding_endpoint_is_picked_under_load():
+    gates = {url: threading.Event() for url in URLS}
+    arrived = threading.Semaphore(0)
+
+    def handler(url, number):
+        arrived.release()
+        gates[url].wait(5)
+        return {"response": url}
+
+    client = FakeClient(handler)
+    endpoints = OllamaEndpoints(client, URLS, retries=0)
+    threads = []
+
+    def send(count):
+        for _ in range(count):
+            thread = threading.Thread(target=endpoints.post_json, args=(PAYLOAD,))
+            thread.start()
+            threads.append(thread)
+        for _ in range(count):
+            assert arrived.acquire(timeout=5)
+
+    try:
+        send(6)
+        # 6个未完成的请求平均分到3个端点
+        assert Counter(client.calls) == {url: 2 for url in URLS}
+        # a上的请求完成后，新请求都发往空闲的a
+        gates[URLS[0]].set()
+        while endpoints._outstanding[URLS[0]]:
+            time.sleep(0.01)
+        send(2)
+        assert client.calls[6:] == [URLS[0], URLS[0]]
+    finally:
+        for gate in gates.values():
+            gate.set()
+        for thread in threads:
+            thread.join()
+        endpoints.close()
+        client.close()
+    assert endpoints._outstanding == {url: 0 for url in URLS}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # 退避取抖动区间的上限，记录等待时间而不真正等待
+    recorded = []
+    monkeypatch.setattr(ollama_client.time, "sleep", recorded.append)
+    monkeypatch.setattr(ollama_client.random, "uniform", lambda low, high: high)
+    return recorded
+
+
+def _failing(url, number):
+    raise requests.ConnectionError("refused")
+
+
+def test_retries_are_bounded_and_backoff_is_capped(sleeps):
+    client = FakeClient(_failing, breaker_threshold=0)
+    endpoints = OllamaEndpoints(client, URLS[0], retries=5, backoff=1.0)
+    with pytest.raises(requests.ConnectionError):
+        endpoints.post_json(PAYLOAD)
+    assert len(client.calls) == 6
+    assert endpoints.retried == 5
+    # 指数增长，不超过上限，最后一次失败后不再等待
+    assert sleeps == [1.0, 2.0, 4.0, MAX_BACKOFF, MAX_BACKOFF]
+    client.close()
+
+
+def test_retry_moves_to_another_endpoint(sleeps):
+    client = FakeClient(lambda url, number: _failing(url, number) if number == 1 else {"response": url},
+                        breaker_threshold=0)
+    endpoints = OllamaEndpoints(client, URLS[:2], retries=2, backoff=0.5)
+    assert endpoints.post_json(PAYLOAD) == {"response": client.calls[1]}
+    assert client.calls[0] != client.calls[1]
+    assert sleeps == [0.5]
+    client.close()
+
+
+def test_open_breaker_is_retried_elsewhere_without_backoff(sleeps):
+    client = FakeClient(lambda url, number: {"response": url})
+    client.breaker(URLS[0]).trip()
+    endpoints = OllamaEndpoints(client, URLS[:2], retries=2, backoff=1.0)
+    for _ in range(3):
+        assert endpoints.post_json(PAYLOAD) == {"response": URLS[1]}
+    assert sleeps == [] and endpoints.retried == 0
+    client.close()
@@ -0,0 +1,79 @@
+import os
+
+from file_walker import IgnoreRule, iter_java_files, parse_ignore_lines
+
+
+def test_pattern_without_slash_matches_any_level():
+    rule = IgnoreRule("*Generated.java")
+    assert rule.matches("FooGenerated.java", False)
+    assert rule.matches("a/b/FooGenerated.java", False)
+    assert not rule.matches("a/Generated/Foo.java", False)
+
+
+def test_pattern_with_slash_is_anchored():
+    rule = IgnoreRule("/src/gen")
+    assert rule.matches("src/gen", True)
+    assert not rule.matches("module/src/gen", True)
+
+
+def test_double_star_and_character_class():
+    assert IgnoreRule("src/**/Test*.java").matches("src/a/b/TestA.java", False)
+    assert IgnoreRule("src/**/Test*.java").matches("src/TestA.java", False)
+    assert IgnoreRule("**/tmp").matches("a/b/tmp", True)
+    assert IgnoreRule("src/**").matches("src/a/B.java", False)
+    assert IgnoreRule("V[0-9].java").matches("V1.java", False)
+    assert not IgnoreRule("V[!0-9].java").matches("V1.java", False)
+    assert not IgnoreRule("?.java").matches("a/bc.java", False)
+
+
+def test_dir_only_and_negation():
+    dir_rule = IgnoreRule("logs/")
+    assert dir_rule.matches("logs", True)
+    assert not dir_rule.matches("logs", False)
+    assert IgnoreRule("!Keep.java").negate
+
+
+def test_parse_skips_comments_and_blank_lines():
+    rules = parse_ignore_lines(["# comment\n", "\n", "out/  \n", "\\#literal\n"])
+    assert len(rules) == 2
+    assert rules[0].dir_only and rules[0].matches("out", True)
+    assert rules[1].matches("#literal", False)
+
+
+def _touch(root, rel_path, text="class A {}\n"):
+    path = os.path.join(root, *rel_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_walker_applies_gitignore_excludes_and_build_dirs(tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, '.git'))
+    _touch(root, '.gitignore', "*Generated.java\n!KeepGenerated.java\nlocal/\n")
+    _touch(root, 'pom.xml', "<project/>\n")
+    for rel_path in ('src/main/A.java', 'src/main/BGenerated.java', 'src/main/KeepGenerated.java',
+                     'src/test/ATest.java', 'local/L.java', 'target/T.java', 'src/target/P.java',
+                     'node_modules/x/N.java', 'sub/.gitignore', 'sub/S.java', 'sub/Skip.java', 'README.md'):
+        _touch(root, rel_path, "Skip.java\n" if rel_path.endswith('.gitignore') else "class A {}\n")
+
+    def found(**kwargs):
+        return [os.path.relpath(path, root).replace(os.sep, '/') for path in iter_java_files(root, **kwargs)]
+
+    assert found() == ['src/main/A.java', 'src/main/KeepGenerated.java', 'src/target/P.java',
+                       'src/test/ATest.java', 'sub/S.java']
+    assert found(excludes=['src/test/']) == ['src/main/A.java', 'src/main/KeepGenerated.java',
+                                            'src/target/P.java', 'sub/S.java']
+    assert found(includes=['src/main/**']) == ['src/main/A.java', 'src/main/KeepGenerated.java']
+    assert 'local/L.java' in found(use_gitignore=False)
+    assert 'sub/Skip.java' in found(use_gitignore=False)
+
+
+def test_gitignore_above_walk_root_applies(tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, '.git'))
+    _touch(root, '.gitignore', "module/gen/\n")
+    _touch(root, 'module/gen/G.java')
+    _touch(root, 'module/src/M.java')
+    found = [os.path.relpath(path, root) for path in iter_java_files(os.path.join(root, 'module'))]
+    assert found == [os.path.join('module', 'src', 'M.java')]
@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from ai_enhanced_reviewer import _issues_from_data
+import java_code_reviewer
+from git_diff import changed_java_files, in_ranges, parse_diff, read_staged
+from java_code_reviewer import ReviewResult, restrict_to_changed_lines
+
+
+DIFF = """\
+diff --git a/src/A.java b/src/A.java
+--- a/src/A.java
++++ b/src/A.java
+@@ -3,0 +4,2 @@ class A {
+@@ -10 +12 @@ class A {
+@@ -20,3 +21,0 @@ class A {
+diff --git a/src/Gone.java b/src/Gone.java
+--- a/src/Gone.java
++++ /dev/null
+@@ -1,5 +0,0 @@
+"""
+
+
+def test_parse_diff_ranges():
+    changes = parse_diff(DIFF, "/repo")
+    # 纯删除的块和已删除的文件没有改动行
+    assert changes == {os.path.join("/repo", "src/A.java"): [(4, 5), (12, 12)]}
+
+
+def test_in_ranges():
+    ranges = [(4, 5), (12, 12)]
+    assert in_ranges(4, ranges) and in_ranges(5, ranges) and in_ranges(12, ranges)
+    assert not in_ranges(6, ranges) and not in_ranges(13, ranges)
+
+
+def _git(cwd, *args):
+    subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", *args], cwd=cwd, check=True,
+                   capture_output=True)
+
+
+def test_changed_java_files(tmp_path):
+    try:
+        _git(tmp_path, "init", "-q")
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("git不可用")
+    source = tmp_path / "A.java"
+    source.write_text("class A {\n    int a;\n    int b;\n}\n", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("x\n", encoding="utf-8")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+    source.write_text("class A {\n    int a;\n    int c;\n    int d;\n}\n", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("y\n", encoding="utf-8")
+
+    changes = changed_java_files(str(tmp_path), "HEAD")
+    root = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=tmp_path,
+                          capture_output=True, text=True).stdout.strip()
+    assert changes == {os.path.join(root, "A.java"): [(3, 4)]}
+
+    _git(tmp_path, "add", "A.java")
+    assert list(changed_java_files(str(tmp_path), staged=True).values()) == [[(3, 4)]]
+
+
+def test_restrict_to_changed_lines_with_ai_line_numbers():
+    issues = _issues_from_data([
+        {"line_number": "3", "severity": "warning", "message": "in range"},
+        {"line_number": "第7行", "severity": "warning", "message": "file level"},
+        {"line_number": 9, "severity": "warning", "message": "out of range"},
+        {"line_number": None, "severity": "info", "message": "missing"},
+    ])
+    assert [issue.line_number for issue in issues] == [3, 0, 9, 0]
+    result = ReviewResult("A.java", "A.java", 20, issues, 0, "")
+    kept = restrict_to_changed_lines(result, [(3, 4)])
+    assert [issue.message for issue in kept.issues] == ["in range", "file level", "missing"]
+
+
+def test_staged_review_reads_the_index_version(monkeypatch, tmp_path):
+    try:
+        _git(tmp_path, "init", "-q")
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("git不可用")
+    source = tmp_path / "A.java"
+    source.write_text("public class A {\n    void a() {\n    }\n}\n", encoding="utf-8")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+    # 暂存第3行的输出语句，之后在工作区文件开头再插入两行（未暂存）
+    staged = "public class A {\n    void a() {\n        System.out.println(\"a\");\n    }\n}\n"
+    source.write_text(staged, encoding="utf-8")
+    _git(tmp_path, "add", "A.java")
+    source.write_text("// 未暂存\n// 未暂存\n" + staged, encoding="utf-8")
+    assert read_staged(str(source)) == staged
+
+    output = tmp_path / "issues.jsonl"
+    monkeypatch.setattr(sys, "argv", ["java_code_reviewer.py", str(tmp_path), "--staged", "--only-changed-lines",
+                                      "--format", "jsonl", "--jsonl-output", str(output), "--no-cache",
+                                      "--output-dir", str(tmp_path / "reports")])
+    java_code_reviewer.main()
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    issues = [(r["line"], r["rule"]) for r in records if r["type"] == "issue"]
+    assert (3, "logging") in issues
+    assert all(line == 3 for line, _ in issues)
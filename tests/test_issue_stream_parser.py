@@ -0,0 +1,62 @@
+import json
+import random
+
+from ai_enhanced_reviewer import IssueStreamParser, _extract_json
+
+
+ISSUES = [
+    {"line_number": 3, "severity": "warning", "category": "exception", "message": "空的 {catch} 块",
+     "suggestion": '记录日志 "e"'},
+    {"line_number": 9, "severity": "info", "category": "style", "message": "[方括号] 和 \\ 反斜杠",
+     "suggestion": "s"},
+]
+REPLY = "分析如下 [说明]：\n```json\n" + json.dumps({"issues": ISSUES, "summary": "两个问题"},
+                                                     ensure_ascii=False, indent=2) + "\n```\n后续说明"
+
+
+def _feed_in_pieces(text, sizes):
+    parser = IssueStreamParser()
+    pos = 0
+    closed_at = None
+    for size in sizes:
+        if pos >= len(text):
+            break
+        if parser.feed(text[pos:pos + size]) and closed_at is None:
+            closed_at = pos + size
+        pos += size
+    return parser, closed_at
+
+
+def test_random_chunking_matches_whole_parse():
+    rng = random.Random(7)
+    expected = json.loads(_extract_json(REPLY))["issues"]
+    for _ in range(200):
+        sizes = [rng.randint(1, 12) for _ in range(len(REPLY))]
+        parser, closed_at = _feed_in_pieces(REPLY, sizes)
+        assert parser.issues == expected
+        assert parser.closed
+        # issues数组闭合后立即结束，不等summary
+        assert closed_at <= REPLY.index('"summary"') + 12
+
+
+def test_object_without_issues_key_closes_at_top_level():
+    parser = IssueStreamParser()
+    assert not parser.feed('说明 {不是JSON} ')
+    assert parser.feed('{"summary": "ok"}')
+    assert parser.issues == []
+
+
+def test_feed_after_close_is_ignored():
+    parser = IssueStreamParser()
+    parser.feed('{"issues": [{"line_number": 1}]}')
+    assert parser.feed('{"issues": [{"line_number": 2}]}')
+    assert parser.issues == [{"line_number": 1}]
+
+
+def test_long_stream_in_small_pieces():
+    items = [{"line_number": i, "message": "m" * 20} for i in range(2000)]
+    text = json.dumps({"issues": items})
+    parser = IssueStreamParser()
+    for i in range(0, len(text), 3):
+        parser.feed(text[i:i + 3])
+    assert parser.closed and len(parser.issues) == 2000
@@ -0,0 +1,92 @@
+import java_chunker
+from java_chunker import GAP_MARKER, chunk_source, focus_chunk, member_complexity, split_members
+from java_lexer import JavaSource
+
+
+def _method(name, body_lines):
+    return [f"    public void {name}() {{"] + [f"        step(\"{name}{i}\");" for i in range(body_lines)] + ["    }"]
+
+
+def _source():
+    lines = ["package demo;", "", "import java.util.List;", "", "public class Demo {",
+             "    private int count;  // 字段注释 { 不是代码块", ""]
+    for name in ("first", "second", "third"):
+        lines += ["    @Override"] + _method(name, 8) + [""]
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def test_split_members_separates_header_and_members():
+    content = _source()
+    lines = content.split("\n")
+    header, members = split_members(content)
+    assert [lines[first - 1].strip() for first, _ in members] == ["@Override"] * 3
+    assert all(lines[last - 1].strip() == "}" for _, last in members)
+    header_text = [lines[i - 1] for i in header]
+    assert "package demo;" in header_text and "    private int count;  // 字段注释 { 不是代码块" in header_text and "}" in header_text
+
+
+def test_chunk_line_map_points_at_file_lines():
+    content = _source()
+    lines = content.split("\n")
+    chunks = chunk_source(content, max_lines=12)
+    assert len(chunks) == 3
+    for chunk in chunks:
+        assert len(chunk.lines) == len(chunk.line_map)
+        for text, file_line in zip(chunk.lines, chunk.line_map):
+            if file_line:
+                assert lines[file_line - 1] == text
+            else:
+                assert text == GAP_MARKER
+    # 每个方法恰好出现在一个块中
+    covered = [n for chunk in chunks for n in chunk.line_map if 'step("' in lines[n - 1]]
+    assert sorted(covered) == [i for i, line in enumerate(lines, 1) if 'step("' in line]
+    assert chunks[1].file_line(0) == 0 and chunks[1].file_line(10_000) == 0 and chunks[1].file_line("x") == 0
+    # AI返回的行号可能是字符串
+    chunk_line = next(i for i, text in enumerate(chunks[1].lines, 1) if 'second0' in text)
+    assert chunks[1].file_line(str(chunk_line)) == next(i for i, line in enumerate(lines, 1) if 'second0' in line)
+
+
+def test_small_file_is_a_single_chunk():
+    content = _source()
+    chunks = chunk_source(content, max_lines=1000)
+    assert len(chunks) == 1 and chunks[0].text == content
+    assert chunks[0].file_line(7) == 7
+
+
+def test_focus_chunk_keeps_window_and_member_declaration():
+    content = _source()
+    lines = content.split("\n")
+    target = next(i for i, line in enumerate(lines, 1) if 'third5' in line)
+    chunk = focus_chunk(content, [target], radius=1, complexity_threshold=0)
+    mapped = [n for n in chunk.line_map if n]
+    assert {target - 1, target, target + 1} <= set(mapped)
+    assert any(lines[n - 1].strip() == "@Override" and n > target - 12 for n in mapped)
+    assert not any('first' in lines[n - 1] for n in mapped)
+    assert chunk.file_line(chunk.line_map.index(target) + 1) == target
+    assert focus_chunk(content, [], complexity_threshold=0) is None
+
+
+def test_focus_chunk_selects_complex_members():
+    body = ["    public int branchy(int a) {"] + ["        if (a > %d && a < 99) { a++; }" % i for i in range(6)] + \
+           ["        return a;", "    }"]
+    content = "\n".join(["class C {"] + _method("plain", 3) + body + ["}"])
+    masked = JavaSource(content).masked_lines
+    header, members = split_members(content)
+    assert [member_complexity(masked, first, last) for first, last in members] == [1, 13]
+    chunk = focus_chunk(content, [], complexity_threshold=10)
+    assert [line for line in chunk.lines if 'branchy' in line]
+    assert not [line for line in chunk.lines if 'plain' in line]
+
+
+def test_passed_masked_view_is_reused(monkeypatch):
+    content = _source()
+    masked = JavaSource(content).masked_lines
+    expected = [chunk.line_map for chunk in chunk_source(content, 12)]
+    focus_expected = focus_chunk(content, [10]).line_map
+
+    def fail(*args, **kwargs):
+        raise AssertionError("不应重复词法分析")
+    monkeypatch.setattr(java_chunker, "JavaSource", fail)
+    assert [chunk.line_map for chunk in chunk_source(content, 12, masked)] == expected
+    assert focus_chunk(content, [10], masked_lines=masked).line_map == focus_expected
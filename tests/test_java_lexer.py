@@ -0,0 +1,50 @@
+from java_lexer import JavaSource, tokenize
+
+
+SOURCE = (
+    "class A {\n"
+    "    // synchronized {\n"
+    "    String s = \"log. {\";\n"
+    "    /* a\n"
+    "       b */ int x = 0x1F;\n"
+    "    void f() { synchronized (this) { x >>>= 2; } }\n"
+    "}\n"
+)
+
+
+def test_tokens_carry_line_and_column_spans():
+    tokens = list(tokenize(SOURCE))
+    lines = SOURCE.split("\n")
+    for token in tokens:
+        assert SOURCE[token.start:token.end] == token.text
+        if token.line == token.end_line:
+            assert lines[token.line - 1][token.col:token.end_col] == token.text
+    comment = next(t for t in tokens if t.kind == "comment" and t.text.startswith("/*"))
+    assert (comment.line, comment.col, comment.end_line, comment.end_col) == (4, 4, 5, 11)
+
+
+def test_token_kinds():
+    kinds = {(t.kind, t.text) for t in tokenize(SOURCE)}
+    assert ("keyword", "class") in kinds
+    assert ("ident", "String") in kinds
+    assert ("string", "\"log. {\"") in kinds
+    assert ("number", "0x1F") in kinds
+    assert ("op", ">>>=") in kinds
+    assert ("comment", "// synchronized {") in kinds
+    # 注释和字符串中的关键字不会成为单独的词法单元
+    synchronized = [t for t in tokenize(SOURCE) if t.kind == "keyword" and t.text == "synchronized"]
+    assert [(t.line, t.col) for t in synchronized] == [(6, 15)]
+
+
+def test_masked_view_agrees_with_tokens():
+    source = JavaSource(SOURCE)
+    assert source.tokens == list(tokenize(SOURCE))
+    assert source.comment_lines == {2, 4, 5}
+    # 屏蔽视图与原文逐行对齐，只有代码词法单元的文本保留下来
+    assert [len(line) for line in source.masked_lines] == [len(line) for line in SOURCE.split("\n")]
+    for token in source.tokens:
+        if token.kind in ("keyword", "ident", "number", "op"):
+            masked = source.masked_lines[token.line - 1][token.col:token.end_col]
+            assert masked == token.text
+    assert "log." not in source.masked_lines[2]
+    assert source.masked_lines[1].strip() == ""
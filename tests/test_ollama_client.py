@@ -0,0 +1,44 @@
+from conftest import FakeOllama
+from ollama_client import OllamaClient, endpoint_of
+
+
+PAYLOAD = {"model": "m", "prompt": "p", "stream": False}
+
+
+def test_sequential_requests_reuse_one_connection(ollama):
+    client = OllamaClient(pool_size=2)
+    for _ in range(10):
+        assert client.post_json(ollama.url, PAYLOAD)["response"]
+    stats = client.stats()
+    assert (stats["requests"], stats["connections"], stats["reused"]) == (10, 1, 9)
+    # 服务端看到的也只有一个TCP连接
+    assert len(ollama.peers) == 1
+    assert "复用 9 次 (90%)" in client.format_stats()
+    client.close()
+
+
+def test_streamed_requests_return_connections_to_the_pool(ollama):
+    client = OllamaClient(pool_size=2)
+    for _ in range(5):
+        text, complete = client.stream_generate(ollama.url, PAYLOAD)
+        assert text and complete
+    assert client.stats()["connections"] == 1
+    assert len(ollama.peers) == 1
+    client.close()
+
+
+def test_each_endpoint_gets_its_own_pool(ollama):
+    other = FakeOllama()
+    client = OllamaClient(pool_size=2, connect_timeout=1.5, read_timeout=30)
+    try:
+        for _ in range(3):
+            client.post_json(ollama.url, PAYLOAD)
+            client.post_json(other.url, PAYLOAD)
+        endpoints = client.stats()["endpoints"]
+        assert set(endpoints) == {endpoint_of(ollama.url), endpoint_of(other.url)}
+        for item in endpoints.values():
+            assert (item["requests"], item["connections"], item["reused"]) == (3, 1, 2)
+        assert client.timeout == (1.5, 30)
+    finally:
+        client.close()
+        other.close()
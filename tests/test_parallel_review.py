@@ -0,0 +1,73 @@
+import glob
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import java_code_reviewer
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = ["DateUtils.java", "FileUtils.java", "SimpleTest.java", "StringUtils.java"]
+
+
+def _make_tree(root):
+    for index in range(6):
+        package = root / f"pkg{index % 3}"
+        package.mkdir(parents=True, exist_ok=True)
+        for name in SAMPLES:
+            shutil.copy(os.path.join(REPO_DIR, name), package / f"{index}_{name}")
+    return root
+
+
+def _report(monkeypatch, tmp_path, tree, jobs):
+    output_dir = tmp_path / f"reports_j{jobs}"
+    argv = ["java_code_reviewer.py", str(tree), "--format", "json", "--no-cache",
+            "--jobs", str(jobs), "--output-dir", str(output_dir)]
+    monkeypatch.setattr(sys, "argv", argv)
+    java_code_reviewer.main()
+    [report] = glob.glob(str(output_dir / "java_review_*.json"))
+    with open(report, encoding="utf-8") as f:
+        data = json.load(f)
+    del data["timestamp"]
+    return data
+
+
+def test_serial_and_parallel_reports_are_identical(monkeypatch, tmp_path):
+    tree = _make_tree(tmp_path / "src")
+    serial = _report(monkeypatch, tmp_path, tree, 1)
+    parallel = _report(monkeypatch, tmp_path, tree, 3)
+    assert serial["total_files"] == 24
+    assert parallel == serial
+
+
+def test_one_reviewer_can_be_shared_across_threads():
+    # 评审器不保存逐文件状态，多个线程并发使用同一实例的结果与串行相同
+    reviewer = java_code_reviewer.JavaCodeReviewer()
+    paths = [os.path.join(REPO_DIR, name) for name in SAMPLES] * 8
+    expected = [reviewer.review_file(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        actual = list(executor.map(reviewer.review_file, paths))
+    assert actual == expected
+
+
+def test_parallel_review_streams_with_bounded_prefetch(tmp_path):
+    tree = _make_tree(tmp_path / "src")
+    paths = sorted(str(path) for path in tree.rglob("*.java")) * 10
+    consumed = 0
+
+    def walker():
+        nonlocal consumed
+        for path in paths:
+            consumed += 1
+            yield path
+
+    results = java_code_reviewer.review_files(walker(), jobs=2)
+    first = next(results)
+    # 第一个结果产出时只取走了在途窗口内的文件，而不是整个输入
+    window = 2 * java_code_reviewer._PENDING_CHUNKS_PER_WORKER + 1
+    assert consumed <= window * java_code_reviewer._STREAM_CHUNKSIZE + 2
+    rest = list(results)
+    assert consumed == len(paths)
+    assert [first.file_path] + [result.file_path for result in rest] == paths
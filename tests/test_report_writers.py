@@ -0,0 +1,136 @@
+import glob
+import io
+import json
+import sys
+
+import ai_enhanced_reviewer
+import java_code_reviewer
+from ci_integration import CIIntegration
+from java_code_reviewer import (RULE_REGISTRY, CodeIssue, JsonlReportWriter, JsonReportWriter, MarkdownReportWriter,
+                                ReviewResult)
+
+
+RESULTS = [
+    ReviewResult("src/A.java", "A.java", 10, [
+        CodeIssue(3, "error", "exception", "空的catch块", "至少应该记录异常或重新抛出", "exception_handling"),
+        CodeIssue(5, "warning", "logging", "使用了System.out.println进行输出", "使用日志框架", "logging"),
+    ], 40.0, "发现1个错误, 1个警告，需要关注和改进。"),
+    ReviewResult("src/B.java", "B.java", 4, [], 100.0, "代码质量优秀，未发现明显问题。"),
+]
+
+
+def test_json_writer_output_and_summary(tmp_path):
+    path = tmp_path / "report.json"
+    writer = JsonReportWriter(str(path))
+    for result in RESULTS:
+        writer.add(result)
+    writer.close({"hits": 1, "misses": 1})
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["total_files"] == 2
+    assert [item["file_path"] for item in data["files"]] == ["src/A.java", "src/B.java"]
+    assert data["files"][0]["issues"][0] == {
+        "line_number": 3, "severity": "error", "category": "exception", "message": "空的catch块",
+        "suggestion": "至少应该记录异常或重新抛出", "rule": "exception_handling"}
+    assert data["summary"]["total_issues"] == 2
+    assert data["summary"]["average_score"] == 70.0
+    assert data["summary"]["files_with_errors"] == 1
+    assert data["summary"]["cache"] == {"hits": 1, "misses": 1}
+    # 各规则的问题数和遍历行数不依赖--profile，按注册顺序列出全部规则
+    rules = data["summary"]["rules"]
+    assert list(rules) == [rule.name for rule in RULE_REGISTRY]
+    assert rules["exception_handling"] == {"issues": 1, "lines": 14}
+    assert rules["performance"] == {"issues": 0, "lines": 14}
+    assert "profile" not in data["summary"]
+
+
+def test_json_writer_without_files_is_valid(tmp_path):
+    path = tmp_path / "report.json"
+    JsonReportWriter(str(path)).close()
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["files"] == [] and data["total_files"] == 0
+    assert data["summary"]["total_issues"] == 0
+
+
+def test_markdown_writer_puts_statistics_before_details(tmp_path):
+    path = tmp_path / "report.md"
+    writer = MarkdownReportWriter(str(path))
+    for result in RESULTS:
+        writer.add(result)
+    writer.close()
+    text = path.read_text(encoding="utf-8")
+    assert text.index("## 总体统计") < text.index("## 详细报告") < text.index("### A.java") < text.index("### B.java")
+    assert "- **评审文件数**: 2" in text
+    assert "- **平均评分**: 70.0/100" in text
+    assert "- **第3行** ❌ **ERROR** (exception)" in text
+    assert "✅ 未发现问题" in text
+
+
+def test_empty_run_still_writes_summaries(monkeypatch, tmp_path):
+    (tmp_path / "src").mkdir()
+    output_dir = tmp_path / "reports"
+    monkeypatch.setattr(sys, "argv", ["java_code_reviewer.py", str(tmp_path / "src"), "--format", "json",
+                                      "--no-cache", "--output-dir", str(output_dir)])
+    java_code_reviewer.main()
+    [report] = glob.glob(str(output_dir / "java_review_*.json"))
+    with open(report, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["total_files"] == 0 and data["summary"]["total_issues"] == 0
+
+
+def test_jsonl_writer_records(tmp_path):
+    path = tmp_path / "issues.jsonl"
+    writer = JsonlReportWriter(str(path))
+    writer.add(RESULTS[0])
+    # 每个文件写完立即刷新，下游不必等到运行结束
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+    writer.add(RESULTS[1])
+    writer.close({"hits": 0, "misses": 2})
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["type"] for record in records] == ["issue", "issue", "file", "file", "summary"]
+    assert records[0] == {"type": "issue", "file": "src/A.java", "line": 3, "severity": "error",
+                          "category": "exception", "rule": "exception_handling", "message": "空的catch块",
+                          "suggestion": "至少应该记录异常或重新抛出"}
+    assert records[2]["issue_count"] == 2 and records[3]["issue_count"] == 0
+    rules = records[-1].pop("rules")
+    assert records[-1] == {"type": "summary", "total_files": 2, "total_issues": 2, "average_score": 70.0,
+                           "files_with_errors": 1, "cache": {"hits": 0, "misses": 2}}
+    assert rules["logging"] == {"issues": 1, "lines": 14}
+
+
+def test_jsonl_stream_round_trips_through_ci_reader():
+    stream = io.StringIO()
+    writer = JsonlReportWriter("-", stream)
+    for result in RESULTS:
+        writer.add(result)
+    writer.close()
+    assert not stream.closed
+    stream.seek(0)
+    report = CIIntegration._read_issue_stream(stream)
+    assert [item["file_path"] for item in report["files"]] == ["src/A.java", "src/B.java"]
+    assert [issue["line_number"] for issue in report["files"][0]["issues"]] == [3, 5]
+    assert report["summary"]["total_issues"] == 2
+
+
+def test_empty_run_still_writes_jsonl_summary(monkeypatch, tmp_path):
+    (tmp_path / "src").mkdir()
+    output = tmp_path / "issues.jsonl"
+    monkeypatch.setattr(sys, "argv", ["java_code_reviewer.py", str(tmp_path / "src"), "--format", "jsonl",
+                                      "--jsonl-output", str(output), "--no-cache",
+                                      "--output-dir", str(tmp_path / "reports")])
+    java_code_reviewer.main()
+    [record] = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert record["type"] == "summary" and record["total_files"] == 0
+
+
+def test_ai_reviewer_empty_run_still_writes_summaries(monkeypatch, tmp_path, ollama):
+    (tmp_path / "src").mkdir()
+    output_dir = tmp_path / "reports"
+    monkeypatch.setattr(sys, "argv", ["ai_enhanced_reviewer.py", str(tmp_path / "src"), "--ollama-api", ollama.url,
+                                      "--format", "json", "--no-cache", "--no-ai-cache",
+                                      "--output-dir", str(output_dir)])
+    ai_enhanced_reviewer.main()
+    [report] = glob.glob(str(output_dir / "ai_java_review_*.json"))
+    with open(report, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["total_files"] == 0 and data["summary"]["total_issues"] == 0
+    assert ollama.prompts == []
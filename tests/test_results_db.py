@@ -0,0 +1,59 @@
+import os
+import sqlite3
+
+from java_code_reviewer import JavaCodeReviewer
+from results_db import ResultsDbWriter, issue_fingerprint, query_issues
+
+
+def _source(prints):
+    lines = ["public class A {", "    void a() {"]
+    for index in range(20):
+        lines.append(f"        System.out.println(\"{index}\");" if index in prints else f"        int v{index};")
+    return "\n".join(lines + ["    }", "}", ""])
+
+
+def _record(db, root, file_path, content):
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    writer = ResultsDbWriter(str(db), "test", str(root))
+    writer.add(JavaCodeReviewer().review_file(str(file_path)))
+    writer.close()
+
+
+def _introduced(db):
+    conn = sqlite3.connect(str(db))
+    rows = query_issues(conn, last_runs=1, introduced=True, rule="logging")
+    conn.close()
+    return [(row["file_path"], row["line_number"]) for row in rows]
+
+
+def test_new_duplicate_above_existing_issue_is_reported_on_its_own_line(tmp_path):
+    db = tmp_path / "results.db"
+    source = tmp_path / "A.java"
+    _record(db, tmp_path, source, _source({18}))
+    assert _introduced(db) == [("A.java", 21)]
+    # 在已有的输出语句上方新增一条，已有问题不算新引入
+    _record(db, tmp_path, source, _source({10, 18}))
+    assert _introduced(db) == [("A.java", 13)]
+    # 代码整体下移时没有新问题
+    _record(db, tmp_path, source, "\n\n" + _source({10, 18}))
+    assert _introduced(db) == []
+
+
+def test_relative_and_absolute_paths_share_history(tmp_path, monkeypatch):
+    db = tmp_path / "results.db"
+    (tmp_path / "src").mkdir()
+    monkeypatch.chdir(tmp_path)
+    _record(db, "src", os.path.join("src", "A.java"), _source({3}))
+    _record(db, str(tmp_path / "src"), str(tmp_path / "src" / "A.java"), _source({3}))
+    assert _introduced(db) == []
+    conn = sqlite3.connect(str(db))
+    assert {row[0] for row in conn.execute("SELECT file_path FROM files")} == {"A.java"}
+    conn.close()
+
+
+def test_fingerprint_ignores_whitespace_but_not_line_text():
+    a = issue_fingerprint("logging", "warning", "m", "  System.out.println(1);")
+    assert a == issue_fingerprint("logging", "warning", "m", "System.out.println(1);   ")
+    assert a != issue_fingerprint("logging", "warning", "m", "System.out.println(2);")
+    assert a != issue_fingerprint("logging", "warning", "m", "System.out.println(1);", 1)
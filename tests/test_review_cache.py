@@ -0,0 +1,60 @@
+import os
+
+from ai_enhanced_reviewer import AIEnhancedReviewer
+from java_code_reviewer import JavaCodeReviewer
+from review_cache import ResponseCache, ResultCache
+
+
+SOURCE = "public class A {\n    public void run() {\n        System.out.println(\"a\");\n    }\n}\n"
+
+
+def test_get_counts_hits_and_misses(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.make_key("fingerprint", "content")
+    assert cache.get(key) is None
+    cache.put(key, {"score": 90})
+    assert cache.get(key) == {"score": 90}
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.make_key("broken")
+    cache.put(key, {})
+    with open(cache._path(key), 'w', encoding='utf-8') as f:
+        f.write("{not json")
+    assert cache.get(key) is None
+    assert cache.misses == 1
+
+
+def test_reviewer_reuses_cached_result(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    first = JavaCodeReviewer(cache=cache).review_source("A.java", SOURCE)
+    second = JavaCodeReviewer(cache=cache).review_source("B.java", SOURCE)
+    assert cache.stats() == {"hits": 1, "misses": 1}
+    assert second.file_path == "B.java"
+    assert [issue.message for issue in second.issues] == [issue.message for issue in first.issues]
+
+
+def test_ai_review_counts_static_and_ai_lookups_separately(tmp_path):
+    cache = ResultCache(str(tmp_path / "static"))
+    ai_cache = ResponseCache(str(tmp_path / "ai"))
+    reviewer = AIEnhancedReviewer(cache=cache, ai_cache=ai_cache)
+    reviewer._generate = lambda prompt, stop=None: ('{"issues": []}', True)
+    for name in ("A.java", "B.java", "C.java"):
+        reviewer.review_source_with_ai(name, SOURCE.replace("A", name[0]))
+    reviewer.review_source_with_ai("A.java", SOURCE)
+    assert cache.stats() == {"hits": 0, "misses": 3}
+    assert ai_cache.stats() == {"hits": 1, "misses": 3}
+    reviewer.close()
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=200)
+    keys = [ResultCache.make_key(str(i)) for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 60)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    cache.prune()
+    remaining = [key for key in keys if os.path.exists(cache._path(key))]
+    assert remaining == keys[-2:]
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from java_code_reviewer import RULE_REGISTRY, JavaCodeReviewer, ReviewContext
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = ["DateUtils.java", "FileUtils.java", "SimpleTest.java", "StringUtils.java"]
+
+# 仓库中示例文件的评审结果快照，与改为单次遍历之前逐规则扫描的输出一致
+# （FileUtils.java 中两个非空catch块被误报为空catch块的问题除外）
+with open(os.path.join(os.path.dirname(__file__), "data", "sample_reviews.json"), encoding="utf-8") as f:
+    EXPECTED = json.load(f)
+
+
+def _issues(result):
+    return [[issue.line_number, issue.severity, issue.category, issue.rule, issue.message]
+            for issue in result.issues]
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_sample_files_match_snapshot(name):
+    result = JavaCodeReviewer().review_file(os.path.join(REPO_DIR, name))
+    assert _issues(result) == EXPECTED[name]["issues"]
+    assert result.score == EXPECTED[name]["score"]
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_single_pass_matches_rule_by_rule(name):
+    # 单次遍历驱动全部规则，输出与逐个规则单独评审再按注册顺序拼接相同
+    path = os.path.join(REPO_DIR, name)
+    fused = _issues(JavaCodeReviewer().review_file(path))
+    separate = []
+    for rule in RULE_REGISTRY:
+        separate += _issues(JavaCodeReviewer(rules=[rule]).review_file(path))
+    assert fused == separate
+
+
+def _messages(source, line):
+    result = JavaCodeReviewer().review_source("A.java", source)
+    return [issue.message for issue in result.issues if issue.line_number == line]
+
+
+def test_non_empty_catch_is_not_reported_empty():
+    # 修复前 FileUtils.java 中两个只有一条输出语句的catch块被误报为空catch块
+    result = JavaCodeReviewer().review_file(os.path.join(REPO_DIR, "FileUtils.java"))
+    assert "空的catch块" not in [issue.message for issue in result.issues]
+
+
+def test_empty_catch_ignores_braces_in_strings_and_comments():
+    source = (
+        "public class A {\n"
+        "    void a() {\n"
+        "        try {\n"
+        "            run();\n"
+        "        } catch (Exception e) { /* } */ }\n"
+        "        try {\n"
+        "            run();\n"
+        "        } catch (Exception e) {\n"
+        "            // 忽略 {\n"
+        "        }\n"
+        "        try {\n"
+        "            run();\n"
+        "        } catch (Exception e) {\n"
+        "            log.warn(\"}\");\n"
+        "        }\n"
+        "    }\n"
+        "}\n"
+    )
+    assert "空的catch块" in _messages(source, 5)
+    assert "空的catch块" in _messages(source, 8)
+    assert "空的catch块" not in _messages(source, 13)
+    assert "异常处理中缺少日志记录" not in _messages(source, 13)
+
+
+def test_line_table_columns_and_range_counts():
+    source = "class A {\n\t// TODO {\n    String s = \"{\";\n    void f() {\n    }\n}"
+    table = ReviewContext("A.java", source).table
+    assert list(table.indent) == [0, 1, 4, 4, 4, 0]
+    assert list(table.comment) == [0, 1, 0, 0, 0, 0]
+    # 注释和字符串中的开括号不计入
+    assert table.count(table.brace_prefix, 1, 6) == 2
+    assert table.count(table.brace_prefix, 2, 3) == 0
+    # 区间超出文件范围时自动截断
+    assert table.count(table.brace_prefix, -5, 100) == 2
+    assert table.count(table.brace_prefix, 5, 4) == 0